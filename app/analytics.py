@@ -0,0 +1,265 @@
+import math
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, and_, bindparam, cast, func, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from .database import CodeReview, DailyScore, FileScore, ScoreHistogram, ScoreRollup
+from .pagination import SCORE_FIELDS
+
+PERIODS = ("day", "week", "month", "all")
+
+# Percentiles reported for score distributions
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+def score_bin(score: float) -> int:
+    """Histogram bin of a score: the score in tenths, rounded half up like SQL round()"""
+    return int(math.floor(score * 10 + 0.5))
+
+def bucket_start(day: date, period: str) -> Optional[date]:
+    """First day of the ``period`` bucket of ``day`` (weeks start on Monday); None for the single "all" bucket"""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    if period == "all":
+        return None
+    return day
+
+# Compiled once per table and set of columns, as every review insert runs them
+_statements: Dict[tuple, tuple] = {}
+
+def _increment(db, model, key: Dict, deltas: Dict, values: Optional[Dict] = None):
+    """Add ``deltas`` to the columns of the row with primary key ``key``, creating it if needed"""
+    table = model.__table__
+    values = values or {}
+    signature = (table.name, tuple(key), tuple(deltas), tuple(values))
+    if signature not in _statements:
+        assignments = {column: table.c[column] + bindparam(f"delta_{column}") for column in deltas}
+        assignments.update({column: bindparam(f"value_{column}", type_=table.c[column].type) for column in values})
+        update = table.update().where(
+            and_(*(table.c[column] == bindparam(f"key_{column}") for column in key))
+        ).values(assignments)
+        _statements[signature] = (update, table.insert())
+    update, insert = _statements[signature]
+
+    params = {f"key_{column}": value for column, value in key.items()}
+    params.update({f"delta_{column}": value for column, value in deltas.items()})
+    params.update({f"value_{column}": value for column, value in values.items()})
+    if db.connection().execute(update, params).rowcount:
+        return
+    try:
+        # Savepoint so a concurrent insert of the same row only undoes this one
+        with db.begin_nested():
+            db.connection().execute(insert, {**key, **deltas, **values})
+    except IntegrityError:
+        db.connection().execute(update, params)
+
+def _score_deltas(review: CodeReview, sign: int) -> Dict:
+    deltas = {"review_count": sign}
+    for field in SCORE_FIELDS:
+        deltas[f"{field}_sum"] = sign * getattr(review, field)
+    return deltas
+
+def record_review_scores(db, review: CodeReview):
+    """
+    Add a new review to the rollups, in the caller's transaction, so they
+    are committed (or rolled back) together with the review.
+    """
+    day = review.created_at.date()
+    deltas = _score_deltas(review, 1)
+    _increment(db, DailyScore, {"day": day}, deltas)
+    _increment(db, ScoreRollup, {"filename": review.filename, "day": day}, deltas)
+    for field in SCORE_FIELDS:
+        _increment(db, ScoreHistogram, {"score_field": field, "day": day,
+                                        "bin": score_bin(getattr(review, field))}, {"review_count": 1})
+    _increment(db, FileScore, {"filename": review.filename}, deltas, {
+        "latest_overall_score": review.overall_score,
+        "last_reviewed_at": review.created_at
+    })
+
+def remove_review_scores(db, review: CodeReview):
+    """Take a review being deleted out of the rollups; call before deleting it"""
+    day = review.created_at.date()
+    deltas = _score_deltas(review, -1)
+    keys = [(DailyScore, {"day": day}), (ScoreRollup, {"filename": review.filename, "day": day})]
+    keys += [(ScoreHistogram, {"score_field": field, "day": day, "bin": score_bin(getattr(review, field))})
+             for field in SCORE_FIELDS]
+    keys.append((FileScore, {"filename": review.filename}))
+    for model, key in keys:
+        _increment(db, model, key, {"review_count": -1} if model is ScoreHistogram else deltas)
+
+    # The file's latest score, from its newest remaining review
+    latest = (
+        db.query(CodeReview.overall_score, CodeReview.created_at)
+        .filter(CodeReview.filename == review.filename, CodeReview.id != review.id)
+        .order_by(CodeReview.created_at.desc(), CodeReview.id.desc())
+        .first()
+    )
+    if latest:
+        db.query(FileScore).filter(FileScore.filename == review.filename).update(
+            {"latest_overall_score": latest.overall_score, "last_reviewed_at": latest.created_at},
+            synchronize_session=False
+        )
+    # Drop the rows this review emptied, looked up by primary key
+    for model, key in keys:
+        db.query(model).filter_by(**key).filter(model.review_count <= 0).delete(synchronize_session=False)
+
+def rebuild_rollups(engine):
+    """Recompute every rollup from code_reviews, with set-based queries"""
+    reviews = CodeReview.__table__
+    day = func.date(reviews.c.created_at)
+    sums = [func.sum(reviews.c[field]) for field in SCORE_FIELDS]
+    sum_columns = [f"{field}_sum" for field in SCORE_FIELDS]
+    rollup_columns = ["day", "review_count"] + sum_columns
+
+    with engine.begin() as conn:
+        for model in (DailyScore, ScoreRollup, ScoreHistogram, FileScore):
+            conn.execute(model.__table__.delete())
+
+        conn.execute(DailyScore.__table__.insert().from_select(
+            rollup_columns, select(day, func.count(), *sums).group_by(day)
+        ))
+        conn.execute(ScoreRollup.__table__.insert().from_select(
+            ["filename"] + rollup_columns,
+            select(reviews.c.filename, day, func.count(), *sums).group_by(reviews.c.filename, day)
+        ))
+        for field in SCORE_FIELDS:
+            score = cast(func.round(reviews.c[field] * 10), Integer)
+            conn.execute(ScoreHistogram.__table__.insert().from_select(
+                ["score_field", "day", "bin", "review_count"],
+                select(literal(field), day, score, func.count()).group_by(day, score)
+            ))
+
+        latest = reviews.alias("latest")
+        latest_score = (
+            select(latest.c.overall_score)
+            .where(latest.c.filename == reviews.c.filename)
+            .order_by(latest.c.created_at.desc(), latest.c.id.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        conn.execute(FileScore.__table__.insert().from_select(
+            ["filename", "review_count"] + sum_columns + ["latest_overall_score", "last_reviewed_at"],
+            select(reviews.c.filename, func.count(), *sums, latest_score, func.max(reviews.c.created_at))
+            .group_by(reviews.c.filename)
+        ))
+
+def _check_period(period: str):
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+
+def _check_score_field(score_field: str):
+    if score_field not in SCORE_FIELDS:
+        raise ValueError(f"score_field must be one of: {', '.join(SCORE_FIELDS)}")
+
+def _day_range(query, column, since: Optional[date], until: Optional[date]):
+    if since:
+        query = query.filter(column >= since)
+    if until:
+        query = query.filter(column <= until)
+    return query
+
+def score_trends(db, period: str = "week", filename: Optional[str] = None,
+                 since: Optional[date] = None, until: Optional[date] = None) -> List[Dict]:
+    """
+    Review count and average scores per bucket, oldest first, for one file
+    or all files. Reads one rollup row per day in the range.
+    """
+    _check_period(period)
+    if filename is None:
+        model, query = DailyScore, db.query(DailyScore)
+    else:
+        model, query = ScoreRollup, db.query(ScoreRollup).filter(ScoreRollup.filename == filename)
+    query = _day_range(query, model.day, since, until)
+    buckets: Dict[Optional[date], Dict] = {}
+    for row in query.order_by(model.day):
+        bucket = buckets.setdefault(
+            bucket_start(row.day, period), {"review_count": 0, **{field: 0.0 for field in SCORE_FIELDS}}
+        )
+        bucket["review_count"] += row.review_count
+        for field in SCORE_FIELDS:
+            bucket[field] += getattr(row, f"{field}_sum")
+
+    trends = []
+    for start, bucket in buckets.items():
+        count = bucket.pop("review_count")
+        averages = {field: round(total / count, 2) if count else None for field, total in bucket.items()}
+        trends.append({"bucket_start": start, "review_count": count, **averages})
+    return trends
+
+def histogram_percentile(histogram: Dict[int, int], q: float) -> Optional[float]:
+    """The q-th percentile of scores counted per bin in ``histogram``, or None if it is empty"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = q / 100 * total
+    seen = 0
+    for score in sorted(histogram):
+        seen += histogram[score]
+        if seen >= rank:
+            return score / 10
+    return max(histogram) / 10
+
+def score_distribution(db, score_field: str = "overall_score", period: str = "all",
+                       since: Optional[date] = None, until: Optional[date] = None) -> List[Dict]:
+    """
+    Histogram and percentiles of one score over all files, per bucket.
+    Reads at most one histogram row per day and score value (in tenths).
+    """
+    _check_period(period)
+    _check_score_field(score_field)
+    buckets: Dict[Optional[date], Dict[int, int]] = {}
+    if period == "all":
+        # One bucket: let the database add up the days, returning one row per score value
+        query = _day_range(
+            db.query(ScoreHistogram.bin, func.sum(ScoreHistogram.review_count))
+            .filter(ScoreHistogram.score_field == score_field),
+            ScoreHistogram.day, since, until
+        )
+        histogram = {score: count for score, count in query.group_by(ScoreHistogram.bin) if count}
+        if histogram:
+            buckets[None] = histogram
+    else:
+        query = _day_range(
+            db.query(ScoreHistogram.day, ScoreHistogram.bin, ScoreHistogram.review_count)
+            .filter(ScoreHistogram.score_field == score_field),
+            ScoreHistogram.day, since, until
+        )
+        for day, score, count in query.order_by(ScoreHistogram.day):
+            histogram = buckets.setdefault(bucket_start(day, period), {})
+            histogram[score] = histogram.get(score, 0) + count
+
+    return [{
+        "bucket_start": start,
+        "review_count": sum(histogram.values()),
+        "percentiles": {f"p{q}": histogram_percentile(histogram, q) for q in PERCENTILES},
+        "histogram": {f"{score / 10:.1f}": histogram[score] for score in sorted(histogram)}
+    } for start, histogram in buckets.items()]
+
+def worst_files(db, limit: int = 10, by: str = "average", min_reviews: int = 1) -> List[Dict]:
+    """
+    Files with the lowest overall score, averaged over their reviews or from
+    their latest review. Reads one row per reviewed file.
+    """
+    if by == "average":
+        order = FileScore.overall_score_sum / FileScore.review_count
+    elif by == "latest":
+        order = FileScore.latest_overall_score
+    else:
+        raise ValueError("by must be one of: average, latest")
+    rows = (
+        db.query(FileScore)
+        .filter(FileScore.review_count >= min_reviews)
+        .order_by(order, FileScore.filename)
+        .limit(limit)
+        .all()
+    )
+    return [{
+        "filename": row.filename,
+        "review_count": row.review_count,
+        **{f"average_{field}": round(getattr(row, f"{field}_sum") / row.review_count, 2) for field in SCORE_FIELDS},
+        "latest_overall_score": row.latest_overall_score,
+        "last_reviewed_at": row.last_reviewed_at
+    } for row in rows]
@@ -0,0 +1,69 @@
+import io
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, List, Tuple, Union
+
+# Maximum number of files reviewed from one batch request or archive
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "500"))
+
+# Maximum total uncompressed size of an archive's reviewable members
+ARCHIVE_MAX_BYTES = int(os.getenv("ARCHIVE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Source files picked out of archives; everything else is skipped
+REVIEWABLE_EXTENSIONS = {
+    ".py", ".js", ".ts", ".java", ".cpp", ".c", ".cs", ".php",
+    ".rb", ".go", ".rs", ".swift", ".kt"
+}
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+
+def is_archive(filename: str) -> bool:
+    """Whether an upload should be expanded instead of reviewed as-is"""
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+def is_reviewable(path: str) -> bool:
+    """Skip directories, hidden files and non-source members"""
+    parts = path.replace('\\', '/').split('/')
+    if any(part.startswith('.') or part == '__MACOSX' for part in parts if part):
+        return False
+    return os.path.splitext(path)[1].lower() in REVIEWABLE_EXTENSIONS
+
+def extract_archive(filename: str, data: Union[bytes, BinaryIO], max_files: int = BATCH_MAX_FILES,
+                    max_bytes: int = ARCHIVE_MAX_BYTES) -> List[Tuple[str, bytes]]:
+    """
+    Return (path, content) for every reviewable member of a zip or tar archive,
+    given as bytes or a seekable file.
+
+    Raises ValueError for unreadable archives or ones over the file or size limits.
+    """
+    members = []
+    total = 0
+    source = io.BytesIO(data) if isinstance(data, bytes) else data
+
+    def add(path: str, size: int, read):
+        nonlocal total
+        if not is_reviewable(path):
+            return
+        total += size
+        if len(members) >= max_files:
+            raise ValueError(f"Archive contains more than {max_files} reviewable files")
+        if total > max_bytes:
+            raise ValueError(f"Archive contents exceed {max_bytes} bytes")
+        members.append((path, read()))
+
+    try:
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(source) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        add(info.filename, info.file_size, lambda info=info: archive.read(info))
+        else:
+            with tarfile.open(fileobj=source, mode="r:*") as archive:
+                for info in archive.getmembers():
+                    if info.isfile():
+                        add(info.name, info.size, lambda info=info: archive.extractfile(info).read())
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        raise ValueError(f"Could not read archive {filename}: {e}")
+
+    return members
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from .database import SessionLocal, ReviewCacheEntry, run_db
+
+# Maximum number of reviews held in the in-process tier
+REVIEW_CACHE_SIZE = int(os.getenv("REVIEW_CACHE_SIZE", "256"))
+
+# Seconds before a cached review expires (0 disables expiry)
+REVIEW_CACHE_TTL = float(os.getenv("REVIEW_CACHE_TTL", "86400"))
+
+# Set to "false" to skip the database tier and cache in memory only
+REVIEW_CACHE_PERSISTENT = os.getenv("REVIEW_CACHE_PERSISTENT", "true").lower() == "true"
+
+def normalize_content(content: str) -> str:
+    """
+    Normalize line endings and trailing whitespace so cosmetic changes still
+    hit. Leading blank lines are kept: they shift the lines suggestions cite.
+    """
+    lines = content.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).rstrip('\n')
+
+def make_cache_key(content: str, extension: str, prompt_version: str, model: str) -> str:
+    """Content-addressed key for a review"""
+    digest = hashlib.sha256()
+    for part in (prompt_version, model, extension.lower(), normalize_content(content)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class ReviewCache:
+    """
+    Two-tier review cache: an in-process LRU with size and TTL eviction in
+    front of a persistent table in the reviews database.
+    """
+
+    def __init__(self, max_entries: int = REVIEW_CACHE_SIZE, ttl: float = REVIEW_CACHE_TTL,
+                 persistent: bool = REVIEW_CACHE_PERSISTENT):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent = persistent
+        self._entries = OrderedDict()  # key -> (stored_at, json string)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the cached review for ``key`` or None"""
+        value = self._memory_get(key)
+        if value is None:
+            value = self._db_found(key, self._in_session(self._db_get, key) if self.persistent else None)
+        return None if value is None else json.loads(value)
+
+    async def get_async(self, key: str) -> Optional[Dict]:
+        """Like get(), with the database tier read off the event loop"""
+        value = self._memory_get(key)
+        if value is None:
+            found = None
+            if self.persistent:
+                try:
+                    found = await run_db(self._db_get, key)
+                except Exception:
+                    # The cache must never break a review
+                    pass
+            value = self._db_found(key, found)
+        return None if value is None else json.loads(value)
+
+    def set(self, key: str, review: Dict, model: str = "", prompt_version: str = ""):
+        """Store a review in both tiers"""
+        value = json.dumps(review)
+        with self._lock:
+            self._put(key, value)
+        if self.persistent:
+            self._in_session(self._db_set, key, value, model, prompt_version)
+
+    async def set_async(self, key: str, review: Dict, model: str = "", prompt_version: str = ""):
+        """Like set(), with the database tier written off the event loop"""
+        value = json.dumps(review)
+        with self._lock:
+            self._put(key, value)
+        if self.persistent:
+            try:
+                await run_db(self._db_set, key, value, model, prompt_version)
+            except Exception:
+                pass
+
+    def clear(self):
+        """Drop every entry from the in-process tier"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persistent": self.persistent,
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _put(self, key: str, value: str):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _is_expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        """The in-process entry for ``key``, counting a hit; None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self._is_expired(stored_at):
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.memory_hits += 1
+            return value
+
+    def _db_found(self, key: str, value: Optional[str]) -> Optional[str]:
+        """Count the outcome of a database lookup, keeping a found entry in memory"""
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db_hits += 1
+            self._put(key, value)
+        return value
+
+    def _in_session(self, fn, *args):
+        """Run ``fn(session, *args)`` on a new session, for the sync callers"""
+        db = SessionLocal()
+        try:
+            return fn(db, *args)
+        except Exception:
+            # The cache must never break a review
+            db.rollback()
+            return None
+        finally:
+            db.close()
+
+    def _db_get(self, db, key: str) -> Optional[str]:
+        entry = db.query(ReviewCacheEntry).filter(ReviewCacheEntry.cache_key == key).first()
+        if entry is None:
+            return None
+        if self.ttl > 0 and entry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+            db.delete(entry)
+            db.commit()
+            with self._lock:
+                self.expirations += 1
+            return None
+        return entry.review_json
+
+    def _db_set(self, db, key: str, value: str, model: str, prompt_version: str):
+        db.merge(ReviewCacheEntry(
+            cache_key=key,
+            model=model,
+            prompt_version=prompt_version,
+            review_json=value,
+            created_at=datetime.utcnow()
+        ))
+        db.commit()
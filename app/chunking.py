@@ -0,0 +1,166 @@
+import ast
+import os
+from typing import Dict, List, NamedTuple, Sequence
+
+# Files longer than this many lines are reviewed in chunks
+CHUNK_THRESHOLD_LINES = int(os.getenv("CHUNK_THRESHOLD_LINES", "400"))
+
+# Target maximum size of a single chunk in lines
+CHUNK_MAX_LINES = int(os.getenv("CHUNK_MAX_LINES", "200"))
+
+SCORE_KEYS = ["readability_score", "modularity_score", "bug_risk_score", "overall_score"]
+
+class CodeChunk(NamedTuple):
+    start_line: int  # 1-based, inclusive
+    end_line: int    # 1-based, inclusive
+    content: str
+    name: str
+
+def needs_chunking(content: str, threshold: int = CHUNK_THRESHOLD_LINES) -> bool:
+    """Whether a file is large enough to be reviewed in chunks"""
+    return content.count('\n') + 1 > threshold
+
+def split_into_chunks(filename: str, content: str, max_lines: int = CHUNK_MAX_LINES) -> List[CodeChunk]:
+    """
+    Split a file into reviewable chunks.
+
+    Python files are split on top-level function and class boundaries;
+    everything else (and Python that does not parse) uses line windows.
+    """
+    lines = content.split('\n')
+    if filename.endswith('.py'):
+        try:
+            spans = _python_spans(ast.parse(content), lines, max_lines)
+            return _build_chunks(lines, _pack_spans(spans, max_lines))
+        except (SyntaxError, ValueError):
+            pass
+    return _build_chunks(lines, _line_windows(lines, max_lines))
+
+def merge_reviews(chunks: List[CodeChunk], reviews: List[Dict], failed: Sequence[tuple] = ()) -> Dict:
+    """
+    Merge per-chunk reviews into a single ReviewReport-shaped dict.
+    ``failed`` holds (chunk, error) pairs for chunks whose review failed:
+    they are left out of the scores and listed in the report.
+    """
+    total_lines = sum(chunk.end_line - chunk.start_line + 1 for chunk in chunks) or 1
+
+    scores = {}
+    for key in SCORE_KEYS:
+        weighted = sum(
+            float(review["scores"][key]) * (chunk.end_line - chunk.start_line + 1)
+            for chunk, review in zip(chunks, reviews)
+        )
+        scores[key] = round(weighted / total_lines, 1)
+
+    sections = []
+    suggestions = []
+    seen = set()
+    for chunk, review in zip(chunks, reviews):
+        label = f"Lines {chunk.start_line}-{chunk.end_line} ({chunk.name})"
+        sections.append(f"## {label}\n\n{review['report']}")
+        for suggestion in review["suggestions"]:
+            text = suggestion if isinstance(suggestion, str) else suggestion["text"]
+            if text in seen:
+                continue
+            seen.add(text)
+            if isinstance(suggestion, str):
+                suggestions.append(f"{label}: {text}")
+                continue
+            item = {**suggestion, "text": f"{label}: {text}"}
+            # The model numbers the excerpt's lines from 1; map them to lines of the file
+            for key in ("line_start", "line_end"):
+                if item.get(key) is not None:
+                    item[key] += chunk.start_line - 1
+            suggestions.append(item)
+
+    summary = f"Reviewed in {len(chunks)} chunks."
+    if failed:
+        summary += f" {len(failed)} could not be reviewed and are not included in the scores:\n" + "\n".join(
+            f"- Lines {chunk.start_line}-{chunk.end_line} ({chunk.name}): {error}" for chunk, error in failed
+        )
+    return {
+        "report": summary + "\n\n" + "\n\n".join(sections),
+        "scores": scores,
+        "suggestions": suggestions
+    }
+
+def _python_spans(tree: ast.Module, lines: List[str], max_lines: int) -> List[tuple]:
+    """(start, end, name) spans covering the whole file, one per top-level node"""
+    spans = []
+    for node in tree.body:
+        start = _node_start(node)
+        end = node.end_lineno
+        name = getattr(node, 'name', 'module-level code')
+
+        # Split oversized classes on their members
+        if isinstance(node, ast.ClassDef) and end - start + 1 > max_lines:
+            boundaries = [start] + [_node_start(child) for child in node.body[1:]] + [end + 1]
+            for child, child_start, next_start in zip(node.body, boundaries, boundaries[1:]):
+                child_name = getattr(child, 'name', None)
+                spans.append((child_start, next_start - 1, f"{node.name}.{child_name}" if child_name else node.name))
+        else:
+            spans.append((start, end, name))
+
+    # Blank gaps belong to the preceding span, comments to the following one
+    covered = []
+    cursor = 1
+    for start, end, name in spans:
+        gap = lines[cursor - 1:start - 1]
+        if covered and not any(line.strip() for line in gap):
+            prev_start, _, prev_name = covered[-1]
+            covered[-1] = (prev_start, start - 1, prev_name)
+            covered.append((start, end, name))
+        else:
+            covered.append((min(cursor, start), end, name))
+        cursor = end + 1
+    if not covered:
+        raise ValueError("no top-level nodes")
+    if cursor <= len(lines):
+        start, _, name = covered[-1]
+        covered[-1] = (start, len(lines), name)
+    return covered
+
+def _node_start(node: ast.AST) -> int:
+    """First line of a node, including its decorators"""
+    return min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])])
+
+def _pack_spans(spans: List[tuple], max_lines: int) -> List[tuple]:
+    """Group consecutive small spans so chunks approach ``max_lines``"""
+    packed = []
+    for start, end, name in spans:
+        if packed and end - packed[-1][0] + 1 <= max_lines:
+            names = packed[-1][2]
+            if name not in names:
+                names.append(name)
+            packed[-1] = (packed[-1][0], end, names)
+        else:
+            packed.append((start, end, [name]))
+    return [(start, end, _describe(names)) for start, end, names in packed]
+
+def _describe(names: List[str]) -> str:
+    if len(names) <= 3:
+        return ", ".join(names)
+    return f"{', '.join(names[:2])} and {len(names) - 2} more"
+
+def _line_windows(lines: List[str], max_lines: int) -> List[tuple]:
+    """Fixed-size windows, preferring to break on a blank line"""
+    windows = []
+    start = 1
+    total = len(lines)
+    while start <= total:
+        end = min(start + max_lines - 1, total)
+        if end < total:
+            # Look back over the last quarter of the window for a blank line
+            for candidate in range(end, end - max_lines // 4, -1):
+                if not lines[candidate - 1].strip():
+                    end = candidate
+                    break
+        windows.append((start, end, f"lines {start}-{end}"))
+        start = end + 1
+    return windows
+
+def _build_chunks(lines: List[str], spans: List[tuple]) -> List[CodeChunk]:
+    return [
+        CodeChunk(start, end, '\n'.join(lines[start - 1:end]), name)
+        for start, end, name in spans
+    ]
@@ -0,0 +1,171 @@
+import os
+import re
+from typing import List, NamedTuple, Tuple
+
+# Set to "false" to send files to the LLM verbatim
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "true").lower() == "true"
+
+# Runs of literal-only lines (lookup tables, embedded data) longer than this are elided
+COMPACT_MAX_LITERAL_LINES = int(os.getenv("COMPACT_MAX_LITERAL_LINES", "20"))
+
+# Lines kept at each end of an elided literal table, so the model still sees its shape
+LITERAL_EDGE_LINES = 3
+
+# Consecutive blank lines kept; longer runs are collapsed
+MAX_BLANK_LINES = 1
+
+COMMENT_PREFIXES = ("#", "//", "/*", "*", "*/", "--", "<!--", "-->")
+
+# Line comment syntax for the marker lines, by file extension; "//" otherwise
+HASH_COMMENT_EXTENSIONS = {"py", "rb", "sh", "bash", "pl", "r", "yml", "yaml", "toml", "ps1", "cmake", "mk"}
+DASH_COMMENT_EXTENSIONS = {"sql", "lua", "hs", "elm", "ada"}
+
+# Preprocessor lines start with "#" but are code
+PREPROCESSOR = re.compile(r"#\s*(include|import|define|undef|if|ifdef|ifndef|elif|else|endif|pragma|error)\b")
+
+LICENSE_MARKERS = re.compile(
+    r"copyright|spdx-license-identifier|licensed under|license|permission is hereby granted|"
+    r"all rights reserved|warranty",
+    re.IGNORECASE
+)
+
+# Generated sections inside hand-written files
+GENERATED_BEGIN = re.compile(r"(begin|start) (auto-?)?generated|<auto-generated>", re.IGNORECASE)
+GENERATED_END = re.compile(r"end (auto-?)?generated|</auto-generated>", re.IGNORECASE)
+
+# A line holding nothing but literals: numbers, strings, booleans/null and punctuation
+_LITERAL = r"""(?:[-+]?(?:0[xXbBoO][0-9a-fA-F_]+|\d[\d_]*(?:\.\d*)?(?:[eE][-+]?\d+)?)|"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|true|false|True|False|None|null|nil)"""
+_BRACKETS = r"[\s\[\](){}]*"
+LITERAL_LINE = re.compile(
+    rf"^{_BRACKETS}{_LITERAL}(?:{_BRACKETS}[,:]{_BRACKETS}{_LITERAL})*[\s\[\](){{}},;]*$"
+)
+
+class CompactedSource(NamedTuple):
+    text: str
+    omitted: List[Tuple[str, int, int]]  # (what, first line, last line), 1-based, in the original
+    lines: List[Tuple[int, int]]         # Original first and last line of each line of text, 1-based
+
+    def original_lines(self, start: int, end: int) -> Tuple[int, int]:
+        """Lines ``start``-``end`` of the compacted text (1-based) as lines of the original"""
+        if not self.lines:
+            return start, end
+        first = self.lines[min(max(start, 1), len(self.lines)) - 1][0]
+        last = self.lines[min(max(end, 1), len(self.lines)) - 1][1]
+        return first, max(first, last)
+
+def compact_source(filename: str, content: str) -> CompactedSource:
+    """
+    Shrink a file before it is sent for review: drop a leading license
+    header, generated sections and the bulk of long literal tables, strip
+    trailing whitespace and collapse blank runs. Omitted regions are
+    replaced by a marker naming the original line numbers; ``lines`` maps
+    the lines of the result back to the original, for line numbers the
+    model gives.
+    """
+    lines = [line.rstrip() for line in content.split("\n")]
+    drop = [None] * len(lines)  # Marker text for the first line of a dropped region, "" for the rest
+    omitted = []
+    regions = {}  # Last line (1-based) of the region dropped from each marker line
+
+    def omit(what: str, start: int, end: int):
+        """Drop lines[start:end] (0-based, end exclusive)"""
+        omitted.append((what, start + 1, end))
+        regions[start] = end
+        drop[start] = f"[{what} omitted: lines {start + 1}-{end}]"
+        for index in range(start + 1, end):
+            drop[index] = ""
+
+    header = _license_header(lines)
+    if header:
+        omit("license header", *header)
+    for start, end in _generated_sections(lines):
+        omit("generated code", start, end)
+    for start, end in _literal_runs(lines, drop):
+        omit("literal table", start + LITERAL_EDGE_LINES, end - LITERAL_EDGE_LINES)
+
+    comment = _comment_prefix(filename)
+    kept = []
+    origins = []
+    blank_run = 0
+    for index, (line, marker) in enumerate(zip(lines, drop)):
+        if marker == "":
+            continue
+        if marker is not None:
+            indent = line[:len(line) - len(line.lstrip())]
+            kept.append(f"{indent}{comment} {marker}")
+            origins.append((index + 1, regions[index]))
+            blank_run = 0
+            continue
+        if not line:
+            blank_run += 1
+            if blank_run > MAX_BLANK_LINES:
+                continue
+        else:
+            blank_run = 0
+        kept.append(line)
+        origins.append((index + 1, index + 1))
+
+    # Leading and trailing blank lines are dropped
+    first, last = 0, len(kept)
+    while first < last and not kept[first]:
+        first += 1
+    while last > first and not kept[last - 1]:
+        last -= 1
+    omitted.sort(key=lambda region: region[1])
+    return CompactedSource("\n".join(kept[first:last]), omitted, origins[first:last])
+
+def _is_comment(line: str) -> bool:
+    stripped = line.lstrip()
+    return stripped.startswith(COMMENT_PREFIXES) and not PREPROCESSOR.match(stripped)
+
+def _license_header(lines: List[str]):
+    """(start, end) of a leading comment block that reads like a license, or None"""
+    start = 0
+    while start < len(lines) and (lines[start].startswith("#!") or
+                                  ("coding" in lines[start][:30] and _is_comment(lines[start]))):
+        start += 1  # Keep the shebang and encoding declaration
+    end = start
+    while end < len(lines) and (_is_comment(lines[end]) or not lines[end]):
+        end += 1
+    while end > start and not lines[end - 1]:
+        end -= 1
+    if end - start < 3:
+        return None
+    if not LICENSE_MARKERS.search("\n".join(lines[start:end])):
+        return None
+    return start, end
+
+def _generated_sections(lines: List[str]):
+    """(start, end) of regions between begin/end generated-code markers, markers kept"""
+    start = None
+    for index, line in enumerate(lines):
+        if not _is_comment(line):
+            continue
+        if start is None and GENERATED_BEGIN.search(line):
+            start = index + 1
+        elif start is not None and GENERATED_END.search(line):
+            if index > start:
+                yield start, index
+            start = None
+
+def _literal_runs(lines: List[str], drop: list):
+    """(start, end) of runs of literal-only lines too long to send whole"""
+    start = None
+    for index in range(len(lines) + 1):
+        is_literal = (index < len(lines) and drop[index] is None and bool(lines[index])
+                      and LITERAL_LINE.match(lines[index]) is not None)
+        if is_literal:
+            if start is None:
+                start = index
+            continue
+        if start is not None and index - start > COMPACT_MAX_LITERAL_LINES:
+            yield start, index
+        start = None
+
+def _comment_prefix(filename: str) -> str:
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension in HASH_COMMENT_EXTENSIONS:
+        return "#"
+    if extension in DASH_COMMENT_EXTENSIONS:
+        return "--"
+    return "//"
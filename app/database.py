@@ -1,17 +1,47 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float
+from sqlalchemy import (
+    inspect, text, Column, Integer, String, Text, Date, DateTime, Float, ForeignKey, Index, LargeBinary
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, deferred, relationship
 from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import asyncio
+import hashlib
 import os
+import zlib
 from dotenv import load_dotenv
 
+from .db_config import create_db_engine, create_async_db_engine, is_memory_sqlite
+from .metrics import stage
+from .search import create_search_index
+from .review_parsing import normalize_suggestions
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./code_reviews.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
+# Compression for stored file contents: "zstd" (needs the zstandard package), "zlib" or "none"
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "zstd" if zstandard else "zlib").lower()
+
+engine = create_db_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the request handlers; None when the async driver is not
+# installed, or for in-memory SQLite, where a second engine would see a
+# different database
+async_engine = None if is_memory_sqlite(DATABASE_URL) else create_async_db_engine(DATABASE_URL)
+if async_engine is not None:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    AsyncSessionLocal = None
+
 Base = declarative_base()
 
 class CodeReview(Base):
@@ -19,17 +49,236 @@ class CodeReview(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
-    file_content = Column(Text)
-    review_report = Column(Text)
+    # Uploaded contents live in file_blobs, keyed by hash; file_content is only
+    # set on rows written before blob storage and not yet migrated
+    content_hash = Column(String(64), index=True)
+    # Large text columns are only loaded when accessed or explicitly undeferred
+    file_content = deferred(Column(Text), group="content")
+    review_report = deferred(Column(Text), group="report")
     readability_score = Column(Float)
     modularity_score = Column(Float)
     bug_risk_score = Column(Float)
     overall_score = Column(Float)
-    suggestions = Column(Text)
+    # Suggestion texts joined with newlines, kept for older clients and search;
+    # suggestion_items holds them structured
+    suggestions = deferred(Column(Text), group="report")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    suggestion_items = relationship(
+        "ReviewSuggestion", order_by="ReviewSuggestion.position", cascade="all, delete-orphan"
+    )
+    
+    # Back keyset pagination on (created_at, id) and the list filters
+    __table_args__ = (
+        Index("ix_code_reviews_created_at_id", "created_at", "id"),
+        Index("ix_code_reviews_filename_created_at_id", "filename", "created_at", "id"),
+        Index("ix_code_reviews_overall_score_created_at", "overall_score", "created_at"),
+        Index("ix_code_reviews_bug_risk_score_created_at", "bug_risk_score", "created_at"),
+    )
+
+class ReviewSuggestion(Base):
+    __tablename__ = "review_suggestions"
+    
+    # A natural key, so the rows of a review are inserted in one executemany
+    # without reading generated ids back
+    review_id = Column(Integer, ForeignKey("code_reviews.id", ondelete="CASCADE"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    severity = Column(String(16), nullable=False)
+    category = Column(String(32), nullable=False)
+    line_start = Column(Integer)
+    line_end = Column(Integer)
+    text = Column(Text, nullable=False)
+    
+    # Back the newest-first filters of /api/suggestions
+    __table_args__ = (
+        Index("ix_review_suggestions_category_severity_review_id", "category", "severity", "review_id"),
+        Index("ix_review_suggestions_severity_review_id", "severity", "review_id"),
+    )
+
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+    
+    content_hash = Column(String(64), primary_key=True)
+    compression = Column(String, default="none")
+    size = Column(Integer)
+    stored_size = Column(Integer)
+    data = deferred(Column(LargeBinary))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ReviewCacheEntry(Base):
+    __tablename__ = "review_cache"
+    
+    cache_key = Column(String(64), primary_key=True)
+    model = Column(String)
+    prompt_version = Column(String)
+    review_json = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ReviewJob(Base):
+    __tablename__ = "review_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, index=True, default="queued")
+    filename = Column(String)
+    file_content = Column(Text)
+    review_id = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class DailyScore(Base):
+    """Review count and score sums per day over all files"""
+    __tablename__ = "daily_scores"
+    
+    day = Column(Date, primary_key=True)
+    review_count = Column(Integer, default=0)
+    readability_score_sum = Column(Float, default=0.0)
+    modularity_score_sum = Column(Float, default=0.0)
+    bug_risk_score_sum = Column(Float, default=0.0)
+    overall_score_sum = Column(Float, default=0.0)
+
+class ScoreRollup(Base):
+    """Review count and score sums per file per day"""
+    __tablename__ = "score_rollups"
+    
+    filename = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    review_count = Column(Integer, default=0)
+    readability_score_sum = Column(Float, default=0.0)
+    modularity_score_sum = Column(Float, default=0.0)
+    bug_risk_score_sum = Column(Float, default=0.0)
+    overall_score_sum = Column(Float, default=0.0)
+
+class ScoreHistogram(Base):
+    """Reviews per day per score value (in tenths), for percentiles over all files"""
+    __tablename__ = "score_histograms"
+    
+    score_field = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    bin = Column(Integer, primary_key=True)
+    review_count = Column(Integer, default=0)
+
+class FileScore(Base):
+    """All-time review count, score sums and latest score per file"""
+    __tablename__ = "file_scores"
+    
+    filename = Column(String, primary_key=True)
+    review_count = Column(Integer, default=0)
+    readability_score_sum = Column(Float, default=0.0)
+    modularity_score_sum = Column(Float, default=0.0)
+    bug_risk_score_sum = Column(Float, default=0.0)
+    overall_score_sum = Column(Float, default=0.0)
+    latest_overall_score = Column(Float, index=True)
+    last_reviewed_at = Column(DateTime)
+
+def create_review_record(db, filename: str, content: str, analysis: dict) -> CodeReview:
+    """Build a CodeReview row from an LLM analysis, storing its content as a blob"""
+    review = CodeReview(
+        filename=filename,
+        review_report=analysis["report"],
+        readability_score=analysis["scores"]["readability_score"],
+        modularity_score=analysis["scores"]["modularity_score"],
+        bug_risk_score=analysis["scores"]["bug_risk_score"],
+        overall_score=analysis["scores"]["overall_score"],
+        created_at=datetime.utcnow()
+    )
+    items = normalize_suggestions(analysis["suggestions"])
+    review.suggestions = "\n".join(item["text"] for item in items)
+    # Inserted together with the review, in one batch
+    review.suggestion_items = [ReviewSuggestion(position=i, **item) for i, item in enumerate(items)]
+    review.content_hash = store_blob(db, content)
+    # Imported here: analytics imports the models above
+    from .analytics import record_review_scores
+    record_review_scores(db, review)
+    return review
+
+def compress_content(data: bytes, codec: str = BLOB_COMPRESSION) -> Tuple[str, bytes]:
+    """Compress file contents, keeping them raw when compression does not help"""
+    if codec == "zstd" and zstandard is not None:
+        compressed = zstandard.ZstdCompressor(level=6).compress(data)
+    elif codec in ("zlib", "zstd"):
+        codec = "zlib"
+        compressed = zlib.compress(data, 6)
+    else:
+        return "none", data
+    if len(compressed) >= len(data):
+        return "none", data
+    return codec, compressed
+
+def decompress_content(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed file contents")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+def store_blob(db, content: str) -> str:
+    """Store file contents once per distinct content and return their hash"""
+    data = content.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    if db.get(FileBlob, digest) is not None:
+        return digest
+
+    codec, payload = compress_content(data)
+    try:
+        # Savepoint so a concurrent insert of the same content only undoes this row
+        with db.begin_nested():
+            db.add(FileBlob(content_hash=digest, compression=codec, size=len(data),
+                            stored_size=len(payload), data=payload))
+    except IntegrityError:
+        pass
+    return digest
+
+def load_blobs(db, hashes: Iterable[str]) -> Dict[str, str]:
+    """Fetch and decode many blobs in one query"""
+    hashes = {h for h in hashes if h}
+    if not hashes:
+        return {}
+    rows = db.query(FileBlob.content_hash, FileBlob.compression, FileBlob.data).filter(
+        FileBlob.content_hash.in_(hashes)
+    ).all()
+    return {h: decompress_content(codec, data).decode("utf-8") for h, codec, data in rows}
+
+def review_content(db, review: CodeReview) -> Optional[str]:
+    """The reviewed file contents, from the blob store or the legacy column"""
+    if review.content_hash:
+        return load_blobs(db, [review.content_hash]).get(review.content_hash)
+    return review.file_content
+
+def release_blob(db, content_hash: Optional[str]):
+    """Delete a blob once no review references it"""
+    if content_hash and db.query(CodeReview.id).filter(CodeReview.content_hash == content_hash).first() is None:
+        db.query(FileBlob).filter(FileBlob.content_hash == content_hash).delete(synchronize_session=False)
 
 def create_tables():
+    # daily_scores replaced the all-files rows of score_rollups, so its absence also calls for a rebuild
+    new_rollups = not inspect(engine).has_table(DailyScore.__tablename__)
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    # create_all skips existing tables, so add indexes introduced since they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    create_search_index(engine)
+    if new_rollups:
+        # Score analytics of reviews stored before the rollup tables existed
+        from .analytics import rebuild_rollups
+        rebuild_rollups(engine)
+
+def add_missing_columns():
+    """Add nullable columns introduced since an existing table was created"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable and not column.primary_key:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
 
 def get_db():
     db = SessionLocal()
@@ -37,3 +286,22 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def run_db(fn: Callable, *args, **kwargs):
+    """
+    Run ``fn(session, *args, **kwargs)`` without blocking the event loop:
+    through the async engine when there is one, otherwise on a worker thread.
+    ``fn`` commits its own writes; anything uncommitted is rolled back.
+    """
+    with stage("db"):
+        if AsyncSessionLocal is not None:
+            async with AsyncSessionLocal() as session:
+                return await session.run_sync(fn, *args, **kwargs)
+
+        def call():
+            db = SessionLocal()
+            try:
+                return fn(db, *args, **kwargs)
+            finally:
+                db.close()
+        return await asyncio.get_running_loop().run_in_executor(None, call)
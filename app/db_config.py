@@ -0,0 +1,102 @@
+import os
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
+
+# Connection pool sizing (ignored for in-memory SQLite, which uses one shared connection)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Milliseconds a SQLite connection waits on a lock before raising "database is locked"
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "30000"))
+
+# PRAGMAs applied to every SQLite connection. WAL lets readers run alongside
+# the single writer; synchronous=NORMAL is safe under WAL and avoids an
+# fsync per commit; cache_size is in KiB when negative.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Async drivers used for each sync driver
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+def engine_options(url: str) -> Dict:
+    """create_engine keyword arguments for ``url``"""
+    if is_memory_sqlite(url):
+        # Every connection to :memory: is a new empty database; share one
+        return {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool}
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": not is_sqlite(url),
+    }
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT / 1000}
+    return options
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: Optional[Dict[str, str]] = None):
+    """Run the PRAGMAs on every new connection of a SQLite engine"""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}")
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+        finally:
+            cursor.close()
+
+def create_db_engine(url: str, pragmas: Optional[Dict[str, str]] = None) -> Engine:
+    """Sync engine with pooling configured and, for SQLite, the tuning PRAGMAs applied"""
+    engine = create_engine(url, **engine_options(url))
+    if is_sqlite(url):
+        apply_sqlite_pragmas(engine, pragmas)
+    return engine
+
+def async_database_url(url: str) -> str:
+    """The async-driver equivalent of a sync database URL"""
+    parsed = make_url(url)
+    if "+" in parsed.drivername and parsed.drivername.split("+")[1] in ("aiosqlite", "asyncpg", "aiomysql"):
+        return url
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for {parsed.get_backend_name()}")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+def create_async_db_engine(url: str, pragmas: Optional[Dict[str, str]] = None):
+    """
+    Async engine for ``url``, or None when the async driver (aiosqlite,
+    asyncpg, ...) or SQLAlchemy's asyncio extension is not installed.
+    """
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        engine = create_async_engine(async_database_url(url), **engine_options(url))
+    except (ImportError, ValueError):
+        return None
+    if is_sqlite(url):
+        apply_sqlite_pragmas(engine.sync_engine, pragmas)
+    return engine
@@ -0,0 +1,160 @@
+import difflib
+import os
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import selectinload, undefer_group
+
+from .chunking import SCORE_KEYS
+from .database import CodeReview, review_content
+from .review_parsing import suggestion_text
+
+# Unchanged lines sent around each changed hunk
+DIFF_CONTEXT_LINES = int(os.getenv("DIFF_CONTEXT_LINES", "10"))
+
+# Above this share of changed lines a full review is cheaper to reason about than a diff
+INCREMENTAL_MAX_CHANGE_RATIO = float(os.getenv("INCREMENTAL_MAX_CHANGE_RATIO", "0.5"))
+
+UNCHANGED_HEADING = "## Unchanged code (from "
+
+class DiffHunk(NamedTuple):
+    start_line: int  # 1-based, inclusive, in the new file (context included)
+    end_line: int    # 1-based, inclusive
+    changed: int     # lines added or removed
+    text: str        # unified diff of the hunk, header included
+    # (old_start, old_end, new_start, new_end) of each change, 0-based and end-exclusive like difflib opcodes
+    changes: Tuple[Tuple[int, int, int, int], ...] = ()
+
+def load_base_review(db, filename: str, review_id: Optional[int] = None) -> Optional[Dict]:
+    """
+    The review an upload is compared against: ``review_id`` if given,
+    otherwise the latest review of the same filename.
+    """
+    query = db.query(CodeReview).options(undefer_group("report"), selectinload(CodeReview.suggestion_items))
+    if review_id is not None:
+        review = query.filter(CodeReview.id == review_id).first()
+    else:
+        review = query.filter(CodeReview.filename == filename).order_by(
+            CodeReview.created_at.desc(), CodeReview.id.desc()
+        ).first()
+    if review is None:
+        return None
+
+    content = review_content(db, review)
+    if content is None:
+        return None
+    return {
+        "id": review.id,
+        "content": content,
+        "analysis": {
+            "report": review.review_report,
+            "scores": {key: getattr(review, key) for key in SCORE_KEYS},
+            "suggestions": base_suggestions(review)
+        }
+    }
+
+def base_suggestions(review: CodeReview) -> List:
+    """A stored review's suggestions: structured, or split from the text of reviews stored before that"""
+    if review.suggestion_items:
+        return [{
+            "text": item.text,
+            "severity": item.severity,
+            "category": item.category,
+            "line_start": item.line_start,
+            "line_end": item.line_end
+        } for item in review.suggestion_items]
+    return [s for s in (review.suggestions or "").split("\n") if s]
+
+def compute_hunks(old: str, new: str, context: int = DIFF_CONTEXT_LINES) -> List[DiffHunk]:
+    """Changed regions of ``new`` relative to ``old``, with ``context`` lines around each"""
+    old_lines = old.split("\n")
+    new_lines = new.split("\n")
+    # Blank lines and closing braces are "popular" and treated as junk by
+    # default, which keeps matching close to linear on large files
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+
+    hunks = []
+    for group in matcher.get_grouped_opcodes(context):
+        old_start, old_end = group[0][1], group[-1][2]
+        new_start, new_end = group[0][3], group[-1][4]
+        lines = [f"@@ -{old_start + 1},{old_end - old_start} +{new_start + 1},{new_end - new_start} @@"]
+        changed = 0
+        changes = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line for line in old_lines[i1:i2])
+                continue
+            lines.extend("-" + line for line in old_lines[i1:i2])
+            lines.extend("+" + line for line in new_lines[j1:j2])
+            changed += max(i2 - i1, j2 - j1)
+            changes.append((i1, i2, j1, j2))
+        hunks.append(DiffHunk(new_start + 1, max(new_start + 1, new_end), changed, "\n".join(lines), tuple(changes)))
+    return hunks
+
+def describe_hunks(hunks: List[DiffHunk]) -> str:
+    """"lines 3-25, 140-162" for the regions covered by the hunks"""
+    return "lines " + ", ".join(f"{hunk.start_line}-{hunk.end_line}" for hunk in hunks)
+
+def remap_suggestions(suggestions: List, hunks: List[DiffHunk]) -> List:
+    """
+    Move the line numbers of a base review's suggestions to where those
+    lines are in the new file. Suggestions on lines that changed are
+    dropped: the review of the changes covers them, and their old locations
+    would be stale. Suggestions without lines are kept as they are.
+    """
+    changes = [change for hunk in hunks for change in hunk.changes]
+    remapped = []
+    for suggestion in suggestions:
+        if isinstance(suggestion, str) or suggestion.get("line_start") is None:
+            remapped.append(suggestion)
+            continue
+        start = suggestion["line_start"]
+        end = suggestion.get("line_end") or start
+        shift = 0
+        for old_start, old_end, new_start, new_end in changes:
+            if old_start == old_end:
+                # Lines inserted after old line old_start
+                overlaps, before = start <= old_start < end, old_start < start
+            else:
+                # Old lines old_start + 1 .. old_end replaced or deleted
+                overlaps, before = old_start < end and old_end >= start, old_end < start
+            if overlaps:
+                break
+            if before:
+                shift += (new_end - new_start) - (old_end - old_start)
+        else:
+            remapped.append({**suggestion, "line_start": start + shift, "line_end": end + shift})
+    return remapped
+
+def merge_incremental(base: Dict, delta: Dict, hunks: List[DiffHunk], total_lines: int,
+                      base_review_id: Optional[int] = None) -> Dict:
+    """
+    Combine the review of the changed hunks with the previous review of the
+    file. Scores are weighted by the share of the file each review covers,
+    and the previous suggestions are moved to their lines in the new file.
+    """
+    reviewed = sum(hunk.end_line - hunk.start_line + 1 for hunk in hunks)
+    weight = min(1.0, reviewed / max(total_lines, 1))
+    scores = {
+        key: round(float(base["scores"][key]) * (1 - weight) + float(delta["scores"][key]) * weight, 1)
+        for key in SCORE_KEYS
+    }
+
+    base_report = base["report"]
+    if base_report.startswith("## Changes (") and UNCHANGED_HEADING in base_report:
+        # The base was itself incremental; carry forward only the full review it quoted
+        base_report = base_report.split(UNCHANGED_HEADING, 1)[1].split("\n\n", 1)[-1]
+
+    previous = f"review #{base_review_id}" if base_review_id is not None else "the previous review"
+    report = (
+        f"## Changes ({describe_hunks(hunks)})\n\n{delta['report']}\n\n"
+        f"{UNCHANGED_HEADING}{previous})\n\n{base_report}"
+    )
+
+    suggestions = []
+    seen = set()
+    for suggestion in list(delta["suggestions"]) + remap_suggestions(base["suggestions"], hunks):
+        text = suggestion_text(suggestion)
+        if text not in seen:
+            seen.add(text)
+            suggestions.append(suggestion)
+    return {"report": report, "scores": scores, "suggestions": suggestions}
@@ -0,0 +1,256 @@
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import func, update
+
+from .database import ReviewJob, create_review_record, run_db
+
+# Number of concurrent review workers per process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+# Seconds between polls for jobs queued by other processes
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+# Jobs that fail with an exception are retried this many times
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Running jobs older than this are assumed orphaned by a dead process and re-queued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "900"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+class ReviewJobQueue:
+    """
+    Persistent review job queue backed by the ``review_jobs`` table.
+
+    Jobs are claimed with a conditional UPDATE, so several workers (and
+    several processes sharing the database) never run the same job. Jobs
+    interrupted by a shutdown are re-queued on stop, and jobs orphaned by a
+    process that died are re-queued once their lease expires.
+    """
+
+    def __init__(self, reviewer, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.reviewer = reviewer
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._running = {}  # job id -> asyncio.Task of the review in progress
+        self._cancelled = set()
+        self._wakeup = None
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._last_recovery = 0.0
+
+    async def start(self):
+        """Recover orphaned jobs and start the worker pool"""
+        self._wakeup = asyncio.Event()
+        await self.recover()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; unfinished jobs stay queued for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Anything this process interrupted mid-review goes back on the queue
+        await self.recover(own_only=True)
+
+    async def recover(self, own_only: bool = False) -> int:
+        """Re-queue running jobs owned by this process, or whose lease expired"""
+        if not own_only:
+            self._last_recovery = time.monotonic()
+        return await run_db(self._requeue, own_only)
+
+    def _requeue(self, db, own_only: bool) -> int:
+        if own_only:
+            condition = ReviewJob.worker_id == self.worker_id
+        else:
+            condition = ReviewJob.started_at < datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+        result = db.execute(
+            update(ReviewJob)
+            .where(ReviewJob.status == RUNNING, condition)
+            .values(status=QUEUED, started_at=None, worker_id=None)
+        )
+        db.commit()
+        return result.rowcount
+
+    async def submit(self, filename: str, content: str) -> ReviewJob:
+        """Queue a review and return the job immediately"""
+        job = await run_db(self._insert, filename, content)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: int) -> Optional[ReviewJob]:
+        return await run_db(self._load, job_id)
+
+    async def cancel(self, job_id: int) -> Optional[ReviewJob]:
+        """Cancel a queued or running job; finished jobs are left unchanged"""
+        job = await run_db(self._mark_cancelled, job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            self._cancelled.add(job_id)
+            task.cancel()
+        return job
+
+    def _insert(self, db, filename: str, content: str) -> ReviewJob:
+        job = ReviewJob(filename=filename, file_content=content, status=QUEUED)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        db.expunge(job)
+        return job
+
+    def _load(self, db, job_id: int) -> Optional[ReviewJob]:
+        job = db.query(ReviewJob).filter(ReviewJob.id == job_id).first()
+        if job is not None:
+            db.expunge(job)
+        return job
+
+    def _mark_cancelled(self, db, job_id: int) -> Optional[ReviewJob]:
+        db.execute(
+            update(ReviewJob)
+            .where(ReviewJob.id == job_id, ReviewJob.status.in_([QUEUED, RUNNING]))
+            .values(status=CANCELLED, finished_at=datetime.utcnow())
+        )
+        db.commit()
+        return self._load(db, job_id)
+
+    def running(self) -> int:
+        """Jobs being reviewed by this process right now"""
+        return len(self._running)
+
+    async def stats(self) -> Dict:
+        """Queue depth, wait time and run time over the last hour"""
+        since = datetime.utcnow() - timedelta(hours=1)
+        counts, oldest_queued, recent = await run_db(self._stats_rows, since)
+
+        waits = [(started - created).total_seconds() for created, started, _ in recent]
+        runs = [(finished - started).total_seconds() for _, started, finished in recent]
+        now = datetime.utcnow()
+        return {
+            "workers": len(self._tasks),
+            "queue_depth": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "counts": {status: counts.get(status, 0) for status in (QUEUED, RUNNING) + FINISHED_STATUSES},
+            "oldest_queued_seconds": round((now - oldest_queued).total_seconds(), 3) if oldest_queued else 0.0,
+            "last_hour": {
+                "finished": len(recent),
+                "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "max_wait_seconds": round(max(waits), 3) if waits else 0.0,
+                "avg_run_seconds": round(sum(runs) / len(runs), 3) if runs else 0.0,
+                "max_run_seconds": round(max(runs), 3) if runs else 0.0
+            }
+        }
+
+    def _stats_rows(self, db, since: datetime) -> tuple:
+        counts = dict(db.query(ReviewJob.status, func.count(ReviewJob.id)).group_by(ReviewJob.status).all())
+        oldest_queued = db.query(func.min(ReviewJob.created_at)).filter(ReviewJob.status == QUEUED).scalar()
+        recent = db.query(ReviewJob.created_at, ReviewJob.started_at, ReviewJob.finished_at).filter(
+            ReviewJob.finished_at >= since, ReviewJob.started_at.isnot(None)
+        ).all()
+        return counts, oldest_queued, recent
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await run_db(self._claim)
+                if job is not None:
+                    await self._run(job)
+                    continue
+                if time.monotonic() - self._last_recovery > 60:
+                    await self.recover()
+            except Exception:
+                # A database hiccup must not kill the worker
+                pass
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self, db) -> Optional[ReviewJob]:
+        """Atomically move the oldest queued job to running"""
+        while True:
+            job_id = db.query(ReviewJob.id).filter(ReviewJob.status == QUEUED).order_by(ReviewJob.id).limit(1).scalar()
+            if job_id is None:
+                return None
+            result = db.execute(
+                update(ReviewJob)
+                .where(ReviewJob.id == job_id, ReviewJob.status == QUEUED)
+                .values(status=RUNNING, started_at=datetime.utcnow(), worker_id=self.worker_id,
+                        attempts=ReviewJob.attempts + 1)
+            )
+            db.commit()
+            if result.rowcount == 1:
+                return self._load(db, job_id)
+            # Another worker won the race; try the next job
+
+    async def _run(self, job: ReviewJob):
+        task = asyncio.create_task(self.reviewer.analyze_code_async(job.filename, job.file_content))
+        self._running[job.id] = task
+        try:
+            analysis = await task
+        except asyncio.CancelledError:
+            if job.id in self._cancelled:
+                self._cancelled.discard(job.id)
+                return  # Cancelled through cancel(); the row is already updated
+            raise
+        except Exception as e:
+            retry = job.attempts < JOB_MAX_ATTEMPTS
+            await self._finish(job.id, QUEUED if retry else FAILED, error=str(e))
+            return
+        finally:
+            self._running.pop(job.id, None)
+
+        await run_db(self._complete, job, analysis)
+
+    def _complete(self, db, job: ReviewJob, analysis: dict):
+        """Save the review and mark the job completed"""
+        try:
+            review = create_review_record(db, job.filename, job.file_content, analysis)
+            db.add(review)
+            db.flush()
+            # Only record the result if the job was not cancelled meanwhile
+            result = db.execute(
+                update(ReviewJob)
+                .where(ReviewJob.id == job.id, ReviewJob.status == RUNNING)
+                .values(status=COMPLETED, review_id=review.id, finished_at=datetime.utcnow())
+            )
+            if result.rowcount == 1:
+                db.commit()
+            else:
+                db.rollback()
+        except Exception as e:
+            db.rollback()
+            self._mark_finished(db, job.id, FAILED, error=f"Error saving review: {e}")
+
+    async def _finish(self, job_id: int, status: str, error: Optional[str] = None):
+        await run_db(self._mark_finished, job_id, status, error)
+        if status == QUEUED and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _mark_finished(self, db, job_id: int, status: str, error: Optional[str] = None):
+        values = {"status": status, "error": error}
+        if status == QUEUED:
+            values.update(started_at=None, worker_id=None)
+        else:
+            values["finished_at"] = datetime.utcnow()
+        db.execute(
+            update(ReviewJob)
+            .where(ReviewJob.id == job_id, ReviewJob.status == RUNNING)
+            .values(**values)
+        )
+        db.commit()
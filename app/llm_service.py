@@ -1,158 +1,705 @@
-import openai
 import os
-from typing import Dict, List
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
 from dotenv import load_dotenv
-import json
-import re
+import copy
+import time
+
+from .cache import ReviewCache, make_cache_key
+from .chunking import needs_chunking, split_into_chunks, merge_reviews
+from .streaming import ReportStreamExtractor
+from .metrics import LLM_IN_FLIGHT, LLM_REQUESTS, record_llm_usage, record_stage, stage
+from .review_parsing import JsonObjectScanner, validate_review, partial_report
+from .static_analysis import static_review
+from .compaction import PROMPT_COMPACTION, compact_source
+from .model_router import ModelRouter
+from .rate_limit import RateLimiter, LLM_MAX_RETRIES, estimate_tokens, retry_kind, retry_after, backoff_delay
+from .singleflight import SingleFlight, REVIEW_COALESCING
+from .incremental import INCREMENTAL_MAX_CHANGE_RATIO, DIFF_CONTEXT_LINES, compute_hunks, merge_incremental
 
 load_dotenv()
 
+# Bump whenever the prompt template changes so cached reviews are not reused
+PROMPT_VERSION = "5"
+
+# Set to "false" to always call the LLM
+REVIEW_CACHE_ENABLED = os.getenv("REVIEW_CACHE_ENABLED", "true").lower() == "true"
+
+# Maximum number of LLM calls allowed in flight at once (async path)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Per-request timeout in seconds for a single LLM completion
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Static instructions are kept in the system prompt so it is identical on every
+# call, letting the provider cache it; the user prompt only carries the code
+SYSTEM_PROMPT = """You are an expert code reviewer with extensive experience in software development best practices.
+
+Review the code you are given for readability, modularity, and potential bugs, and provide a comprehensive analysis with specific improvement suggestions. Focus on:
+1. Code readability and clarity
+2. Modularity and separation of concerns
+3. Potential bugs and edge cases
+4. Best practices and conventions
+5. Performance considerations
+6. Security implications
+
+Respond with JSON in the following format:
+{"report": "Detailed analysis of the code...", "scores": {"readability_score": 0.0-10.0, "modularity_score": 0.0-10.0, "bug_risk_score": 0.0-10.0, "overall_score": 0.0-10.0}, "suggestions": [{"text": "Specific improvement suggestion", "severity": "critical|high|medium|low|info", "category": "bug|security|performance|readability|modularity|style|testing|documentation|general", "line_start": 12, "line_end": 18}, "..."]}
+Give line_start and line_end of the code each suggestion refers to, or null when it applies to the whole file.
+
+To save space, license headers, generated code and the middle of long data tables may be left out; a comment marks each omission with the lines it replaces. Runs of blank lines are collapsed.
+When given a diff, review and score only the changed code: lines starting with "+" were added, lines starting with "-" were removed. Refer to line numbers of the new file (the "+" side of each hunk header).
+
+Provide actionable, specific suggestions for improvement."""
+
+# Ask models for a JSON object (response_format) so output always parses
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "true").lower() == "true"
+
+# Models that predate JSON mode (besides plain "gpt-4")
+JSON_MODE_UNSUPPORTED = ("gpt-4-0314", "gpt-4-0613", "gpt-4-32k", "gpt-3.5-turbo-0301", "gpt-3.5-turbo-0613",
+                         "gpt-3.5-turbo-16k")
+
+# Upper bound on the length of a review; counted against the tokens-per-minute budget
+MAX_COMPLETION_TOKENS = 2000
+
 class LLMCodeReviewer:
-    def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if api_key and api_key != "your_openai_api_key_here":
-            self.client = openai.OpenAI(api_key=api_key)
-            self.api_available = True
-        else:
-            self.client = None
-            self.api_available = False
-    
-    def analyze_code(self, filename: str, content: str) -> Dict:
+    def __init__(self, max_concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 cache: Optional[ReviewCache] = None, rate_limiter: Optional[RateLimiter] = None,
+                 router: Optional[ModelRouter] = None):
+        self.max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+        self.timeout = timeout or LLM_TIMEOUT
+        self._semaphore = None
+        self.cache = cache if cache is not None else (ReviewCache() if REVIEW_CACHE_ENABLED else None)
+        self.flights = SingleFlight()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.router = router or ModelRouter()
+        self.prompt_stats = {"prompts": 0, "tokens_before": 0, "tokens_after": 0}
+        self._json_mode_rejected = set()
+
+        self._api_key = os.getenv("OPENAI_API_KEY")
+        self.api_available = bool(self._api_key) and self._api_key != "your_openai_api_key_here"
+        # Built on first use: importing openai is most of the app's startup time
+        self._client = None
+        self._async_client = None
+
+    @property
+    def client(self):
+        """Sync OpenAI client, or None without an API key"""
+        if self._client is None and self.api_available:
+            import openai
+            # Retries go through the shared rate limiter instead of the client's own
+            self._client = openai.OpenAI(api_key=self._api_key, timeout=self.timeout, max_retries=0)
+        return self._client
+
+    @property
+    def async_client(self):
+        """Async OpenAI client, or None without an API key"""
+        if self._async_client is None and self.api_available:
+            import openai
+            self._async_client = openai.AsyncOpenAI(api_key=self._api_key, timeout=self.timeout, max_retries=0)
+        return self._async_client
+
+    async def close(self):
         """
-        Analyze code using OpenAI GPT for code review
+        Close the OpenAI clients, before the event loop the async one was
+        used in closes. They are created again if the reviewer is used later.
         """
-        prompt = f"""
-        Please review the following code file "{filename}" for readability, modularity, and potential bugs. 
-        Provide a comprehensive analysis with specific improvement suggestions.
-
-        Code to review:
-        ```{self._get_file_extension(filename)}
-        {content}
-        ```
-
-        Please provide your analysis in the following JSON format:
-        {{
-            "report": "Detailed analysis of the code...",
-            "scores": {{
-                "readability_score": 0.0-10.0,
-                "modularity_score": 0.0-10.0,
-                "bug_risk_score": 0.0-10.0,
-                "overall_score": 0.0-10.0
-            }},
-            "suggestions": [
-                "Specific improvement suggestion 1",
-                "Specific improvement suggestion 2",
-                "..."
-            ]
-        }}
-
-        Focus on:
-        1. Code readability and clarity
-        2. Modularity and separation of concerns
-        3. Potential bugs and edge cases
-        4. Best practices and conventions
-        5. Performance considerations
-        6. Security implications
+        if self._async_client is not None:
+            client, self._async_client = self._async_client, None
+            await client.close()
+        if self._client is not None:
+            client, self._client = self._client, None
+            client.close()
+        # Bound to the loop it was first awaited in
+        self._semaphore = None
 
-        Provide actionable, specific suggestions for improvement.
+    def analyze_code(self, filename: str, content: str) -> Dict:
+        """
+        Analyze code using OpenAI GPT for code review
         """
-        
         try:
             # Check if OpenAI API key is available
             if not self.api_available:
                 return self._create_demo_response(filename, content)
-            
-            # Try different models in order of preference
-            models_to_try = ["gpt-3.5-turbo", "gpt-4", "gpt-4-turbo"]
-            response = None
-            
-            for model in models_to_try:
-                try:
-                    response = self.client.chat.completions.create(
-                        model=model,
-                        messages=[
-                            {"role": "system", "content": "You are an expert code reviewer with extensive experience in software development best practices."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        temperature=0.3,
-                        max_tokens=2000
-                    )
-                    break  # If successful, break out of the loop
-                except Exception as model_error:
-                    if "insufficient_quota" in str(model_error) or "quota" in str(model_error):
-                        return self._create_demo_response(filename, content)
-                    elif "model_not_found" in str(model_error) or "does not exist" in str(model_error):
-                        continue  # Try next model
-                    else:
-                        raise model_error  # Re-raise if it's a different error
-            
+
+            cache_key = self._cache_key(filename, content)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            prompt = self._build_prompt(filename, content)
+            response, model = self._route_completion(prompt, self._line_count(content))
             if response is None:
                 return self._create_demo_response(filename, content)
-            
-            content = response.choices[0].message.content
-            
-            # Try to extract JSON from the response
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                return json.loads(json_str)
-            else:
-                # Fallback if JSON parsing fails
-                return self._create_fallback_response(content)
-                
+
+            return self._parse_response(response.choices[0].message.content or "", filename, content,
+                                        self._answer_cache_key(cache_key, model, content), response.model)
+
         except Exception as e:
-            # If OpenAI fails, fall back to demo mode
-            if "quota" in str(e).lower() or "limit" in str(e).lower():
+            # Out of quota: fall back to the offline review. Rate limits were
+            # already retried, so anything else is reported as an error.
+            if self._is_quota_error(e):
                 return self._create_demo_response(filename, content)
             return self._create_error_response(str(e))
-    
+
+    async def analyze_code_async(self, filename: str, content: str, context: Optional[str] = None) -> Dict:
+        """
+        Analyze code without blocking the event loop.
+
+        Calls are bounded by ``max_concurrency`` and each completion is
+        cancelled after ``timeout`` seconds. Large files are split into
+        chunks that are reviewed concurrently and merged. ``context`` is
+        reference material sent along with the code, such as the signatures
+        of the repository code it imports.
+        """
+        if self.api_available and needs_chunking(content):
+            return await self._analyze_chunked_async(filename, content, context)
+        return await self._analyze_single_async(filename, content, context=context)
+
+    async def _analyze_chunked_async(self, filename: str, content: str, context: Optional[str] = None) -> Dict:
+        """Map-reduce review: review every chunk concurrently, then merge"""
+        chunks = split_into_chunks(filename, content)
+        if len(chunks) == 1:
+            return await self._analyze_single_async(filename, content, context=context)
+
+        def review(chunk):
+            return self._analyze_single_async(
+                filename, chunk.content, excerpt=f"lines {chunk.start_line}-{chunk.end_line}, {chunk.name}",
+                context=context
+            )
+
+        reviews = list(await asyncio.gather(*(review(chunk) for chunk in chunks)))
+        # Errors are not cached, so a failed chunk is sent to the LLM again, once
+        retry = [i for i, result in enumerate(reviews) if self._is_error_response(result)]
+        for i, result in zip(retry, await asyncio.gather(*(review(chunks[i]) for i in retry))):
+            reviews[i] = result
+
+        reviewed = [(chunk, result) for chunk, result in zip(chunks, reviews) if not self._is_error_response(result)]
+        if not reviewed:
+            return reviews[0]
+        # Chunks that still failed are left out rather than scored as zeros
+        failed = [(chunk, result["report"]) for chunk, result in zip(chunks, reviews)
+                  if self._is_error_response(result)]
+        return merge_reviews([chunk for chunk, _ in reviewed], [result for _, result in reviewed], failed)
+
+    async def _analyze_single_async(self, filename: str, content: str, excerpt: Optional[str] = None,
+                                    context: Optional[str] = None) -> Dict:
+        """Review one file, or one excerpt of a file, with a single LLM call"""
+        cache_key = self._cache_key(filename, content, "excerpt" if excerpt is not None else None, context)
+        return await self._complete_review_async(
+            filename, content, lambda: self._build_prompt(filename, content, excerpt, context), cache_key
+        )
+
+    async def analyze_incremental_async(self, filename: str, content: str, base: Optional[Dict]) -> Dict:
+        """
+        Review a new version of a file against a previous review of it.
+
+        Only the changed hunks (with context) are sent to the LLM and the
+        result is merged with the previous review, so cost scales with the
+        size of the diff. Falls back to a full review when there is no base,
+        or when most of the file changed. The returned analysis carries an
+        ``incremental`` entry describing what was reviewed.
+        """
+        hunks = compute_hunks(base["content"], content) if base else None
+        total_lines = content.count('\n') + 1
+        changed = sum(hunk.changed for hunk in hunks) if hunks else 0
+        info = {"base_review_id": base["id"] if base else None, "changed_lines": changed, "incremental": False}
+
+        if hunks is not None and not hunks:
+            # Identical content: the previous review still applies
+            return {**base["analysis"], "incremental": {**info, "incremental": True}}
+        if not base or not self.api_available or changed > INCREMENTAL_MAX_CHANGE_RATIO * total_lines:
+            return {**await self.analyze_code_async(filename, content), "incremental": info}
+
+        diff = "\n".join(hunk.text for hunk in hunks)
+        delta = await self._complete_review_async(
+            filename, content, lambda: self._build_diff_prompt(filename, diff), self._cache_key(filename, diff, "diff"),
+            compacted=False
+        )
+        if self._is_error_response(delta):
+            return {**delta, "incremental": info}
+
+        merged = merge_incremental(base["analysis"], delta, hunks, total_lines, base["id"])
+        return {**merged, "incremental": {**info, "incremental": True}}
+
+    async def _complete_review_async(self, filename: str, content: str, build_prompt: Callable[[], str],
+                                     cache_key: str, compacted: bool = True) -> Dict:
+        """
+        Run one review prompt through the LLM; ``content`` is used for the
+        offline fallback, and ``compacted`` says the prompt shows it compacted.
+        The prompt is only built when the LLM is called.
+        """
+        if not self.api_available:
+            return self._create_demo_response(filename, content)
+
+        cached = await self._cache_get_async(cache_key)
+        if cached is not None:
+            return cached
+
+        if not REVIEW_COALESCING:
+            return await self._call_llm_async(filename, content, build_prompt(), cache_key, compacted)
+        # Identical reviews arriving while this one is in flight wait for it
+        result = await self.flights.do(
+            cache_key, lambda: self._call_llm_async(filename, content, build_prompt(), cache_key, compacted)
+        )
+        return copy.deepcopy(result)
+
+    async def _call_llm_async(self, filename: str, content: str, prompt: str, cache_key: str,
+                              compacted: bool = True) -> Dict:
+        """One completion, trying each model in turn"""
+        try:
+            async with self._get_semaphore():
+                response, model = await self._route_completion_async(prompt, self._line_count(content))
+
+            if response is None:
+                return self._create_demo_response(filename, content)
+
+            return await self._parse_response_async(response.choices[0].message.content or "", filename, content,
+                                                    self._answer_cache_key(cache_key, model, content),
+                                                    response.model, compacted=compacted)
+
+        except asyncio.TimeoutError:
+            return self._create_error_response(f"LLM request timed out after {self.timeout:g}s")
+        except Exception as e:
+            if self._is_quota_error(e):
+                return self._create_demo_response(filename, content)
+            return self._create_error_response(str(e))
+
+    async def stream_code_async(self, filename: str, content: str) -> AsyncIterator[Dict]:
+        """
+        Stream a review while the model generates it.
+
+        Yields ``{"type": "report", "text": ...}`` events with report text as
+        it is written, followed by one ``{"type": "result", "analysis": ...}``
+        event with the parsed review. The final analysis is authoritative;
+        clients should replace the streamed report with it.
+        """
+        if not self.api_available or needs_chunking(content):
+            # Nothing to stream: demo mode, or a chunked review merged at the end
+            analysis = await self.analyze_code_async(filename, content)
+            yield {"type": "report", "text": analysis["report"]}
+            yield {"type": "result", "analysis": analysis}
+            return
+
+        cache_key = self._cache_key(filename, content)
+        cached = await self._cache_get_async(cache_key)
+        if cached is not None:
+            yield {"type": "report", "text": cached["report"]}
+            yield {"type": "result", "analysis": cached}
+            return
+
+        task = self.flights.join(cache_key) if REVIEW_COALESCING else None
+        if task is not None:
+            # The same review is already being generated for another caller
+            analysis = copy.deepcopy(await asyncio.shield(task))
+            yield {"type": "report", "text": analysis["report"]}
+            yield {"type": "result", "analysis": analysis}
+            return
+
+        texts = asyncio.Queue()
+
+        async def produce():
+            try:
+                return await self._stream_llm_async(filename, content, cache_key, texts.put_nowait)
+            finally:
+                texts.put_nowait(None)
+
+        # The completion runs in its own task so callers joining it are not
+        # cut off if this client disconnects
+        task = self.flights.start(cache_key, produce) if REVIEW_COALESCING else asyncio.ensure_future(produce())
+        while True:
+            text = await texts.get()
+            if text is None:
+                break
+            yield {"type": "report", "text": text}
+        analysis = await asyncio.shield(task)
+        yield {"type": "result", "analysis": copy.deepcopy(analysis)}
+
+    async def _stream_llm_async(self, filename: str, content: str, cache_key: str,
+                                on_text: Callable[[str], None]) -> Dict:
+        """One streamed completion; report text is passed to ``on_text`` as it is decoded"""
+        prompt = self._build_prompt(filename, content)
+        extractor = ReportStreamExtractor()
+        scanner = JsonObjectScanner()
+        parts = []
+
+        try:
+            async with self._get_semaphore():
+                start = time.perf_counter()
+                stream, model = await self._route_completion_async(
+                    prompt, self._line_count(content), stream=True, stream_options={"include_usage": True}
+                )
+                if stream is None:
+                    return self._create_demo_response(filename, content)
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None) is not None:
+                        record_llm_usage(model, chunk.usage)
+                        self.rate_limiter.settle(self._token_estimate(prompt), chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    scanner.feed(delta)
+                    text = extractor.feed(delta)
+                    if text:
+                        on_text(text)
+                record_stage("llm", time.perf_counter() - start)
+                return await self._parse_response_async("".join(parts), filename, content,
+                                                        self._answer_cache_key(cache_key, model, content), model,
+                                                        scanner)
+
+        except asyncio.TimeoutError:
+            return self._create_error_response(f"LLM request timed out after {self.timeout:g}s")
+        except Exception as e:
+            if self._is_quota_error(e):
+                return self._create_demo_response(filename, content)
+            return self._create_error_response(str(e))
+
+    async def _route_completion_async(self, prompt: str, lines: int, **options):
+        """
+        Call the first usable model for a file of ``lines`` lines, recording
+        the outcome with the router. Returns ``(response, model)``, or
+        ``(None, None)`` when no model is available.
+        """
+        for model in self.router.candidates(lines):
+            if not self.router.begin(model):
+                continue
+            start = time.perf_counter()
+            LLM_IN_FLIGHT.inc()
+            try:
+                response = await self._create_completion_async(model, prompt, **options)
+            except asyncio.CancelledError:
+                self.router.release(model)
+                self._record_call(model, "cancelled", start, timed=not options.get("stream"))
+                raise
+            except Exception as error:
+                self._record_call(model, self._record_error(model, error), start, timed=not options.get("stream"))
+                if self._is_model_not_found(error):
+                    continue
+                raise
+            finally:
+                LLM_IN_FLIGHT.dec()
+            self.router.record_success(model, time.perf_counter() - start)
+            # A stream is timed by its reader, which also waits for the rest of it
+            self._record_call(model, "ok", start, response, timed=not options.get("stream"))
+            return response, model
+        return None, None
+
+    def _route_completion(self, prompt: str, lines: int):
+        """Blocking counterpart of _route_completion_async"""
+        for model in self.router.candidates(lines):
+            if not self.router.begin(model):
+                continue
+            start = time.perf_counter()
+            LLM_IN_FLIGHT.inc()
+            try:
+                response = self._create_completion(model, prompt)
+            except Exception as error:
+                self._record_call(model, self._record_error(model, error), start)
+                if self._is_model_not_found(error):
+                    continue
+                raise
+            finally:
+                LLM_IN_FLIGHT.dec()
+            self.router.record_success(model, time.perf_counter() - start)
+            self._record_call(model, "ok", start, response)
+            return response, model
+        return None, None
+
+    def _record_error(self, model: str, error: Exception) -> str:
+        """Report a failed call to the router; returns the outcome label for metrics"""
+        # Whatever the error, a half-open trial call is over
+        self.router.release(model)
+        if self._is_model_not_found(error):
+            self.router.record_unavailable(model)
+            return "unavailable"
+        if self._is_quota_error(error):
+            return "quota"
+        self.router.record_failure(model)
+        return "error"
+
+    def _record_call(self, model: str, outcome: str, start: float, response=None, timed: bool = True):
+        """Count one LLM call, its wait and, for completed calls, its tokens and cost"""
+        LLM_REQUESTS.inc(model=model, outcome=outcome)
+        if timed:
+            record_stage("llm", time.perf_counter() - start)
+        if response is not None:
+            record_llm_usage(model, getattr(response, "usage", None))
+
+    @staticmethod
+    def _token_estimate(prompt: str) -> int:
+        """Tokens reserved for a call: the prompt's estimate plus the longest possible completion"""
+        return estimate_tokens(SYSTEM_PROMPT + prompt) + MAX_COMPLETION_TOKENS
+
+    async def _create_completion_async(self, model: str, prompt: str, **options):
+        """
+        One chat completion within the rate limits, retrying 429s and
+        transient errors. Its tokens are reserved once, by the first attempt,
+        and settled against the reported usage (streams settle at their end).
+        """
+        tokens = self._token_estimate(prompt)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self.rate_limiter.acquire(tokens if attempt == 0 else 0)
+            try:
+                response = await asyncio.wait_for(
+                    self.async_client.chat.completions.create(**self._completion_kwargs(model, prompt), **options),
+                    timeout=self.timeout
+                )
+            except Exception as error:
+                if self._rejects_json_mode(model, error) and attempt < LLM_MAX_RETRIES:
+                    continue
+                kind = retry_kind(error)
+                if kind is None or attempt == LLM_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt, retry_after(error))
+                self.rate_limiter.record_retry(kind, delay)
+                if kind != "rate_limit":
+                    await asyncio.sleep(delay)
+                continue
+            if not options.get("stream"):
+                self.rate_limiter.settle(tokens, getattr(response, "usage", None))
+            return response
+
+    def _create_completion(self, model: str, prompt: str):
+        """Blocking counterpart of _create_completion_async"""
+        tokens = self._token_estimate(prompt)
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            self.rate_limiter.acquire_blocking(tokens if attempt == 0 else 0)
+            try:
+                response = self.client.chat.completions.create(**self._completion_kwargs(model, prompt))
+            except Exception as error:
+                if self._rejects_json_mode(model, error) and attempt < LLM_MAX_RETRIES:
+                    continue
+                kind = retry_kind(error)
+                if kind is None or attempt == LLM_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt, retry_after(error))
+                self.rate_limiter.record_retry(kind, delay)
+                if kind != "rate_limit":
+                    time.sleep(delay)
+                continue
+            self.rate_limiter.settle(tokens, getattr(response, "usage", None))
+            return response
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Create the concurrency limiter lazily inside the running event loop"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _build_prompt(self, filename: str, content: str, excerpt: Optional[str] = None,
+                      context: Optional[str] = None) -> str:
+        """
+        Build the review prompt for a single file or an excerpt of one. The
+        instructions live in SYSTEM_PROMPT; the file is compacted first.
+        """
+        if excerpt:
+            subject = f'an excerpt ({excerpt}) of the code file "{filename}"'
+        else:
+            subject = f'the code file "{filename}"'
+        with stage("prompt"):
+            code = compact_source(filename, content).text if PROMPT_COMPACTION else content
+        prompt = f"Review {subject}:\n```{self._get_file_extension(filename)}\n{code}\n```"
+        if excerpt:
+            # Merging adds the excerpt's offset, which also keeps cached excerpt reviews valid when it moves
+            prompt += "\nGive line_start and line_end within the excerpt, counting its first line as line 1."
+        if context:
+            prompt = (
+                "Signatures from other files of the repository that this file imports, for reference "
+                f"only (they are reviewed separately):\n```\n{context}\n```\n{prompt}"
+            )
+        tokens = estimate_tokens(SYSTEM_PROMPT + prompt)
+        self._record_prompt(tokens - estimate_tokens(code) + estimate_tokens(content), tokens)
+        return prompt
+
+    def _build_diff_prompt(self, filename: str, diff: str) -> str:
+        """Build the review prompt for the changed hunks of a previously reviewed file"""
+        prompt = (
+            f'Review the changes made to the code file "{filename}". The rest of the file was reviewed '
+            f"before. Each hunk shows {DIFF_CONTEXT_LINES} unchanged lines of context around the change.\n"
+            f"```diff\n{diff}\n```"
+        )
+        tokens = estimate_tokens(SYSTEM_PROMPT + prompt)
+        self._record_prompt(tokens, tokens)
+        return prompt
+
+    def _record_prompt(self, tokens_before: int, tokens_after: int):
+        """Count the estimated tokens of a prompt sent, without and with compaction"""
+        stats = self.prompt_stats
+        stats["prompts"] += 1
+        stats["tokens_before"] += tokens_before
+        stats["tokens_after"] += tokens_after
+
+    def prompt_stats_summary(self) -> Dict:
+        """Prompt token counters, with averages per review"""
+        stats = dict(self.prompt_stats)
+        prompts = stats["prompts"] or 1
+        stats["avg_tokens_before"] = round(stats["tokens_before"] / prompts)
+        stats["avg_tokens_after"] = round(stats["tokens_after"] / prompts)
+        stats["saved_ratio"] = round(1 - stats["tokens_after"] / stats["tokens_before"], 3) if stats["tokens_before"] else 0.0
+        return stats
+
+    def _completion_kwargs(self, model: str, prompt: str) -> Dict:
+        """Arguments for a chat completion request"""
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": MAX_COMPLETION_TOKENS,
+            **({"response_format": {"type": "json_object"}} if self._json_mode(model) else {})
+        }
+
+    def _json_mode(self, model: str) -> bool:
+        """Whether to ask ``model`` for a JSON object instead of free text"""
+        if not LLM_JSON_MODE or model in self._json_mode_rejected:
+            return False
+        return model != "gpt-4" and not model.startswith(JSON_MODE_UNSUPPORTED)
+
+    def _rejects_json_mode(self, model: str, error: Exception) -> bool:
+        """
+        The API refused response_format for ``model``; remember it so the
+        request is retried, and later ones sent, without it
+        """
+        import openai
+        if (isinstance(error, openai.BadRequestError) and "response_format" in str(error)
+                and model not in self._json_mode_rejected):
+            self._json_mode_rejected.add(model)
+            return True
+        return False
+
+    def _parse_output(self, output: str, scanner: Optional[JsonObjectScanner] = None) -> tuple:
+        """
+        The validated review in the model output (None if there is none) and
+        the JSON found in it. ``scanner`` is one that was already fed the
+        output while it streamed in.
+        """
+        with stage("parse"):
+            if scanner is None:
+                scanner = JsonObjectScanner()
+                scanner.feed(output)
+            data = scanner.finish()
+            return validate_review(data), data
+
+    def _parse_response(self, output: str, filename: str, content: str, cache_key: Optional[str] = None,
+                        model: str = "", scanner: Optional[JsonObjectScanner] = None) -> Dict:
+        """Extract and validate the JSON review in the model output"""
+        result, data = self._parse_output(output, scanner)
+        if result is None:
+            return self._create_fallback_response(filename, content, partial_report(data) or output)
+        self._restore_lines(result, filename, content)
+        # Only real, parsed reviews are cached; fallbacks and demo output are not
+        if self.cache is not None and cache_key is not None:
+            self.cache.set(cache_key, result, model=model, prompt_version=PROMPT_VERSION)
+        return result
+
+    async def _parse_response_async(self, output: str, filename: str, content: str,
+                                    cache_key: Optional[str] = None, model: str = "",
+                                    scanner: Optional[JsonObjectScanner] = None, compacted: bool = True) -> Dict:
+        """_parse_response, writing the cache without blocking the event loop"""
+        result, data = self._parse_output(output, scanner)
+        if result is None:
+            return self._create_fallback_response(filename, content, partial_report(data) or output)
+        if compacted:
+            self._restore_lines(result, filename, content)
+        if self.cache is not None and cache_key is not None:
+            await self.cache.set_async(cache_key, result, model=model, prompt_version=PROMPT_VERSION)
+        return result
+
+    def _restore_lines(self, result: Dict, filename: str, content: str):
+        """
+        Map suggestion lines given against the compacted prompt back to lines
+        of ``content``, which compaction shifts wherever it dropped lines
+        """
+        if not PROMPT_COMPACTION:
+            return
+        compacted = None
+        for suggestion in result["suggestions"]:
+            if suggestion["line_start"] is None:
+                continue
+            if compacted is None:
+                compacted = compact_source(filename, content)
+            suggestion["line_start"], suggestion["line_end"] = compacted.original_lines(
+                suggestion["line_start"], suggestion["line_end"]
+            )
+
+    def _cache_key(self, filename: str, content: str, kind: Optional[str] = None,
+                   context: Optional[str] = None) -> str:
+        """
+        Key identifying a review for the cache and for coalescing, keyed on the
+        model preferred for the content's size; ``kind`` is "excerpt" or "diff"
+        for partial reviews, and a review with repository ``context`` only
+        matches the same context
+        """
+        extension = self._get_file_extension(filename)
+        model = self.router.preferred(self._line_count(content))
+        if kind:
+            extension += f":{kind}"
+        if context:
+            extension += ":context"
+            content = f"{context}\0{content}"
+        return make_cache_key(content, extension, PROMPT_VERSION, model)
+
+    def _answer_cache_key(self, cache_key: Optional[str], model: str, content: str) -> Optional[str]:
+        """
+        The key to cache an answer from ``model`` under: None when a fallback
+        model answered, as its review would be served as the preferred
+        model's once that model recovers
+        """
+        return cache_key if model == self.router.preferred(self._line_count(content)) else None
+
+    def _cache_get(self, cache_key: Optional[str]) -> Optional[Dict]:
+        if self.cache is None or cache_key is None:
+            return None
+        return self.cache.get(cache_key)
+
+    async def _cache_get_async(self, cache_key: Optional[str]) -> Optional[Dict]:
+        if self.cache is None or cache_key is None:
+            return None
+        return await self.cache.get_async(cache_key)
+
+    def _line_count(self, content: str) -> int:
+        return content.count('\n') + 1
+
+    def _is_quota_error(self, error: Exception) -> bool:
+        return "insufficient_quota" in str(error) or "quota" in str(error)
+
+    def _is_model_not_found(self, error: Exception) -> bool:
+        return "model_not_found" in str(error) or "does not exist" in str(error)
+
     def _get_file_extension(self, filename: str) -> str:
         """Extract file extension for syntax highlighting"""
         return filename.split('.')[-1] if '.' in filename else 'text'
-    
-    def _create_fallback_response(self, content: str) -> Dict:
-        """Create a fallback response when JSON parsing fails"""
-        return {
-            "report": content,
-            "scores": {
-                "readability_score": 7.0,
-                "modularity_score": 7.0,
-                "bug_risk_score": 5.0,
-                "overall_score": 6.5
-            },
-            "suggestions": [
-                "Review the detailed analysis above for specific improvement suggestions"
-            ]
-        }
-    
+
+    def _create_fallback_response(self, filename: str, content: str, output: str) -> Dict:
+        """
+        The model did not return a usable JSON review: keep what it wrote and
+        take scores and suggestions from the static analyzer rather than
+        inventing them
+        """
+        review = static_review(
+            filename, content,
+            note="The AI review could not be read as structured output, so the scores and suggestions "
+                 "below come from the built-in static analyzer."
+        )
+        review["report"] = f"{output.strip()}\n\n{review['report']}" if output.strip() else review["report"]
+        return review
+
     def _create_demo_response(self, filename: str, content: str) -> Dict:
-        """Create a demo response when API is not available"""
-        lines = content.split('\n')
-        line_count = len(lines)
-        
-        # Simple analysis based on code characteristics
-        readability_score = min(8.0, max(3.0, 10.0 - (line_count / 20)))
-        modularity_score = min(8.0, max(3.0, 10.0 - (line_count / 15)))
-        bug_risk_score = min(7.0, max(2.0, 10.0 - (line_count / 25)))
-        overall_score = (readability_score + modularity_score + bug_risk_score) / 3
-        
-        return {
-            "report": f"Demo Analysis for {filename}:\n\nThis is a demo analysis since your OpenAI API key is not configured or quota has been exceeded. The code appears to be {line_count} lines long. For a real AI-powered analysis, please add your OpenAI API key to the .env file.\n\nKey observations:\n- Code length: {line_count} lines\n- File type: {filename.split('.')[-1] if '.' in filename else 'unknown'}\n- This is a placeholder analysis",
-            "scores": {
-                "readability_score": round(readability_score, 1),
-                "modularity_score": round(modularity_score, 1),
-                "bug_risk_score": round(bug_risk_score, 1),
-                "overall_score": round(overall_score, 1)
-            },
-            "suggestions": [
-                "Add your OpenAI API key to .env file for real AI analysis",
-                "Consider breaking down large functions into smaller ones",
-                "Add comments and documentation for better readability",
-                "Review error handling and edge cases",
-                "This is a demo - get real analysis with OpenAI API key"
-            ]
-        }
-    
+        """Review the file with the local static analyzer when the API is not available"""
+        return static_review(
+            filename, content,
+            note="The AI review is unavailable (no OpenAI API key is configured or the quota has been "
+                 "exceeded), so this review was produced by the built-in static analyzer."
+        )
+
+    def _is_error_response(self, analysis: Dict) -> bool:
+        return analysis["report"].startswith("Error analyzing code:")
+
     def _create_error_response(self, error: str) -> Dict:
         """Create an error response when LLM call fails"""
         return {
@@ -164,6 +711,7 @@ class LLMCodeReviewer:
                 "overall_score": 0.0
             },
             "suggestions": [
-                "Please check your OpenAI API key and try again"
+                {"text": "Please check your OpenAI API key and try again", "severity": "info", "category": "general",
+                 "line_start": None, "line_end": None}
             ]
         }
\ No newline at end of file
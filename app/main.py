@@ -1,160 +1,719 @@
-from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request, Response, Query
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload, undefer_group
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import List, Optional
 import os
+import asyncio
+import hashlib
 import aiofiles
 
-from .database import get_db, create_tables, CodeReview
-from .models import CodeReviewResponse, CodeReviewRequest
+from .database import (
+    run_db, create_tables, create_review_record, load_blobs, review_content, release_blob,
+    CodeReview, ReviewSuggestion, engine, async_engine
+)
+from .models import (
+    CodeReviewResponse, CodeReviewDetailResponse, CodeReviewSummary, CodeReviewRequest,
+    IncrementalReviewRequest, IncrementalReviewResponse,
+    BatchReviewItem, BatchReviewResponse, RepositoryReviewResponse, ReviewJobResponse, ReviewSearchResult,
+    ScoreTrendBucket, ScoreDistributionBucket, FileScoreSummary, Suggestion, ReviewSuggestionResponse
+)
 from .llm_service import LLMCodeReviewer
+from .archive import BATCH_MAX_FILES, is_archive, extract_archive
+from .repository import REPO_MAX_FILES, build_index, repository_report, shutdown_index_pool, start_index_pool
+from .jobs import ReviewJobQueue, COMPLETED
+from .streaming import format_sse
+from .search import SEARCH_FIELDS, search_reviews
+from .analytics import remove_review_scores, score_distribution, score_trends, worst_files
+from .pagination import apply_review_filters, apply_keyset, encode_cursor
+from .review_parsing import CATEGORIES, SEVERITIES
+from .incremental import load_base_review
+from .singleflight import SingleFlight, REVIEW_COALESCING_SHARE_ROW
+from .metrics import REGISTRY, ServerTimingMiddleware, TimedRoute, stage
+from .uploads import (
+    RequestSizeLimitMiddleware, UploadError, decode_source, open_upload, read_upload_text, upload_http_error
+)
 
-app = FastAPI(title="Code Review Assistant", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create missing tables, and run the background review workers and the
+    repository indexing pool for the lifetime of the app. Importing this module does neither, so tests,
+    tooling and each server worker only pay for them when the app starts.
+    The OpenAI clients are closed on shutdown.
+    """
+    create_tables()
+    start_index_pool()
+    await job_queue.start()
+    # Load the OpenAI client in the background rather than on the first review
+    warmup = asyncio.get_running_loop().run_in_executor(None, lambda: llm_reviewer.async_client)
+    yield
+    await job_queue.stop()
+    shutdown_index_pool()
+    await warmup
+    await llm_reviewer.close()
+
+app = FastAPI(title="Code Review Assistant", version="1.0.0", lifespan=lifespan)
 
-# Create database tables
-create_tables()
+# Per-stage timings: Server-Timing header and latency histograms for /metrics
+app.router.route_class = TimedRoute
+app.add_middleware(ServerTimingMiddleware)
 
-# Initialize LLM service
+# Refuse oversized request bodies before they are read
+app.add_middleware(RequestSizeLimitMiddleware)
+
+# LLM service; its OpenAI clients are created on first use
 llm_reviewer = LLMCodeReviewer()
 
+# Background review jobs
+job_queue = ReviewJobQueue(llm_reviewer)
+
+# Saves of identical reviews in flight, when coalesced requests share a row
+review_saves = SingleFlight()
+
 # Mount static files and templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+async def read_upload(file: UploadFile) -> str:
+    """Decoded text of an upload; binary, generated, oversized and undecodable files are refused"""
+    try:
+        return await read_upload_text(file)
+    except UploadError as e:
+        raise upload_http_error(e)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     """Serve the main dashboard"""
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.post("/api/review", response_model=CodeReviewResponse)
-async def review_code(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
-):
+async def review_code(file: UploadFile = File(...)):
     """
     Upload and review a code file
     """
+    # Read file content
+    content_str = await read_upload(file)
+
     try:
-        # Read file content
-        content = await file.read()
-        content_str = content.decode('utf-8')
-        
         # Analyze code using LLM
-        analysis = llm_reviewer.analyze_code(file.filename, content_str)
+        analysis = await llm_reviewer.analyze_code_async(file.filename, content_str)
         
         # Create database record
-        db_review = CodeReview(
-            filename=file.filename,
-            file_content=content_str,
-            review_report=analysis["report"],
-            readability_score=analysis["scores"]["readability_score"],
-            modularity_score=analysis["scores"]["modularity_score"],
-            bug_risk_score=analysis["scores"]["bug_risk_score"],
-            overall_score=analysis["scores"]["overall_score"],
-            suggestions="\n".join(analysis["suggestions"])
-        )
-        
-        db.add(db_review)
-        db.commit()
-        db.refresh(db_review)
-        
-        return CodeReviewResponse(
-            id=db_review.id,
-            filename=db_review.filename,
-            review_report=db_review.review_report,
-            readability_score=db_review.readability_score,
-            modularity_score=db_review.modularity_score,
-            bug_risk_score=db_review.bug_risk_score,
-            overall_score=db_review.overall_score,
-            suggestions=db_review.suggestions,
-            created_at=db_review.created_at
-        )
+        return await store_review(file.filename, content_str, analysis)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 @app.post("/api/review-text", response_model=CodeReviewResponse)
-async def review_code_text(
-    request: CodeReviewRequest,
-    db: Session = Depends(get_db)
-):
+async def review_code_text(request: CodeReviewRequest):
     """
     Review code from text input
     """
     try:
         # Analyze code using LLM
-        analysis = llm_reviewer.analyze_code(request.filename, request.content)
+        analysis = await llm_reviewer.analyze_code_async(request.filename, request.content)
         
         # Create database record
-        db_review = CodeReview(
-            filename=request.filename,
-            file_content=request.content,
-            review_report=analysis["report"],
-            readability_score=analysis["scores"]["readability_score"],
-            modularity_score=analysis["scores"]["modularity_score"],
-            bug_risk_score=analysis["scores"]["bug_risk_score"],
-            overall_score=analysis["scores"]["overall_score"],
-            suggestions="\n".join(analysis["suggestions"])
-        )
-        
-        db.add(db_review)
-        db.commit()
-        db.refresh(db_review)
-        
-        return CodeReviewResponse(
-            id=db_review.id,
-            filename=db_review.filename,
-            review_report=db_review.review_report,
-            readability_score=db_review.readability_score,
-            modularity_score=db_review.modularity_score,
-            bug_risk_score=db_review.bug_risk_score,
-            overall_score=db_review.overall_score,
-            suggestions=db_review.suggestions,
-            created_at=db_review.created_at
-        )
+        return await store_review(request.filename, request.content, analysis)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing code: {str(e)}")
 
-@app.get("/api/reviews", response_model=List[CodeReviewResponse])
+@app.post("/api/review/incremental", response_model=IncrementalReviewResponse)
+async def review_code_incremental(
+    file: UploadFile = File(...),
+    base_review_id: Optional[int] = Form(None)
+):
+    """
+    Upload a new version of a previously reviewed file and review only what
+    changed. Compares against ``base_review_id``, or the latest review of
+    the same filename.
+    """
+    content_str = await read_upload(file)
+    return await incremental_review(file.filename, content_str, base_review_id)
+
+@app.post("/api/review-text/incremental", response_model=IncrementalReviewResponse)
+async def review_code_text_incremental(request: IncrementalReviewRequest):
+    """
+    Review a new version of previously reviewed code from text input,
+    reviewing only what changed
+    """
+    return await incremental_review(request.filename, request.content, request.base_review_id)
+
+async def incremental_review(filename: str, content: str, base_review_id: Optional[int]) -> IncrementalReviewResponse:
+    """Diff against the base review, review the changes and save the merged review"""
+    base = await run_db(load_base_review, filename, base_review_id)
+    if base is None and base_review_id is not None:
+        raise HTTPException(status_code=404, detail="Base review not found")
+
+    try:
+        analysis = await llm_reviewer.analyze_incremental_async(filename, content, base)
+        review = await run_db(save_review, filename, content, analysis)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing code: {str(e)}")
+    return IncrementalReviewResponse(**review.model_dump(), **analysis["incremental"])
+
+@app.post("/api/review/stream")
+async def review_code_stream(file: UploadFile = File(...)):
+    """
+    Upload and review a code file, streaming the review as Server-Sent Events
+    """
+    content_str = await read_upload(file)
+    return stream_review(file.filename, content_str)
+
+@app.post("/api/review-text/stream")
+async def review_code_text_stream(request: CodeReviewRequest):
+    """
+    Review code from text input, streaming the review as Server-Sent Events
+    """
+    return stream_review(request.filename, request.content)
+
+def stream_review(filename: str, content: str) -> StreamingResponse:
+    """
+    Stream a review as ``report`` events (text deltas), then a ``result``
+    event (report, scores and suggestions) and a ``done`` event carrying the
+    saved review.
+    """
+    async def events():
+        analysis = None
+        async for event in llm_reviewer.stream_code_async(filename, content):
+            if event["type"] == "report":
+                yield format_sse("report", {"text": event["text"]})
+            else:
+                analysis = event["analysis"]
+                yield format_sse("result", analysis)
+
+        try:
+            review = await store_review(filename, content, analysis)
+            yield format_sse("done", review.model_dump(mode="json"))
+        except Exception as e:
+            yield format_sse("error", {"detail": f"Error saving review: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/reviews/batch", response_model=BatchReviewResponse)
+async def review_batch(files: List[UploadFile] = File(...)):
+    """
+    Upload and review many files, or zip/tar archives of files, in one request.
+    Files are reviewed concurrently and all reviews are saved in one transaction.
+    """
+    sources = await collect_sources(files, BATCH_MAX_FILES)
+
+    # Fan out to the LLM; the reviewer's concurrency limit bounds parallelism
+    pending = [(name, content) for name, content, error in sources if error is None]
+    analyses = await asyncio.gather(
+        *(llm_reviewer.analyze_code_async(name, content) for name, content in pending),
+        return_exceptions=True
+    )
+    return batch_response(await save_reviews(sources, analyses))
+
+@app.post("/api/reviews/repository", response_model=RepositoryReviewResponse)
+async def review_repository(files: List[UploadFile] = File(...)):
+    """
+    Review a whole repository, uploaded as zip/tar archives or as the files of
+    a directory (filenames carrying their relative paths). The repository is
+    indexed first; every file is then reviewed concurrently with the
+    signatures of the repository code it imports, and the per-file reviews
+    are combined into a repository report.
+    """
+    sources = await collect_sources(files, REPO_MAX_FILES)
+    pending = [(name, content) for name, content, error in sources if error is None]
+
+    def prepare():
+        index = build_index(pending)
+        return index, [index.context_for(name, content) for name, content in pending]
+
+    # Indexing is CPU-bound: it runs in a process pool, waited on from a worker thread
+    with stage("index"):
+        index, contexts = await asyncio.get_running_loop().run_in_executor(None, prepare)
+    analyses = await asyncio.gather(
+        *(llm_reviewer.analyze_code_async(name, content, context or None)
+          for (name, content), context in zip(pending, contexts)),
+        return_exceptions=True
+    )
+    results = await save_reviews(sources, analyses)
+
+    reviews = []
+    failed = []
+    analysis_by_index = iter(analyses)
+    for (name, content, error), item in zip(sources, results):
+        if error is None:
+            analysis = next(analysis_by_index)
+            if item.review is None:
+                continue
+            # Failed reviews are listed, not averaged in with zero scores
+            if llm_reviewer._is_error_response(analysis):
+                failed.append((name, analysis["report"]))
+            else:
+                reviews.append((name, content.count("\n") + 1, analysis))
+    summary = repository_report(index, reviews, failed)
+    return RepositoryReviewResponse(**batch_response(results).model_dump(), **summary, index=index.stats())
+
+async def collect_sources(files: List[UploadFile], max_files: int) -> List[tuple]:
+    """
+    (filename, content or None, error or None) for every uploaded file and
+    archive member, in upload order
+    """
+    sources = []
+    for upload in files:
+        if not is_archive(upload.filename):
+            try:
+                sources.append((upload.filename, await read_upload_text(upload), None))
+            except UploadError as e:
+                sources.append((upload.filename, None, str(e)))
+            continue
+
+        try:
+            with stage("read"):
+                members = extract_archive(upload.filename, open_upload(upload), max_files=max_files)
+        except ValueError as e:
+            sources.append((upload.filename, None, str(e)))
+            continue
+        for name, raw in members:
+            try:
+                with stage("decode"):
+                    sources.append((name, decode_source(name, raw), None))
+            except UploadError as e:
+                sources.append((name, None, str(e)))
+
+    if len(sources) > max_files:
+        raise HTTPException(status_code=413, detail=f"Request contains more than {max_files} files")
+    return sources
+
+async def save_reviews(sources: List[tuple], analyses: List) -> List[BatchReviewItem]:
+    """
+    Save the analyses of the sources without an error, in one transaction.
+    Returns one item per source, carrying the saved review or the error.
+    """
+    analysis_by_index = iter(analyses)
+    results = []
+    reviewed = []
+    for name, content, error in sources:
+        if error is None:
+            analysis = next(analysis_by_index)
+            if isinstance(analysis, Exception):
+                error = f"Error processing file: {analysis}"
+            else:
+                reviewed.append((len(results), name, content, analysis))
+        results.append(BatchReviewItem(filename=name, error=error))
+
+    def save_batch(db: Session):
+        # One bulk insert and commit for the whole batch
+        rows = []
+        for index, name, content, analysis in reviewed:
+            try:
+                rows.append((index, create_review_record(db, name, content, analysis)))
+            except (KeyError, TypeError, ValueError) as e:
+                results[index].error = f"Malformed review: {e}"
+        db.add_all([row for _, row in rows])
+        db.flush()
+        for index, row in rows:
+            results[index].review = review_to_response(row)
+        db.commit()
+
+    try:
+        await run_db(save_batch)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving reviews: {str(e)}")
+    return results
+
+def batch_response(results: List[BatchReviewItem]) -> BatchReviewResponse:
+    failed = sum(1 for item in results if item.error is not None)
+    return BatchReviewResponse(
+        total=len(results),
+        succeeded=len(results) - failed,
+        failed=failed,
+        results=results
+    )
+
+@app.post("/api/jobs", response_model=ReviewJobResponse, status_code=202)
+async def submit_review_job(file: UploadFile = File(...)):
+    """
+    Queue a file for review and return the job immediately
+    """
+    content_str = await read_upload(file)
+
+    job = await job_queue.submit(file.filename, content_str)
+    return ReviewJobResponse.model_validate(job, from_attributes=True)
+
+@app.post("/api/jobs/text", response_model=ReviewJobResponse, status_code=202)
+async def submit_review_job_text(request: CodeReviewRequest):
+    """
+    Queue code from text input for review and return the job immediately
+    """
+    job = await job_queue.submit(request.filename, request.content)
+    return ReviewJobResponse.model_validate(job, from_attributes=True)
+
+@app.get("/api/jobs/stats")
+async def review_job_stats():
+    """
+    Queue depth, wait time and run time of background review jobs
+    """
+    return await job_queue.stats()
+
+@app.get("/api/jobs/{job_id}", response_model=ReviewJobResponse)
+async def get_review_job(job_id: int):
+    """
+    Get the status of a review job
+    """
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ReviewJobResponse.model_validate(job, from_attributes=True)
+
+@app.get("/api/jobs/{job_id}/result", response_model=CodeReviewResponse)
+async def get_review_job_result(job_id: int):
+    """
+    Get the review produced by a completed job
+    """
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    def load_review(db: Session):
+        review = (
+            db.query(CodeReview)
+            .options(undefer_group("report"), selectinload(CodeReview.suggestion_items))
+            .filter(CodeReview.id == job.review_id)
+            .first()
+        )
+        return review_to_response(review) if review else None
+
+    response = await run_db(load_review)
+    if not response:
+        raise HTTPException(status_code=404, detail="Review not found")
+    return response
+
+@app.delete("/api/jobs/{job_id}", response_model=ReviewJobResponse)
+async def cancel_review_job(job_id: int):
+    """
+    Cancel a queued or running review job
+    """
+    job = await job_queue.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return ReviewJobResponse.model_validate(job, from_attributes=True)
+
+# Columns returned by the review list; the large text columns are opt-in
+SUMMARY_COLUMNS = [
+    CodeReview.id,
+    CodeReview.filename,
+    CodeReview.readability_score,
+    CodeReview.modularity_score,
+    CodeReview.bug_risk_score,
+    CodeReview.overall_score,
+    CodeReview.created_at
+]
+
+INCLUDE_COLUMNS = {
+    "report": [CodeReview.review_report, CodeReview.suggestions],
+    "content": [CodeReview.content_hash, CodeReview.file_content]
+}
+
+def parse_include(include: Optional[str]) -> List[str]:
+    """Parse a comma-separated ?include= value"""
+    if not include:
+        return []
+    names = [name.strip() for name in include.split(",") if name.strip()]
+    unknown = [name for name in names if name not in INCLUDE_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include value(s): {', '.join(unknown)}. Allowed: {', '.join(INCLUDE_COLUMNS)}"
+        )
+    return names
+
+@app.get("/api/reviews", response_model=List[CodeReviewSummary], response_model_exclude_none=True)
 async def get_reviews(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include: Optional[str] = None,
+    filename_prefix: Optional[str] = None,
+    score_field: str = "overall_score",
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
 ):
     """
-    Get all code reviews
+    Get code review summaries (id, filename, scores, created_at), newest first.
+    Use ?include=report and/or ?include=content for the report, suggestions
+    and file content.
+
+    Pages are keyset-paginated: pass the X-Next-Cursor header of one page as
+    ?cursor= to get the next. ?skip= is still accepted but gets slower the
+    deeper the page.
+    """
+    includes = parse_include(include)
+    columns = list(SUMMARY_COLUMNS)
+    for name in includes:
+        columns.extend(INCLUDE_COLUMNS[name])
+
+    def query_page(db: Session):
+        query = apply_review_filters(
+            db.query(*columns),
+            filename_prefix=filename_prefix,
+            score_field=score_field,
+            min_score=min_score,
+            max_score=max_score,
+            created_after=created_after,
+            created_before=created_before
+        )
+        query = apply_keyset(query, cursor)
+        if not cursor and skip:
+            query = query.offset(skip)
+
+        # Fetch one extra row to know whether there is a next page
+        rows = query.limit(limit + 1).all()
+        blobs = {}
+        if "content" in includes:
+            # Resolve contents from the blob store in one query
+            blobs = load_blobs(db, [row.content_hash for row in rows[:limit]])
+        return rows, blobs
+
+    try:
+        rows, blobs = await run_db(query_page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    summaries = [CodeReviewSummary(**row._mapping) for row in rows]
+    for summary, row in zip(summaries, rows):
+        if "content" in includes and row.content_hash:
+            summary.file_content = blobs.get(row.content_hash)
+    return summaries
+
+@app.get("/api/reviews/search", response_model=List[ReviewSearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    field: Optional[str] = None,
+    sort: str = Query("relevance", pattern="^(relevance|recent)$"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000)
+):
     """
-    reviews = db.query(CodeReview).offset(skip).limit(limit).all()
+    Full-text search over review filenames, reports and suggestions.
+    Every word must match; "quoted phrases" match in order and word* matches
+    a prefix. ?field= limits the search to filename, report or suggestions.
+    Results are ranked best match first, or newest first with ?sort=recent.
+    """
+    if field is not None and field not in SEARCH_FIELDS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown field {field!r}. Allowed: {', '.join(SEARCH_FIELDS)}"
+        )
+    try:
+        rows = await run_db(search_reviews, q, field, sort, limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [ReviewSearchResult(**row) for row in rows]
+
+def parse_choices(name: str, value: Optional[str], allowed: tuple) -> List[str]:
+    """Parse a comma-separated filter value, rejecting values not in ``allowed``"""
+    if not value:
+        return []
+    values = [v.strip().lower() for v in value.split(",") if v.strip()]
+    unknown = [v for v in values if v not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {name} value(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    return values
+
+@app.get("/api/suggestions", response_model=List[ReviewSuggestionResponse])
+async def get_suggestions(
+    response: Response,
+    category: Optional[str] = None,
+    severity: Optional[str] = None,
+    review_id: Optional[int] = None,
+    filename_prefix: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Review suggestions, newest review first, filtered by ?category= and
+    ?severity= (comma-separated, e.g. ?severity=critical,high), ?review_id=
+    or ?filename_prefix=. Pass the X-Next-Cursor header of one page as
+    ?cursor= to get the next.
+    """
+    categories = parse_choices("category", category, CATEGORIES)
+    severities = parse_choices("severity", severity, SEVERITIES)
+    after = None
+    if cursor:
+        try:
+            after = tuple(int(part) for part in cursor.split(":"))
+            before_review, after_position = after
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def query_page(db: Session):
+        query = db.query(ReviewSuggestion, CodeReview.filename, CodeReview.created_at).join(
+            CodeReview, CodeReview.id == ReviewSuggestion.review_id
+        )
+        if categories:
+            query = query.filter(ReviewSuggestion.category.in_(categories))
+        if severities:
+            query = query.filter(ReviewSuggestion.severity.in_(severities))
+        if review_id is not None:
+            query = query.filter(ReviewSuggestion.review_id == review_id)
+        if after:
+            query = query.filter(ReviewSuggestion.review_id <= before_review, or_(
+                ReviewSuggestion.review_id < before_review, ReviewSuggestion.position > after_position
+            ))
+        query = apply_review_filters(query, filename_prefix=filename_prefix)
+        # Fetch one extra row to know whether there is a next page
+        return (
+            query.order_by(ReviewSuggestion.review_id.desc(), ReviewSuggestion.position)
+            .limit(limit + 1)
+            .all()
+        )
+
+    rows = await run_db(query_page)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        response.headers["X-Next-Cursor"] = f"{last.review_id}:{last.position}"
     return [
-        CodeReviewResponse(
-            id=review.id,
-            filename=review.filename,
-            review_report=review.review_report,
-            readability_score=review.readability_score,
-            modularity_score=review.modularity_score,
-            bug_risk_score=review.bug_risk_score,
-            overall_score=review.overall_score,
-            suggestions=review.suggestions,
-            created_at=review.created_at
+        ReviewSuggestionResponse(
+            **Suggestion.model_validate(item, from_attributes=True).model_dump(),
+            review_id=item.review_id, position=item.position, filename=filename, created_at=created_at
         )
-        for review in reviews
+        for item, filename, created_at in rows
     ]
 
-@app.get("/api/reviews/{review_id}", response_model=CodeReviewResponse)
+@app.get("/api/reviews/{review_id}", response_model=CodeReviewDetailResponse, response_model_exclude_none=True)
 async def get_review(
     review_id: int,
-    db: Session = Depends(get_db)
+    include: Optional[str] = None
 ):
     """
-    Get a specific code review by ID
+    Get a specific code review by ID.
+    Use ?include=content to also return the reviewed file content.
+    """
+    groups = ["report"] + [name for name in parse_include(include) if name == "content"]
+
+    def load_review(db: Session):
+        review = (
+            db.query(CodeReview)
+            .options(*(undefer_group(group) for group in groups), selectinload(CodeReview.suggestion_items))
+            .filter(CodeReview.id == review_id)
+            .first()
+        )
+        if not review:
+            return None
+        response = review_to_response(review)
+        if "content" in groups:
+            return CodeReviewDetailResponse(**response.model_dump(), file_content=review_content(db, review))
+        return response
+
+    response = await run_db(load_review)
+    if not response:
+        raise HTTPException(status_code=404, detail="Review not found")
+    return response
+
+@app.delete("/api/reviews/{review_id}")
+async def delete_review(review_id: int):
+    """
+    Delete a code review
     """
-    review = db.query(CodeReview).filter(CodeReview.id == review_id).first()
-    if not review:
+    def delete(db: Session) -> bool:
+        review = db.query(CodeReview).filter(CodeReview.id == review_id).first()
+        if not review:
+            return False
+        content_hash = review.content_hash
+        remove_review_scores(db, review)
+        db.delete(review)
+        db.flush()
+        release_blob(db, content_hash)
+        db.commit()
+        return True
+
+    if not await run_db(delete):
         raise HTTPException(status_code=404, detail="Review not found")
-    
+    return {"message": "Review deleted successfully"}
+
+@app.get("/api/analytics/trends", response_model=List[ScoreTrendBucket])
+async def get_score_trends(
+    period: str = "week",
+    filename: Optional[str] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None
+):
+    """
+    Review count and average scores per day, week or month (or ?period=all),
+    over all files or for one ?filename=. Served from daily rollups kept up
+    to date on every review, so the cost depends on the days covered, not
+    the number of reviews.
+    """
+    try:
+        return await run_db(score_trends, period, filename, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/analytics/distribution", response_model=List[ScoreDistributionBucket])
+async def get_score_distribution(
+    score_field: str = "overall_score",
+    period: str = "all",
+    since: Optional[date] = None,
+    until: Optional[date] = None
+):
+    """Percentiles and histogram of one score over all files, per day, week or month"""
+    try:
+        return await run_db(score_distribution, score_field, period, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/analytics/worst-files", response_model=List[FileScoreSummary])
+async def get_worst_files(
+    limit: int = Query(10, ge=1, le=1000),
+    by: str = "average",
+    min_reviews: int = Query(1, ge=1)
+):
+    """Files with the lowest overall score, averaged over their reviews (?by=average) or latest (?by=latest)"""
+    try:
+        return await run_db(worst_files, limit, by, min_reviews)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def store_review(filename: str, content: str, analysis: dict) -> CodeReviewResponse:
+    """
+    Save a review. With REVIEW_COALESCING_SHARE_ROW, identical reviews that
+    finish together (coalesced onto one LLM call) share a single row.
+    """
+    if not REVIEW_COALESCING_SHARE_ROW:
+        return await run_db(save_review, filename, content, analysis)
+    key = (filename, hashlib.sha256(content.encode("utf-8")).hexdigest())
+    return await review_saves.do(key, lambda: run_db(save_review, filename, content, analysis))
+
+def save_review(db: Session, filename: str, content: str, analysis: dict) -> CodeReviewResponse:
+    """Insert a review and return its response"""
+    db_review = create_review_record(db, filename, content, analysis)
+    db.add(db_review)
+    # Serialize after the flush assigns the id; refreshing after commit
+    # would reload the deferred text columns just written
+    db.flush()
+    response = review_to_response(db_review)
+    db.commit()
+    return response
+
+def review_to_response(review: CodeReview) -> CodeReviewResponse:
+    """Serialize a CodeReview row"""
     return CodeReviewResponse(
         id=review.id,
         filename=review.filename,
@@ -164,24 +723,96 @@ async def get_review(
         bug_risk_score=review.bug_risk_score,
         overall_score=review.overall_score,
         suggestions=review.suggestions,
-        created_at=review.created_at
+        created_at=review.created_at,
+        suggestion_items=[Suggestion.model_validate(item, from_attributes=True) for item in review.suggestion_items]
     )
 
-@app.delete("/api/reviews/{review_id}")
-async def delete_review(
-    review_id: int,
-    db: Session = Depends(get_db)
-):
+@app.get("/api/cache/stats")
+async def cache_stats():
     """
-    Delete a code review
+    Review cache hit, miss and eviction counters, and in-flight request coalescing
     """
-    review = db.query(CodeReview).filter(CodeReview.id == review_id).first()
-    if not review:
-        raise HTTPException(status_code=404, detail="Review not found")
-    
-    db.delete(review)
-    db.commit()
-    return {"message": "Review deleted successfully"}
+    coalescing = llm_reviewer.flights.stats()
+    if llm_reviewer.cache is None:
+        return {"enabled": False, "coalescing": coalescing}
+    return {"enabled": True, **llm_reviewer.cache.stats(), "coalescing": coalescing}
+
+@app.get("/api/llm/stats")
+async def llm_stats():
+    """
+    Client-side rate limiting (budgets, waits, retries), model routing
+    (circuit state, latency and error rate per model) and prompt sizes
+    before and after compaction
+    """
+    return {
+        "rate_limiter": llm_reviewer.rate_limiter.stats(),
+        "router": llm_reviewer.router.stats(),
+        "prompts": llm_reviewer.prompt_stats_summary()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Metrics in the Prometheus text format: per-stage latency histograms, LLM
+    tokens and cost per model, cache hit rates, in-flight gauges and DB pool
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def collect_component_metrics():
+    """Values owned by the cache, reviewer, job queue and connection pool, read at scrape time"""
+    if llm_reviewer.cache is not None:
+        cache = llm_reviewer.cache.stats()
+        yield "review_cache_lookups_total", "counter", "Review cache lookups by result", [
+            ({"result": "memory_hit"}, cache["memory_hits"]),
+            ({"result": "db_hit"}, cache["db_hits"]),
+            ({"result": "miss"}, cache["misses"])
+        ]
+        yield "review_cache_hit_ratio", "gauge", "Share of review cache lookups that hit", [({}, cache["hit_rate"])]
+        yield "review_cache_entries", "gauge", "Reviews in the in-process cache", [({}, cache["size"])]
+
+    flights = llm_reviewer.flights.stats()
+    yield "review_coalesced_total", "counter", "Reviews that joined an identical review in flight", [
+        ({}, flights["coalesced"])
+    ]
+    yield "review_flights_in_flight", "gauge", "Distinct reviews being generated", [({}, flights["in_flight"])]
+
+    limiter = llm_reviewer.rate_limiter.stats()
+    yield "llm_rate_limit_wait_seconds_total", "counter", "Time spent waiting for the rate limit budget", [
+        ({}, limiter["wait_seconds"])
+    ]
+    yield "llm_retries_total", "counter", "Retried LLM calls", [({}, limiter["retries"])]
+
+    models = llm_reviewer.router.stats()["models"]
+    yield "llm_model_available", "gauge", "1 if the model is routed to (circuit closed or half open)", [
+        ({"model": model}, 0 if info["state"] in ("open", "unavailable") else 1) for model, info in models.items()
+    ]
+
+    prompts = llm_reviewer.prompt_stats
+    yield "llm_prompt_tokens_estimated_total", "counter", "Estimated prompt tokens before and after compaction", [
+        ({"compaction": "before"}, prompts["tokens_before"]),
+        ({"compaction": "after"}, prompts["tokens_after"])
+    ]
+
+    yield "review_jobs_running", "gauge", "Background review jobs being processed", [({}, job_queue.running())]
+
+    connections, sizes = [], []
+    for name, pool_engine in (("sync", engine), ("async", async_engine)):
+        pool = getattr(pool_engine, "pool", None)
+        if pool is None or not hasattr(pool, "checkedout"):
+            continue  # In-memory SQLite and NullPool keep no pool statistics
+        connections.append(({"engine": name, "state": "checked_out"}, pool.checkedout()))
+        if hasattr(pool, "checkedin"):
+            connections.append(({"engine": name, "state": "idle"}, pool.checkedin()))
+        if hasattr(pool, "overflow"):
+            connections.append(({"engine": name, "state": "overflow"}, max(0, pool.overflow())))
+        if hasattr(pool, "size"):
+            sizes.append(({"engine": name}, pool.size()))
+    if connections:
+        yield "db_pool_connections", "gauge", "Database pool connections by state", connections
+    if sizes:
+        yield "db_pool_size", "gauge", "Configured database pool size", sizes
+
+REGISTRY.add_collector(collect_component_metrics)
 
 @app.get("/health")
 async def health_check():
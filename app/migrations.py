@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Data migrations for existing databases
+
+Schema changes (new tables, columns and indexes) are applied by
+``create_tables()`` on startup. This script moves data that startup leaves
+alone:
+
+    python -m app.migrations            # move inline file contents into file_blobs,
+                                        # and split stored suggestions into review_suggestions
+    python -m app.migrations --vacuum   # ...then reclaim the freed space (SQLite)
+    python -m app.migrations --rebuild-search   # re-index reviews for full-text search
+    python -m app.migrations --rebuild-analytics   # recompute the score rollups
+"""
+
+import argparse
+
+from sqlalchemy import exists, text
+
+from .database import SessionLocal, CodeReview, ReviewSuggestion, engine, create_tables, store_blob
+from . import analytics, search
+from .review_parsing import normalize_suggestions
+
+def migrate_file_contents(batch_size: int = 500) -> int:
+    """
+    Move file_content of rows written before blob storage into file_blobs.
+
+    Runs in batches, each in its own transaction, so it can be interrupted
+    and resumed. Returns the number of rows migrated.
+    """
+    migrated = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(CodeReview.id, CodeReview.file_content)
+                .filter(CodeReview.content_hash.is_(None), CodeReview.file_content.isnot(None))
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return migrated
+            for review_id, content in rows:
+                content_hash = store_blob(db, content)
+                db.query(CodeReview).filter(CodeReview.id == review_id).update(
+                    {"content_hash": content_hash, "file_content": None},
+                    synchronize_session=False
+                )
+            db.commit()
+            migrated += len(rows)
+        finally:
+            db.close()
+
+def migrate_suggestions(batch_size: int = 500) -> int:
+    """
+    Create review_suggestions rows for reviews stored before suggestions
+    were structured, splitting their newline-joined text. Severity and
+    category get the defaults; line numbers are taken from "line N" in the
+    text. Resumable like migrate_file_contents. Returns the number of
+    reviews migrated.
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            # Paged by id: a review whose text holds no suggestions gets no rows, and must not be picked again
+            rows = (
+                db.query(CodeReview.id, CodeReview.suggestions)
+                .filter(CodeReview.id > last_id)
+                .filter(CodeReview.suggestions.isnot(None), CodeReview.suggestions != "")
+                .filter(~exists().where(ReviewSuggestion.review_id == CodeReview.id))
+                .order_by(CodeReview.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return migrated
+            last_id = rows[-1][0]
+            items = []
+            for review_id, suggestions in rows:
+                for position, item in enumerate(normalize_suggestions(suggestions.split("\n"))):
+                    items.append({"review_id": review_id, "position": position, **item})
+            if items:
+                db.execute(ReviewSuggestion.__table__.insert(), items)
+            db.commit()
+            migrated += len(rows)
+        finally:
+            db.close()
+
+def vacuum():
+    """Rebuild the SQLite file so space freed by the migration is returned to the OS"""
+    if engine.dialect.name == "sqlite":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the SQLite database afterwards")
+    parser.add_argument("--rebuild-search", action="store_true",
+                        help="Re-index every review for full-text search and merge the index")
+    parser.add_argument("--rebuild-analytics", action="store_true",
+                        help="Recompute the score rollups behind /api/analytics from every review")
+    args = parser.parse_args()
+
+    create_tables()
+    migrated = migrate_file_contents(args.batch_size)
+    print(f"Moved the contents of {migrated} reviews into file_blobs")
+    migrated = migrate_suggestions(args.batch_size)
+    print(f"Split the suggestions of {migrated} reviews into review_suggestions")
+    if args.rebuild_search:
+        if not search.fts_enabled:
+            parser.error("The full-text index needs SQLite with FTS5")
+        search.rebuild_search_index(engine)
+        search.optimize_search_index(engine)
+        print("Rebuilt the full-text search index")
+    if args.rebuild_analytics:
+        analytics.rebuild_rollups(engine)
+        print("Rebuilt the score rollups")
+    if args.vacuum:
+        vacuum()
+        print("Vacuumed database")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Models to try in order of preference
+LLM_MODELS = [m.strip() for m in os.getenv("LLM_MODELS", "gpt-3.5-turbo,gpt-4,gpt-4-turbo").split(",") if m.strip()]
+
+# Cheaper model tried first for files of at most SMALL_FILE_LINES lines; empty disables size routing
+LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "").strip()
+SMALL_FILE_LINES = int(os.getenv("SMALL_FILE_LINES", "100"))
+
+# Consecutive failures that open a model's circuit, and seconds before it is tried again
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+# Seconds a model reported as not found is skipped before it is probed again
+MODEL_UNAVAILABLE_TTL = float(os.getenv("MODEL_UNAVAILABLE_TTL", "3600"))
+
+# Weight of the latest call in the moving average of latency
+LATENCY_SMOOTHING = 0.2
+
+class ModelHealth:
+    """Availability, circuit state and call statistics of one model"""
+
+    __slots__ = ("unavailable_until", "failures_in_row", "open_until", "probing",
+                 "calls", "successes", "failures", "skipped", "latency")
+
+    def __init__(self):
+        self.unavailable_until = 0.0
+        self.failures_in_row = 0
+        self.open_until = 0.0
+        self.probing = False  # A half-open trial call is in flight
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.latency = None
+
+    def state(self, now: float, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD) -> str:
+        if self.unavailable_until > now:
+            return "unavailable"
+        if self.open_until > now:
+            return "open"
+        if self.failures_in_row >= failure_threshold:
+            return "half_open"
+        return "closed"
+
+class ModelRouter:
+    """
+    Picks the models to call for a review. Models reported as not found
+    are remembered and skipped instead of being probed on every request,
+    and a circuit breaker skips models that keep failing until
+    ``reset_seconds`` have passed, when a single trial call is let through.
+    Shared by the async and threaded code paths.
+    """
+
+    def __init__(self, models: Optional[List[str]] = None, small_model: Optional[str] = None,
+                 small_file_lines: int = SMALL_FILE_LINES,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS,
+                 unavailable_ttl: float = MODEL_UNAVAILABLE_TTL):
+        self.models = list(models or LLM_MODELS)
+        self.small_model = LLM_SMALL_MODEL if small_model is None else small_model
+        self.small_file_lines = small_file_lines
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.unavailable_ttl = unavailable_ttl
+        self._health: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+        self.routes = {"small": 0, "default": 0, "exhausted": 0}
+
+    def preferred(self, lines: int) -> str:
+        """The model a file of ``lines`` lines is meant for, regardless of health"""
+        return self._order(lines)[0]
+
+    def candidates(self, lines: int) -> List[str]:
+        """Models to try, in order, for a file of ``lines`` lines"""
+        order = self._order(lines)
+        with self._lock:
+            now = time.monotonic()
+            usable = []
+            for model in order:
+                health = self._get(model)
+                state = health.state(now, self.failure_threshold)
+                if state in ("unavailable", "open") or (state == "half_open" and health.probing):
+                    health.skipped += 1
+                    continue
+                usable.append(model)
+
+            if not usable:
+                self.routes["exhausted"] += 1
+                # Every circuit is open: better a failing call than no review at all
+                fallback = [m for m in order if self._get(m).state(now, self.failure_threshold) != "unavailable"]
+                return fallback[:1]
+            self.routes["small" if order[0] == self.small_model and self.small_model else "default"] += 1
+            return usable
+
+    def record_success(self, model: str, latency: float):
+        with self._lock:
+            health = self._get(model)
+            health.calls += 1
+            health.successes += 1
+            health.failures_in_row = 0
+            health.open_until = 0.0
+            health.probing = False
+            health.unavailable_until = 0.0
+            health.latency = latency if health.latency is None else (
+                health.latency + LATENCY_SMOOTHING * (latency - health.latency))
+
+    def record_failure(self, model: str):
+        """A failed call (after retries); enough in a row open the circuit"""
+        with self._lock:
+            health = self._get(model)
+            health.calls += 1
+            health.failures += 1
+            health.failures_in_row += 1
+            health.probing = False
+            if health.failures_in_row >= self.failure_threshold:
+                health.open_until = time.monotonic() + self.reset_seconds
+
+    def record_unavailable(self, model: str):
+        """The API does not know the model; skip it for ``unavailable_ttl`` seconds"""
+        with self._lock:
+            health = self._get(model)
+            health.calls += 1
+            health.probing = False
+            health.unavailable_until = time.monotonic() + self.unavailable_ttl
+
+    def begin(self, model: str) -> bool:
+        """
+        Claim a call to ``model``. A half-open model gets one trial call at a
+        time; False means another caller is already trying it.
+        """
+        with self._lock:
+            health = self._get(model)
+            if health.state(time.monotonic(), self.failure_threshold) == "half_open":
+                if health.probing:
+                    health.skipped += 1
+                    return False
+                health.probing = True
+            return True
+
+    def release(self, model: str):
+        """Give up a claimed call without a success or failure (cancelled, or out of quota)"""
+        with self._lock:
+            self._get(model).probing = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            models = {}
+            for model in dict.fromkeys(self._order(0) + self.models):
+                health = self._get(model)
+                models[model] = {
+                    "state": health.state(now, self.failure_threshold),
+                    "calls": health.calls,
+                    "successes": health.successes,
+                    "failures": health.failures,
+                    "error_rate": round(health.failures / health.calls, 3) if health.calls else 0.0,
+                    "skipped": health.skipped,
+                    "latency_seconds": round(health.latency, 3) if health.latency is not None else None
+                }
+            return {"routes": dict(self.routes), "models": models}
+
+    def _order(self, lines: int) -> List[str]:
+        if self.small_model and lines <= self.small_file_lines:
+            return [self.small_model] + [m for m in self.models if m != self.small_model]
+        return self.models
+
+    def _get(self, model: str) -> ModelHealth:
+        health = self._health.get(model)
+        if health is None:
+            health = self._health[model] = ModelHealth()
+        return health
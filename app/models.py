@@ -1,11 +1,23 @@
 from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime
+from typing import Dict, Optional, List, Union
+from datetime import date, datetime
 
 class CodeReviewRequest(BaseModel):
     filename: str
     content: str
 
+class IncrementalReviewRequest(CodeReviewRequest):
+    # Defaults to the latest review of the same filename
+    base_review_id: Optional[int] = None
+
+class Suggestion(BaseModel):
+    text: str
+    severity: str = "medium"
+    category: str = "general"
+    # Lines of the reviewed file the suggestion refers to, when known
+    line_start: Optional[int] = None
+    line_end: Optional[int] = None
+
 class CodeReviewResponse(BaseModel):
     id: int
     filename: str
@@ -14,8 +26,76 @@ class CodeReviewResponse(BaseModel):
     modularity_score: float
     bug_risk_score: float
     overall_score: float
+    # Suggestion texts joined with newlines, for older clients; see suggestion_items
     suggestions: str
     created_at: datetime
+    suggestion_items: List[Suggestion] = []
+
+class IncrementalReviewResponse(CodeReviewResponse):
+    base_review_id: Optional[int] = None
+    incremental: bool = False  # False when the whole file was reviewed
+    changed_lines: int = 0
+
+class CodeReviewDetailResponse(CodeReviewResponse):
+    file_content: Optional[str] = None
+
+class CodeReviewSummary(BaseModel):
+    id: int
+    filename: str
+    readability_score: float
+    modularity_score: float
+    bug_risk_score: float
+    overall_score: float
+    created_at: datetime
+    # Heavy columns, only present when requested with ?include=
+    review_report: Optional[str] = None
+    suggestions: Optional[str] = None
+    file_content: Optional[str] = None
+
+class ReviewSuggestionResponse(Suggestion):
+    review_id: int
+    position: int  # Order within the review
+    filename: str
+    created_at: datetime
+
+class ReviewSearchResult(BaseModel):
+    id: int
+    filename: str
+    overall_score: float
+    created_at: datetime
+    # bm25 score, lower is a better match; None without the full-text index
+    rank: Optional[float] = None
+    # Excerpts around the matches, which are wrapped in **
+    report_snippet: str
+    suggestions_snippet: str
+
+class ScoreTrendBucket(BaseModel):
+    # None for ?period=all
+    bucket_start: Optional[date] = None
+    review_count: int
+    # Averages over the bucket's reviews
+    readability_score: Optional[float] = None
+    modularity_score: Optional[float] = None
+    bug_risk_score: Optional[float] = None
+    overall_score: Optional[float] = None
+
+class ScoreDistributionBucket(BaseModel):
+    bucket_start: Optional[date] = None
+    review_count: int
+    # p10 ... p99
+    percentiles: Dict[str, Optional[float]]
+    # Reviews per score value, in tenths ("7.5": 12)
+    histogram: Dict[str, int]
+
+class FileScoreSummary(BaseModel):
+    filename: str
+    review_count: int
+    average_readability_score: float
+    average_modularity_score: float
+    average_bug_risk_score: float
+    average_overall_score: float
+    latest_overall_score: Optional[float] = None
+    last_reviewed_at: Optional[datetime] = None
 
 class ReviewScores(BaseModel):
     readability_score: float
@@ -26,4 +106,33 @@ class ReviewScores(BaseModel):
 class ReviewReport(BaseModel):
     report: str
     scores: ReviewScores
-    suggestions: List[str]
+    suggestions: List[Suggestion]
+
+class BatchReviewItem(BaseModel):
+    filename: str
+    review: Optional[CodeReviewResponse] = None
+    error: Optional[str] = None
+
+class BatchReviewResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[BatchReviewItem]
+
+class RepositoryReviewResponse(BatchReviewResponse):
+    # Repository-level review aggregated from the per-file reviews
+    report: str
+    scores: ReviewScores
+    suggestions: List[Suggestion]
+    index: Dict[str, Union[int, float]]  # Files, symbols and imports indexed, and how long it took
+
+class ReviewJobResponse(BaseModel):
+    id: int
+    status: str
+    filename: str
+    review_id: Optional[int] = None
+    error: Optional[str] = None
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
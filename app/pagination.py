@@ -0,0 +1,56 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import or_
+
+from .database import CodeReview
+
+SCORE_FIELDS = ["overall_score", "readability_score", "modularity_score", "bug_risk_score"]
+
+def encode_cursor(created_at: datetime, review_id: int) -> str:
+    """Opaque cursor pointing just past a review in (created_at, id) order"""
+    raw = f"{created_at.isoformat()}|{review_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, review_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(review_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def apply_review_filters(query, filename_prefix: Optional[str] = None, score_field: str = "overall_score",
+                         min_score: Optional[float] = None, max_score: Optional[float] = None,
+                         created_after: Optional[datetime] = None, created_before: Optional[datetime] = None):
+    """Filter a CodeReview query; every filter is backed by an index"""
+    if filename_prefix:
+        # A range instead of LIKE so SQLite can use the filename index
+        query = query.filter(CodeReview.filename >= filename_prefix,
+                             CodeReview.filename < filename_prefix + "\U0010ffff")
+    if min_score is not None or max_score is not None:
+        if score_field not in SCORE_FIELDS:
+            raise ValueError(f"score_field must be one of: {', '.join(SCORE_FIELDS)}")
+        column = getattr(CodeReview, score_field)
+        if min_score is not None:
+            query = query.filter(column >= min_score)
+        if max_score is not None:
+            query = query.filter(column <= max_score)
+    if created_after is not None:
+        query = query.filter(CodeReview.created_at >= created_after)
+    if created_before is not None:
+        query = query.filter(CodeReview.created_at < created_before)
+    return query
+
+def apply_keyset(query, cursor: Optional[str] = None):
+    """Order newest first and start after ``cursor``, without OFFSET"""
+    if cursor:
+        created_at, review_id = decode_cursor(cursor)
+        # The redundant created_at <= bound lets the index seek straight to the page
+        query = query.filter(
+            CodeReview.created_at <= created_at,
+            or_(CodeReview.created_at < created_at, CodeReview.id < review_id)
+        )
+    return query.order_by(CodeReview.created_at.desc(), CodeReview.id.desc())
@@ -0,0 +1,182 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+# Client-side budgets matching the account's limits; 0 disables a budget
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+
+# Retries of rate-limited (429) and transient (5xx, connection) errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+
+# Exponential backoff: base delay and cap in seconds, used when there is no Retry-After
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "60"))
+
+# Buckets hold this many seconds of budget, so a burst cannot spend a whole
+# minute's allowance at once (the API enforces limits over shorter windows)
+BURST_SECONDS = 10
+
+# Roughly four characters per token for English text and code
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap prompt token estimate, without a tokenizer"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+class TokenBucket:
+    """
+    Budget refilled continuously at ``per_minute`` units per minute.
+
+    Reservations may take the level below zero; the caller then waits until
+    the debt is refilled, so waiting callers are served in arrival order.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take ``amount`` units and return the seconds to wait before using them"""
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+        self._level -= min(amount, self.capacity)
+        return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def settle(self, reserved: float, used: float, now: float):
+        """Return the part of a reservation that went unused, or take the overrun"""
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+        self._level = min(self.capacity, self._level + min(reserved, self.capacity) - min(used, self.capacity))
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budgets shared by every LLM
+    call in the process, from both the async and the threaded code paths.
+    A 429 pauses all callers for the Retry-After period.
+    """
+
+    def __init__(self, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+        self.retries = 0
+
+    async def acquire(self, tokens: int):
+        """
+        Wait until a request of ``tokens`` estimated tokens fits the budgets.
+        Retries of a call pass 0, as its tokens were reserved by its first
+        attempt, and only take a request.
+        """
+        delay = self._reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def acquire_blocking(self, tokens: int):
+        delay = self._reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def settle(self, tokens: int, usage):
+        """Replace the estimate ``tokens`` reserved for a call with its actual ``usage``, once known"""
+        used = getattr(usage, "total_tokens", None)
+        if used is None or self.tokens is None:
+            return
+        with self._lock:
+            self.tokens.settle(tokens, used, time.monotonic())
+
+    def record_retry(self, kind: str, delay: float):
+        """
+        Count a retry. After a 429 every caller is held back for ``delay``
+        (picked up by the next acquire); transient errors only delay the
+        request that failed, which sleeps itself.
+        """
+        with self._lock:
+            self.retries += 1
+            if kind == "rate_limit":
+                self.throttled += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests.rate * 60 if self.requests else None,
+                "tokens_per_minute": self.tokens.rate * 60 if self.tokens else None,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "throttled": self.throttled,
+                "retries": self.retries
+            }
+
+    def _reserve(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._paused_until - now)
+            if self.requests is not None:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens is not None and tokens:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+            if delay > 0:
+                self.waits += 1
+                self.wait_seconds += delay
+            return delay
+
+def is_quota_exhausted(error: Exception) -> bool:
+    """The account is out of credit; retrying will not help"""
+    return getattr(error, "code", None) == "insufficient_quota" or "insufficient_quota" in str(error)
+
+def retry_kind(error: Exception) -> Optional[str]:
+    """"rate_limit" or "transient" for errors worth retrying, else None"""
+    # Imported here so the app starts without loading openai until its first call
+    import openai
+    if isinstance(error, openai.RateLimitError):
+        return None if is_quota_exhausted(error) else "rate_limit"
+    if isinstance(error, openai.APITimeoutError):
+        return None  # Already waited the full timeout
+    if isinstance(error, (openai.InternalServerError, openai.APIConnectionError)):
+        return "transient"
+    if isinstance(error, openai.APIStatusError) and error.status_code in (408, 409):
+        return "transient"
+    return None
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from Retry-After(-ms) headers"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def backoff_delay(attempt: int, server_delay: Optional[float] = None) -> float:
+    """Delay before retry ``attempt`` (0-based), with jitter to spread retries out"""
+    if server_delay is not None:
+        # Never earlier than asked; a little later so waiting callers do not all retry at once
+        return server_delay + random.uniform(0, min(1.0, server_delay * 0.1 + 0.1))
+    delay = min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
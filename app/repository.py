@@ -0,0 +1,446 @@
+import ast
+import multiprocessing
+import os
+import posixpath
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .chunking import SCORE_KEYS
+from .review_parsing import normalize_suggestion
+
+# Maximum number of files reviewed from one repository
+REPO_MAX_FILES = int(os.getenv("REPO_MAX_FILES", "5000"))
+
+# Processes used to index a repository; 1 indexes in the request's worker thread
+REPO_INDEX_WORKERS = int(os.getenv("REPO_INDEX_WORKERS", str(os.cpu_count() or 1)))
+
+# Repositories smaller than this are indexed in-process; starting the pool costs more
+REPO_INDEX_POOL_MIN_FILES = int(os.getenv("REPO_INDEX_POOL_MIN_FILES", "200"))
+
+# Characters of dependency signatures added to each file's review prompt
+REPO_CONTEXT_MAX_CHARS = int(os.getenv("REPO_CONTEXT_MAX_CHARS", "3000"))
+
+# Entries in each section of the repository report
+REPORT_TOP_FILES = 10
+REPORT_MAX_SUGGESTIONS = 20
+
+JS_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs")
+
+# Declarations picked out of languages indexed by pattern rather than parsed
+DECLARATION_PATTERNS = {
+    "js": re.compile(
+        r"^(?:export\s+(?:default\s+)?)?(?:async\s+)?(?:function\s*\*?\s*(?P<function>\w+)\s*\(|"
+        r"(?:abstract\s+)?class\s+(?P<class>\w+)|(?:const|let)\s+(?P<const>\w+)\s*=\s*(?:async\s*)?\()",
+        re.MULTILINE
+    ),
+    "java": re.compile(
+        r"^\s*(?:(?:public|protected|internal|abstract|final|static|sealed|open|data)\s+)*"
+        r"(?:(?:class|interface|enum|record|object)\s+(?P<class>\w+)|"
+        r"(?:fun\s+|[\w<>\[\],.? ]+\s+)(?P<function>\w+)\s*\([^;{]*\)\s*(?:throws [\w., ]+)?(?::\s*[\w<>?]+)?\s*\{)",
+        re.MULTILINE
+    ),
+    "go": re.compile(
+        r"^(?:func\s+(?:\([^)]*\)\s*)?(?P<function>\w+)\s*\(|type\s+(?P<class>\w+)\s+(?:struct|interface))",
+        re.MULTILINE
+    ),
+    "rust": re.compile(
+        r"^\s*(?:pub(?:\([\w:]+\))?\s+)?(?:async\s+)?(?:fn\s+(?P<function>\w+)|(?:struct|enum|trait)\s+(?P<class>\w+))",
+        re.MULTILINE
+    ),
+}
+LANGUAGES = {
+    ".py": "python", ".js": "js", ".jsx": "js", ".ts": "js", ".tsx": "js", ".mjs": "js", ".cjs": "js",
+    ".java": "java", ".kt": "java", ".cs": "java", ".go": "go", ".rs": "rust",
+}
+
+JS_IMPORT = re.compile(
+    r"""(?:^|;)\s*import\s+(?:(?P<names>[\w*{}\s,$]+?)\s+from\s+)?['"](?P<module>[^'"]+)['"]|"""
+    r"""\brequire\(\s*['"](?P<required>[^'"]+)['"]\s*\)""",
+    re.MULTILINE
+)
+JAVA_IMPORT = re.compile(r"^\s*import\s+(?:static\s+)?([\w.]+)\s*;", re.MULTILINE)
+WORD = re.compile(r"[A-Za-z_]\w*")
+
+class Symbol(NamedTuple):
+    name: str
+    kind: str        # "function", "class" or "method"
+    signature: str   # Declaration line(s), without the body
+    line: int
+
+class Import(NamedTuple):
+    module: str              # Dotted module name, or a relative path for JavaScript
+    names: Tuple[str, ...]   # Names imported from it; empty for a whole-module import
+    line: int
+
+class FileSymbols(NamedTuple):
+    path: str
+    language: str
+    module: str
+    symbols: List[Symbol]
+    imports: List[Import]
+    defined: Tuple[str, ...]  # Every top-level name, for checking imports from this file
+    open_namespace: bool      # Star imports or __getattr__: any name may exist
+    error: Optional[str] = None
+
+def module_name(path: str) -> str:
+    """Dotted module name of a file: "pkg/sub/mod.py" -> "pkg.sub.mod", "pkg/__init__.py" -> "pkg" """
+    stem = os.path.splitext(path.replace("\\", "/").strip("/"))[0]
+    parts = [part for part in stem.split("/") if part and part != "."]
+    if parts and parts[-1] == "__init__":
+        parts.pop()
+    return ".".join(parts)
+
+def index_file(path: str, content: str) -> FileSymbols:
+    """
+    Symbols and imports of one file. Python is parsed; other languages are
+    scanned for declarations with patterns. Runs in the indexing processes,
+    so it only takes and returns plain data.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    language = LANGUAGES.get(extension, "other")
+    module = module_name(path)
+    if language == "python":
+        return _index_python(path, module, content)
+
+    symbols = []
+    pattern = DECLARATION_PATTERNS.get(language)
+    if pattern is not None:
+        for match in pattern.finditer(content):
+            name = match.group("function") or match.group("class") or (
+                match.groupdict().get("const") if language == "js" else None)
+            if not name:
+                continue
+            line = content.count("\n", 0, match.start()) + 1
+            end = content.find("\n", match.start())
+            signature = content[match.start():end if end >= 0 else len(content)].strip().rstrip("{").strip()
+            kind = "class" if match.group("class") else "function"
+            symbols.append(Symbol(name, kind, signature, line))
+
+    imports = []
+    if language == "js":
+        for match in JS_IMPORT.finditer(content):
+            target = match.group("module") or match.group("required")
+            names = tuple(WORD.findall((match.group("names") or "").replace(" as ", " ")))
+            imports.append(Import(target, names, content.count("\n", 0, match.start()) + 1))
+    elif language == "java":
+        for match in JAVA_IMPORT.finditer(content):
+            imports.append(Import(match.group(1), (), content.count("\n", 0, match.start()) + 1))
+    defined = tuple(symbol.name for symbol in symbols)
+    return FileSymbols(path, language, module, symbols, imports, defined, True)
+
+def _index_python(path: str, module: str, content: str) -> FileSymbols:
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError) as e:
+        return FileSymbols(path, "python", module, [], [], (), True, f"Could not parse: {e}")
+
+    lines = content.split("\n")
+    package = module if path.endswith("__init__.py") else module.rpartition(".")[0]
+    symbols, imports, defined = [], [], []
+    open_namespace = False
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            defined.append(node.name)
+            if node.name == "__getattr__":
+                open_namespace = True
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            symbols.append(Symbol(node.name, kind, _python_signature(lines, node), node.lineno))
+            if kind == "class":
+                for child in node.body:
+                    if (isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                            and (not child.name.startswith("_") or child.name == "__init__")):
+                        symbols.append(Symbol(f"{node.name}.{child.name}", "method",
+                                              _python_signature(lines, child), child.lineno))
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                defined.append((alias.asname or alias.name).split(".")[0])
+                imports.append(Import(alias.name, (), node.lineno))
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package.split(".") if package else []
+                parent = parent[:len(parent) - (node.level - 1)] if node.level > 1 else parent
+                base = ".".join(parent + ([base] if base else []))
+            names = tuple(alias.name for alias in node.names)
+            if "*" in names:
+                open_namespace = True
+            defined.extend(alias.asname or alias.name for alias in node.names if alias.name != "*")
+            imports.append(Import(base, tuple(name for name in names if name != "*"), node.lineno))
+        else:
+            for child in ast.walk(node) if isinstance(node, (ast.If, ast.Try)) else [node]:
+                targets = []
+                if isinstance(child, ast.Assign):
+                    targets = child.targets
+                elif isinstance(child, (ast.AnnAssign, ast.AugAssign)):
+                    targets = [child.target]
+                elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    defined.append(child.name)
+                elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                    defined.extend((alias.asname or alias.name).split(".")[0] for alias in child.names)
+                for target in targets:
+                    defined.extend(n.id for n in ast.walk(target) if isinstance(n, ast.Name))
+    return FileSymbols(path, "python", module, symbols, imports, tuple(defined), open_namespace)
+
+def _python_signature(lines: List[str], node: ast.AST) -> str:
+    """The ``def``/``class`` line(s) of a node, without decorators or body"""
+    body = node.body[0]
+    if body.lineno > node.lineno:
+        header = lines[node.lineno - 1:body.lineno - 1]
+    else:
+        header = [lines[node.lineno - 1][:body.col_offset]]
+    text = " ".join(line.strip() for line in header if line.strip() and not line.strip().startswith("#"))
+    text = text.rstrip().rstrip(":").rstrip()
+    doc = ast.get_docstring(node, clean=True) if not isinstance(body, ast.Pass) else None
+    if doc:
+        text += f"  # {doc.strip().splitlines()[0][:100]}"
+    return text
+
+class RepositoryIndex:
+    """
+    Symbols and imports of every file of a repository, with imports resolved
+    to the files they refer to. Builds the dependency context for each file's
+    review prompt and finds imports of names a repository file does not define.
+    """
+
+    def __init__(self, files: Sequence[FileSymbols], index_seconds: float = 0.0, workers: int = 1):
+        self.files: Dict[str, FileSymbols] = {f.path: f for f in files}
+        self.index_seconds = index_seconds
+        self.workers = workers
+        self._modules: Dict[str, str] = {}
+        # Every dotted suffix of a module name finds it, so an archive's top folder
+        # or a src/ layout does not break absolute imports
+        for f in sorted(files, key=lambda f: (f.module.count("."), f.path)):
+            parts = f.module.split(".") if f.module else []
+            for start in range(len(parts)):
+                self._modules.setdefault(".".join(parts[start:]), f.path)
+        self.dependencies: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {
+            f.path: self._resolve(f) for f in files
+        }
+
+    def _resolve(self, f: FileSymbols) -> List[Tuple[str, Tuple[str, ...]]]:
+        """(path, names) of the repository files ``f`` imports"""
+        resolved = []
+        for imp in f.imports:
+            if f.language == "js":
+                path = self._resolve_js(f.path, imp.module)
+                if path:
+                    resolved.append((path, imp.names))
+                continue
+            names = []
+            for name in imp.names:
+                # "from pkg import mod" imports a module, not a name of pkg
+                submodule = self._modules.get(f"{imp.module}.{name}" if imp.module else name)
+                if submodule and submodule != f.path:
+                    resolved.append((submodule, ()))
+                else:
+                    names.append(name)
+            path = self._modules.get(imp.module) if imp.module else None
+            if path and path != f.path and (names or not imp.names):
+                resolved.append((path, tuple(names)))
+        return resolved
+
+    def _resolve_js(self, importer: str, specifier: str) -> Optional[str]:
+        if not specifier.startswith("."):
+            return None
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(importer), specifier))
+        candidates = [base] + [base + ext for ext in JS_EXTENSIONS] + [f"{base}/index{ext}" for ext in JS_EXTENSIONS]
+        for candidate in candidates:
+            if candidate in self.files:
+                return candidate
+        # TypeScript imports name the compiled ".js" file
+        stem = os.path.splitext(base)[0]
+        for ext in JS_EXTENSIONS:
+            if stem + ext in self.files:
+                return stem + ext
+        return None
+
+    def context_for(self, path: str, content: str, max_chars: int = REPO_CONTEXT_MAX_CHARS) -> str:
+        """
+        Signatures from the files ``path`` imports: the names it imports by
+        name, and the other public symbols its code mentions, within
+        ``max_chars``. Empty when it imports nothing from the repository.
+        """
+        merged: Dict[str, List] = {}  # path -> [names imported by name, whether imported whole]
+        for dependency, names in self.dependencies.get(path, []):
+            entry = merged.setdefault(dependency, [set(), False])
+            if names:
+                entry[0].update(names)
+            else:
+                entry[1] = True
+
+        words = set(WORD.findall(content)) if any(whole for _, whole in merged.values()) else set()
+        sections = []
+        used = 0
+        omitted = 0
+        for dependency, (names, whole) in merged.items():
+            symbols = self.files[dependency].symbols
+            # Top-level functions and classes asked for, with the methods of those classes
+            roots = {s.name for s in symbols if s.kind != "method" and (
+                s.name in names or (whole and s.name in words and not s.name.startswith("_")))}
+            picked = [s for s in symbols if s.name.split(".")[0] in roots]
+            if not picked:
+                continue
+            header = f"# {dependency}"
+            lines = [header]
+            for symbol in picked:
+                indent = "    " if symbol.kind == "method" else ""
+                entry = f"{indent}{symbol.signature}"
+                if used + len(header) + len(entry) + 1 > max_chars:
+                    omitted += 1
+                    continue
+                lines.append(entry)
+                used += len(entry) + 1
+            if len(lines) > 1:
+                sections.append("\n".join(lines))
+                used += len(header) + 1
+        if omitted:
+            sections.append(f"# ... {omitted} more signatures omitted")
+        return "\n\n".join(sections)
+
+    def missing_imports(self) -> List[Tuple[str, int, str, str]]:
+        """(importer, line, name, file) for Python imports of names a repository file does not define"""
+        missing = []
+        for f in self.files.values():
+            if f.language != "python":
+                continue
+            for imp in f.imports:
+                path = self._modules.get(imp.module) if imp.module else None
+                target = self.files.get(path) if path else None
+                if target is None or target.path == f.path or target.open_namespace or target.error:
+                    continue
+                defined = set(target.defined)
+                for name in imp.names:
+                    if name not in defined and f"{imp.module}.{name}" not in self._modules:
+                        missing.append((f.path, imp.line, name, target.path))
+        return missing
+
+    def dependents(self) -> Dict[str, int]:
+        """How many files import each repository file"""
+        counts: Dict[str, int] = {}
+        for path, dependencies in self.dependencies.items():
+            for dependency in {d for d, _ in dependencies}:
+                counts[dependency] = counts.get(dependency, 0) + 1
+        return counts
+
+    def stats(self) -> Dict:
+        return {
+            "files": len(self.files),
+            "symbols": sum(len(f.symbols) for f in self.files.values()),
+            "internal_imports": sum(len(d) for d in self.dependencies.values()),
+            "parse_errors": sum(1 for f in self.files.values() if f.error),
+            "index_seconds": round(self.index_seconds, 3),
+            "workers": self.workers
+        }
+
+# Indexing pool shared by the repository reviews of this process; see start_index_pool
+_index_pool: Optional[ProcessPoolExecutor] = None
+_index_pool_workers = 0
+
+def _pool_context():
+    """
+    Worker processes are started by a fork server (or spawned), never forked
+    from the server process, whose other threads may hold locks at the time
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+def start_index_pool(workers: int = REPO_INDEX_WORKERS):
+    """
+    Create the long-lived indexing pool, once per process at startup. Its
+    processes are launched when the first large repository is indexed.
+    """
+    global _index_pool, _index_pool_workers
+    if _index_pool is None and workers > 1:
+        _index_pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+        _index_pool_workers = workers
+
+def shutdown_index_pool():
+    global _index_pool, _index_pool_workers
+    if _index_pool is not None:
+        _index_pool.shutdown()
+        _index_pool, _index_pool_workers = None, 0
+
+def build_index(files: Sequence[Tuple[str, str]], workers: Optional[int] = None) -> RepositoryIndex:
+    """
+    Index ``(path, content)`` pairs. Parsing is CPU-bound, so large
+    repositories are indexed in the pool from start_index_pool, or without
+    one (scripts, tests) in a pool of ``workers`` for this call only.
+    """
+    if workers is None:
+        workers = _index_pool_workers if _index_pool is not None else REPO_INDEX_WORKERS
+    start = time.perf_counter()
+    if workers > 1 and len(files) >= REPO_INDEX_POOL_MIN_FILES:
+        paths = [path for path, _ in files]
+        contents = [content for _, content in files]
+        chunksize = max(1, len(files) // (workers * 4))
+        if _index_pool is not None:
+            workers = _index_pool_workers
+            symbols = list(_index_pool.map(index_file, paths, contents, chunksize=chunksize))
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+                symbols = list(pool.map(index_file, paths, contents, chunksize=chunksize))
+    else:
+        workers = 1
+        symbols = [index_file(path, content) for path, content in files]
+    return RepositoryIndex(symbols, time.perf_counter() - start, workers)
+
+def repository_report(index: RepositoryIndex, reviews: Sequence[Tuple[str, int, Dict]],
+                      failed: Sequence[Tuple[str, str]] = ()) -> Dict:
+    """
+    Combine per-file reviews, as ``(path, lines, analysis)``, into a
+    ReviewReport-shaped repository review: scores weighted by file size,
+    the weakest and most depended-on files, and cross-file import problems.
+    ``failed`` holds (path, error) pairs for files whose review failed;
+    they are listed as not reviewed rather than scored.
+    """
+    total_lines = sum(lines for _, lines, _ in reviews) or 1
+    scores = {
+        key: round(sum(float(analysis["scores"][key]) * lines for _, lines, analysis in reviews) / total_lines, 1)
+        for key in SCORE_KEYS
+    } if reviews else {key: 0.0 for key in SCORE_KEYS}
+
+    stats = index.stats()
+    sections = [
+        f"Reviewed {len(reviews)} files ({total_lines if reviews else 0} lines). Indexed {stats['files']} files, "
+        f"{stats['symbols']} symbols and {stats['internal_imports']} imports between repository files."
+    ]
+
+    if failed:
+        sections.append("## Not reviewed\n\nThese files could not be reviewed and are not included in the "
+                        "scores.\n\n" + "\n".join(f"- {path}: {error}" for path, error in failed))
+
+    weakest = sorted(reviews, key=lambda review: float(review[2]["scores"]["overall_score"]))[:REPORT_TOP_FILES]
+    if weakest:
+        sections.append("## Lowest-scoring files\n\n" + "\n".join(
+            f"- {path}: {float(analysis['scores']['overall_score']):.1f}" for path, _, analysis in weakest
+        ))
+
+    dependents = sorted(index.dependents().items(), key=lambda item: (-item[1], item[0]))[:REPORT_TOP_FILES]
+    if dependents:
+        sections.append("## Most imported files\n\nChanges to these affect the most code.\n\n" + "\n".join(
+            f"- {path}: imported by {count} file{'s' if count != 1 else ''}" for path, count in dependents
+        ))
+
+    suggestions = []
+    missing = index.missing_imports()
+    if missing:
+        issues = [(f"{importer}:{line} imports `{name}` from {target}, which does not define it", line)
+                  for importer, line, name, target in missing]
+        sections.append("## Cross-file issues\n\n" + "\n".join(f"- {issue}" for issue, _ in issues))
+        suggestions.extend({"text": issue, "severity": "high", "category": "bug", "line_start": line,
+                            "line_end": line} for issue, line in issues)
+
+    for path, _, analysis in weakest:
+        for suggestion in analysis.get("suggestions", [])[:2]:
+            item = normalize_suggestion(suggestion)
+            if item is not None:
+                # Line numbers refer to the file named in the text
+                suggestions.append({**item, "text": f"{path}: {item['text']}"})
+
+    return {
+        "report": "\n\n".join(sections),
+        "scores": scores,
+        "suggestions": suggestions[:REPORT_MAX_SUGGESTIONS]
+    }
@@ -0,0 +1,290 @@
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .chunking import SCORE_KEYS
+from .models import ReviewReport
+
+# Keys that identify a JSON object in the model output as the review
+REVIEW_KEYS = ("report", "scores")
+
+# Commas remembered as cut points for repairing truncated output
+REPAIR_CUT_POINTS = 3
+
+CLOSERS = {"{": "}", "[": "]"}
+
+# Characters that change the scanner's state, outside and inside strings
+STRUCTURAL = re.compile(r'[{}\[\]",]')
+STRING_SPECIAL = re.compile(r'["\\]')
+
+# Suggestion severities, most severe first, and categories; other values the
+# model returns are mapped through the aliases, or to the defaults
+SEVERITIES = ("critical", "high", "medium", "low", "info")
+CATEGORIES = ("bug", "security", "performance", "readability", "modularity", "style", "testing",
+              "documentation", "general")
+DEFAULT_SEVERITY = "medium"
+DEFAULT_CATEGORY = "general"
+SEVERITY_ALIASES = {"blocker": "critical", "error": "high", "major": "high", "warning": "medium",
+                    "minor": "low", "nit": "low", "suggestion": "info"}
+CATEGORY_ALIASES = {"bugs": "bug", "bug_risk": "bug", "correctness": "bug", "maintainability": "modularity",
+                    "design": "modularity", "naming": "style", "formatting": "style", "tests": "testing",
+                    "docs": "documentation"}
+
+# "line 12", "lines 12-18" in suggestion text without line fields
+LINE_REFERENCE = re.compile(r"\blines? (\d+)(?:\s*(?:-|–|to)\s*(\d+))?", re.IGNORECASE)
+
+class JsonObjectScanner:
+    """
+    Find the review object in model output, fed in one piece or as it
+    streams in.
+
+    The output is scanned once, jumping between the characters that change
+    the string and nesting state, so braces inside strings (code in the
+    report) and prose or code fences around the object do not confuse it.
+    An object must start with ``{"`` to be considered, which skips braces
+    in surrounding prose and code. Output that ends inside the object
+    (truncated by max_tokens) is repaired by closing it, or by cutting back
+    to one of the last commas.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []  # Output from offset self._base on
+        self._base = 0
+        self._length = 0        # Characters fed so far
+        self._start = None      # Offset of the "{" of the object being scanned
+        self._pending = None    # Offset of a "{" waiting to see its next character
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._cuts: List[Tuple[int, Tuple[str, ...]]] = []  # (comma offset, closers of open containers)
+        self.result: Optional[Dict] = None
+
+    def feed(self, delta: str):
+        if self.result is not None or not delta:
+            return
+        offset = self._length
+        self._parts.append(delta)
+        self._length += len(delta)
+
+        i = 0
+        end = len(delta)
+        while i < end:
+            if self._start is None:
+                if self._pending is not None:
+                    char = delta[i]
+                    if char.isspace():
+                        i += 1
+                        continue
+                    self._pending, pending = None, self._pending
+                    if char == '"':
+                        self._open(pending)
+                        self._in_string = True
+                        i += 1
+                        continue
+                found = delta.find("{", i)
+                if found < 0:
+                    break
+                self._pending = offset + found
+                i = found + 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    i += 1
+                    continue
+                match = STRING_SPECIAL.search(delta, i)
+                if match is None:
+                    break
+                i = match.end()
+                if match.group() == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+                continue
+
+            match = STRUCTURAL.search(delta, i)
+            if match is None:
+                break
+            char = match.group()
+            position = offset + match.start()
+            i = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in CLOSERS:
+                self._stack.append(CLOSERS[char])
+            elif char == ",":
+                self._cuts.append((position, tuple(self._stack)))
+                if len(self._cuts) > REPAIR_CUT_POINTS:
+                    del self._cuts[0]
+            elif self._stack.pop() != char:
+                self._reset()  # Mismatched brackets: not JSON after all
+            elif not self._stack:
+                candidate = _load(self._slice(self._start, position + 1))
+                self._reset()
+                if candidate is not None:
+                    self.result = candidate
+                    return
+
+        if self._start is None and self._pending is None:
+            # Nothing before this point can be part of the review
+            self._parts = []
+            self._base = self._length
+
+    def finish(self) -> Optional[Dict]:
+        """The review object, repairing output that ended inside it"""
+        if self.result is not None or self._start is None:
+            return self.result
+
+        text = self._slice(self._start, self._length)
+        if self._escape:
+            text = text[:-1]
+        closing = ('"' if self._in_string else "") + "".join(reversed(self._stack))
+        attempts = [text + closing]
+        for index, stack in reversed(self._cuts):
+            attempts.append(text[:index - self._start] + "".join(reversed(stack)))
+        for attempt in attempts:
+            candidate = _load(attempt)
+            if candidate is not None:
+                self.result = candidate
+                break
+        return self.result
+
+    def _slice(self, start: int, end: int) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0][start - self._base:end - self._base] if self._parts else ""
+
+    def _open(self, offset: int):
+        self._start = offset
+        self._pending = None
+        self._stack = ["}"]
+        self._cuts = []
+
+    def _reset(self):
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._cuts = []
+
+def _load(text: str) -> Optional[Dict]:
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and any(key in data for key in REVIEW_KEYS):
+        return data
+    return None
+
+def extract_json_object(text: str) -> Optional[Dict]:
+    """The review-like JSON object in ``text``, or None"""
+    scanner = JsonObjectScanner()
+    scanner.feed(text)
+    return scanner.finish()
+
+def validate_review(data: Optional[Dict]) -> Optional[Dict]:
+    """
+    Check a decoded review against ReviewReport and normalize it: scores
+    clamped to 0-10, a missing overall score averaged from the others, a
+    single suggestion wrapped in a list and every suggestion
+    structured (normalize_suggestion). None if it is not a review.
+    """
+    if not isinstance(data, dict):
+        return None
+    data = dict(data)
+    scores = data.get("scores")
+    if isinstance(scores, dict) and "overall_score" not in scores:
+        try:
+            parts = [float(scores[key]) for key in SCORE_KEYS[:-1]]
+            data["scores"] = {**scores, "overall_score": round(sum(parts) / len(parts), 1)}
+        except (KeyError, TypeError, ValueError):
+            pass
+    suggestions = data.get("suggestions")
+    if suggestions is None:
+        data["suggestions"] = []
+    elif isinstance(suggestions, (str, dict)):
+        data["suggestions"] = [suggestions]
+    if isinstance(data["suggestions"], list):
+        data["suggestions"] = normalize_suggestions(data["suggestions"])
+
+    try:
+        review = ReviewReport.model_validate(data)
+    except ValidationError:
+        return None
+    result = review.model_dump()
+    result["scores"] = {key: min(10.0, max(0.0, value)) for key, value in result["scores"].items()}
+    return result
+
+def suggestion_text(suggestion) -> str:
+    """The text of a suggestion, structured or a plain string"""
+    return suggestion if isinstance(suggestion, str) else suggestion.get("text", "")
+
+def normalize_suggestion(suggestion) -> Optional[Dict]:
+    """
+    A suggestion as {text, severity, category, line_start, line_end}, from
+    a plain string or an object in any of the shapes models return. Line
+    numbers missing from an object are taken from "line N" in its text.
+    None for a suggestion without text.
+    """
+    if isinstance(suggestion, str):
+        suggestion = {"text": suggestion}
+    elif not isinstance(suggestion, dict):
+        return None
+    text = suggestion.get("text") or suggestion.get("suggestion") or suggestion.get("description") or ""
+    if not isinstance(text, str):
+        text = json.dumps(text)
+    text = text.strip()
+    if not text:
+        return None
+
+    severity = str(suggestion.get("severity") or "").strip().lower()
+    severity = SEVERITY_ALIASES.get(severity, severity)
+    category = str(suggestion.get("category") or "").strip().lower()
+    category = CATEGORY_ALIASES.get(category, category)
+
+    line_start = _line_number(suggestion.get("line_start", suggestion.get("line")))
+    line_end = _line_number(suggestion.get("line_end"))
+    if line_start is None:
+        match = LINE_REFERENCE.search(text)
+        if match:
+            line_start = int(match.group(1))
+            line_end = int(match.group(2)) if match.group(2) else None
+    if line_start is not None and (line_end is None or line_end < line_start):
+        line_end = line_start
+    elif line_start is None:
+        line_end = None
+
+    return {
+        "text": text,
+        "severity": severity if severity in SEVERITIES else DEFAULT_SEVERITY,
+        "category": category if category in CATEGORIES else DEFAULT_CATEGORY,
+        "line_start": line_start,
+        "line_end": line_end
+    }
+
+def normalize_suggestions(suggestions: List) -> List[Dict]:
+    """Normalize each suggestion, dropping empty ones"""
+    normalized = (normalize_suggestion(suggestion) for suggestion in suggestions)
+    return [suggestion for suggestion in normalized if suggestion is not None]
+
+def _line_number(value) -> Optional[int]:
+    if isinstance(value, str):
+        value = value.strip().split("-")[0]
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+def parse_review(text: str) -> Optional[Dict]:
+    """Extract and validate the review in model output; None if there is no usable one"""
+    return validate_review(extract_json_object(text))
+
+def partial_report(data: Optional[Dict]) -> Optional[str]:
+    """The report text of an object that did not validate, if it has one"""
+    if isinstance(data, dict) and isinstance(data.get("report"), str) and data["report"].strip():
+        return data["report"]
+    return None
@@ -0,0 +1,202 @@
+import os
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# Set to "false" to search with LIKE scans instead of the SQLite FTS5 index
+SEARCH_FTS_ENABLED = os.getenv("SEARCH_FTS_ENABLED", "true").lower() == "true"
+
+SEARCH_TABLE = "review_search"
+
+# Searchable fields and their columns, in the order of the FTS5 table
+SEARCH_FIELDS = {"filename": "filename", "report": "review_report", "suggestions": "suggestions"}
+
+# bm25 weights of matches in the filename, report and suggestions
+RANK_WEIGHTS = (2.0, 1.0, 1.5)
+
+# Relevance ranking scores only the newest this many matches of a query, so
+# searches for common words stay fast on large tables; 0 ranks every match
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "20000"))
+
+# Tokens around the matches in a snippet, and the markers around each match
+SNIPPET_TOKENS = 16
+HIGHLIGHT_OPEN = "**"
+HIGHLIGHT_CLOSE = "**"
+ELLIPSIS = "…"
+
+# External content table: the index stores no second copy of the text.
+# Porter stemming lets "injection" find "injections"; unicode61 splits
+# filenames on "/" and "." so path parts are searchable.
+CREATE_INDEX = f"""
+CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+    filename, review_report, suggestions,
+    content='code_reviews', content_rowid='id', tokenize='porter unicode61'
+)
+"""
+TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS code_reviews_search_insert AFTER INSERT ON code_reviews BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, filename, review_report, suggestions)
+        VALUES (new.id, new.filename, new.review_report, new.suggestions);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS code_reviews_search_delete AFTER DELETE ON code_reviews BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, filename, review_report, suggestions)
+        VALUES ('delete', old.id, old.filename, old.review_report, old.suggestions);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS code_reviews_search_update
+        AFTER UPDATE OF filename, review_report, suggestions ON code_reviews BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, filename, review_report, suggestions)
+        VALUES ('delete', old.id, old.filename, old.review_report, old.suggestions);
+        INSERT INTO {SEARCH_TABLE}(rowid, filename, review_report, suggestions)
+        VALUES (new.id, new.filename, new.review_report, new.suggestions);
+    END""",
+)
+
+TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+# Whether the FTS5 index is in use; set by create_search_index
+fts_enabled = False
+
+def create_search_index(engine) -> bool:
+    """
+    Create the FTS5 index and the triggers keeping it in sync with
+    code_reviews, indexing the reviews already stored. False when the
+    database is not SQLite or SQLite was built without FTS5; searches then
+    fall back to LIKE scans.
+    """
+    global fts_enabled
+    fts_enabled = False
+    if not SEARCH_FTS_ENABLED or engine.dialect.name != "sqlite":
+        return False
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": SEARCH_TABLE}
+        ).first()
+    if not exists:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(CREATE_INDEX))
+                conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+        except OperationalError:
+            return False  # No FTS5 module in this SQLite build
+    with engine.begin() as conn:
+        for trigger in TRIGGERS:
+            conn.execute(text(trigger))
+    fts_enabled = True
+    return True
+
+def rebuild_search_index(engine):
+    """Re-index every review, e.g. after rows were changed with the triggers missing"""
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')"))
+
+def optimize_search_index(engine):
+    """Merge the index's segments into one, for faster queries after bulk loads"""
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+
+def query_terms(query: str) -> List[tuple]:
+    """(text, prefix) for each word or "quoted phrase" of a search query"""
+    terms = []
+    for phrase, word in TERM.findall(query):
+        prefix = not phrase and word.endswith("*")
+        value = (phrase or word.rstrip("*")).strip()
+        if re.search(r"\w", value):
+            terms.append((value, prefix))
+    if not terms:
+        raise ValueError("Search query has no words")
+    return terms
+
+def match_expression(query: str, field: Optional[str] = None) -> str:
+    """
+    FTS5 MATCH expression for a user query. Every word and quoted phrase is
+    quoted, so punctuation in the query ("bare except:") is never read as
+    query syntax; all of them must match, and "word*" matches a prefix.
+    """
+    phrases = []
+    for value, prefix in query_terms(query):
+        phrases.append('"' + value.replace('"', '""') + '"' + ("*" if prefix else ""))
+    expression = " ".join(phrases)
+    if field:
+        expression = f"{SEARCH_FIELDS[field]} : ({expression})"
+    return expression
+
+def search_reviews(db, query: str, field: Optional[str] = None, sort: str = "relevance",
+                   limit: int = 20, offset: int = 0) -> List[Dict]:
+    """
+    Reviews matching ``query``, best matches first (or newest first with
+    ``sort="recent"``), with highlighted snippets of the report and
+    suggestions. Relevance is ranked among the newest SEARCH_RANK_WINDOW
+    matches. Raises ValueError for a query without words.
+    """
+    if not fts_enabled:
+        return _search_like(db, query, field, limit, offset)
+
+    match = match_expression(query, field)
+    weights = ", ".join(str(weight) for weight in RANK_WEIGHTS)
+    snippet = f"'{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', '{ELLIPSIS}', {SNIPPET_TOKENS}"
+    order = "rank" if sort == "relevance" else f"{SEARCH_TABLE}.rowid DESC"
+    # Matches are walked newest first without scoring them, which is cheap,
+    # to find the oldest rowid inside the ranking window
+    floor = None
+    if sort == "relevance" and SEARCH_RANK_WINDOW:
+        floor = db.execute(text(f"""
+            SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query
+            ORDER BY rowid DESC LIMIT 1 OFFSET :window
+        """), {"query": match, "window": SEARCH_RANK_WINDOW}).scalar()
+    rows = db.execute(text(f"""
+        SELECT c.id, c.filename, c.overall_score, c.created_at, {SEARCH_TABLE}.rank AS rank,
+               snippet({SEARCH_TABLE}, 1, {snippet}) AS report_snippet,
+               snippet({SEARCH_TABLE}, 2, {snippet}) AS suggestions_snippet
+        FROM {SEARCH_TABLE} JOIN code_reviews c ON c.id = {SEARCH_TABLE}.rowid
+        WHERE {SEARCH_TABLE} MATCH :query AND {SEARCH_TABLE}.rank MATCH 'bm25({weights})'
+            AND {SEARCH_TABLE}.rowid > :floor
+        ORDER BY {order}
+        LIMIT :limit OFFSET :offset
+    """), {"query": match, "floor": floor or 0, "limit": limit, "offset": offset}).mappings().all()
+    return [dict(row) for row in rows]
+
+def _search_like(db, query: str, field: Optional[str], limit: int, offset: int) -> List[Dict]:
+    """Unranked search for databases without FTS5: every term as a substring, newest first"""
+    from sqlalchemy import and_, or_
+    from .database import CodeReview
+
+    terms = [value for value, _ in query_terms(query)]
+    columns = [getattr(CodeReview, SEARCH_FIELDS[field])] if field else [
+        CodeReview.filename, CodeReview.review_report, CodeReview.suggestions
+    ]
+    condition = and_(*(or_(*(column.ilike(f"%{term}%") for column in columns)) for term in terms))
+    rows = (
+        db.query(CodeReview.id, CodeReview.filename, CodeReview.overall_score, CodeReview.created_at,
+                 CodeReview.review_report, CodeReview.suggestions)
+        .filter(condition)
+        .order_by(CodeReview.created_at.desc(), CodeReview.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .all()
+    )
+    return [{
+        "id": row.id,
+        "filename": row.filename,
+        "overall_score": row.overall_score,
+        "created_at": row.created_at,
+        "rank": None,
+        "report_snippet": make_snippet(row.review_report or "", terms),
+        "suggestions_snippet": make_snippet(row.suggestions or "", terms)
+    } for row in rows]
+
+def make_snippet(value: str, terms: List[str], tokens: int = SNIPPET_TOKENS) -> str:
+    """Words around the first match of any term in ``value``, with the matches highlighted"""
+    words = value.split()
+    lowered = [word.lower() for word in words]
+    needles = [term.lower() for term in terms]
+    first = next((i for i, word in enumerate(lowered) if any(n in word for n in needles)), 0)
+    start = max(0, first - tokens // 2)
+    window = words[start:start + tokens]
+    marked = [
+        f"{HIGHLIGHT_OPEN}{word}{HIGHLIGHT_CLOSE}" if any(n in word.lower() for n in needles) else word
+        for word in window
+    ]
+    return (ELLIPSIS if start else "") + " ".join(marked) + (ELLIPSIS if start + tokens < len(words) else "")
@@ -0,0 +1,52 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+# Concurrent requests to review identical content wait on one LLM call
+REVIEW_COALESCING = os.getenv("REVIEW_COALESCING", "true").lower() == "true"
+
+# Whether coalesced requests also share one saved review instead of saving one each
+REVIEW_COALESCING_SHARE_ROW = os.getenv("REVIEW_COALESCING_SHARE_ROW", "false").lower() == "true"
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time; callers arriving while a call is
+    in flight wait for it and get the same result.
+
+    The call runs in its own task, so a caller that is cancelled (a client
+    disconnecting) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.joined = 0
+
+    def join(self, key: Hashable) -> Optional[asyncio.Task]:
+        """The in-flight call for ``key``, if any; await it through asyncio.shield"""
+        task = self._calls.get(key)
+        if task is not None:
+            self.joined += 1
+        return task
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable]) -> asyncio.Task:
+        """Start ``fn()`` as the in-flight call for ``key``"""
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        self.started += 1
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Return the result of the in-flight call for ``key``, starting ``fn()`` if there is none"""
+        task = self.join(key) or self.start(key, fn)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {"in_flight": len(self._calls), "started": self.started, "coalesced": self.joined}
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark the error retrieved when every caller went away
@@ -0,0 +1,431 @@
+import ast
+import math
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+# Thresholds above which a function is flagged
+MAX_FUNCTION_LINES = 50
+MAX_COMPLEXITY = 10
+MAX_NESTING = 4
+MAX_LINE_LENGTH = 120
+
+# Consecutive significant lines that must repeat to count as a duplicate block
+DUPLICATE_WINDOW = 6
+
+MAX_SUGGESTIONS = 10
+
+SNAKE_CASE = re.compile(r"_{0,2}[a-z][a-z0-9_]*_{0,2}$")
+CAP_WORDS = re.compile(r"_?[A-Z][A-Za-z0-9]*$")
+COMMENT_PREFIXES = ("#", "//", "/*", "*", "--")
+BRANCH_KEYWORDS = re.compile(r"\b(?:if|for|while|case|catch|elif|except)\b|&&|\|\|")
+
+FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+NESTING_TYPES = tuple(
+    getattr(ast, name) for name in ("If", "For", "AsyncFor", "While", "With", "AsyncWith", "Try", "TryStar", "Match")
+    if hasattr(ast, name)
+)
+BRANCH_TYPES = tuple(
+    getattr(ast, name) for name in ("If", "For", "AsyncFor", "While", "IfExp", "ExceptHandler", "Assert", "match_case")
+    if hasattr(ast, name)
+)
+# Nodes without children worth visiting, and fields that never hold statements
+# or expressions; skipping them roughly halves the walk over a large file
+LEAF_TYPES = {ast.Name, ast.Constant, ast.Pass, ast.Break, ast.Continue, ast.alias}
+SKIP_FIELDS = {"ctx", "op", "ops", "type_comment", "kind", "names", "level", "module", "conversion",
+               "is_async", "id", "attr", "arg", "name", "returns", "annotation"}
+CHILD_FIELDS = {}
+
+MUTABLE_LITERALS = (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)
+MUTABLE_CALLS = {"list", "dict", "set", "defaultdict", "OrderedDict"}
+
+# kind -> (score it lowers, weight, suggestion); weights feed the bug-risk score
+PATTERNS = {
+    "syntax_error": ("bug_risk", 4.0, "Fix the syntax error at line {lines}; the file cannot be parsed"),
+    "bare_except": ("bug_risk", 1.0, "Catch specific exceptions instead of a bare `except:` (line {lines})"),
+    "swallowed_exception": ("bug_risk", 0.7, "Handle or log exceptions instead of silently passing (line {lines})"),
+    "mutable_default": ("bug_risk", 1.0, "Use None instead of a mutable default argument, which is shared between calls (line {lines})"),
+    "none_comparison": ("bug_risk", 0.3, "Compare with `is None` / `is not None` instead of `==` / `!=` (line {lines})"),
+    "literal_identity": ("bug_risk", 1.0, "Use `==` instead of `is` to compare with a literal (line {lines})"),
+    "eval_call": ("bug_risk", 1.5, "Avoid `eval`/`exec` on data that may be untrusted (line {lines})"),
+    "assert_tuple": ("bug_risk", 1.5, "This assert tests a non-empty tuple and always passes; remove the parentheses (line {lines})"),
+    "star_import": ("readability", 0.5, "Replace `from ... import *` with explicit imports (line {lines})"),
+    "global_statement": ("modularity", 0.5, "Pass state explicitly instead of using `global` (line {lines})"),
+}
+
+class Finding(NamedTuple):
+    kind: str
+    line: int
+
+class FunctionMetrics:
+    __slots__ = ("name", "line", "length", "complexity", "max_depth", "has_docstring")
+
+    def __init__(self, name: str, line: int, length: int, has_docstring: bool):
+        self.name = name
+        self.line = line
+        self.length = length
+        self.complexity = 1
+        self.max_depth = 0
+        self.has_docstring = has_docstring
+
+def analyze_source(filename: str, content: str) -> Dict:
+    """
+    Collect metrics and bug-pattern findings for a file in a single pass over
+    its lines and, for Python, a single walk of its syntax tree.
+    """
+    lines = content.split("\n")
+    metrics = _line_metrics(lines)
+    metrics.update(functions=[], classes=0, documented=0, definitions=0, naming=[], findings=[])
+
+    if filename.endswith(".py"):
+        try:
+            _walk_python(ast.parse(content), lines, metrics)
+        except (SyntaxError, ValueError) as e:
+            metrics["findings"].append(Finding("syntax_error", getattr(e, "lineno", None) or 1))
+    else:
+        metrics["max_depth"] = _brace_depth(lines)
+        metrics["branches"] = sum(len(BRANCH_KEYWORDS.findall(line)) for line in lines)
+    return metrics
+
+def static_review(filename: str, content: str, note: Optional[str] = None) -> Dict:
+    """Review a file locally, returning the same shape as an LLM review"""
+    metrics = analyze_source(filename, content)
+    return {
+        "report": _report(filename, metrics, note),
+        "scores": _scores(metrics),
+        "suggestions": _suggestions(metrics)
+    }
+
+def _line_metrics(lines: List[str]) -> Dict:
+    significant = []
+    comments = 0
+    long_lines = []
+    for number, line in enumerate(lines, 1):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if len(line) > MAX_LINE_LENGTH:
+            long_lines.append(number)
+        if stripped.startswith(COMMENT_PREFIXES):
+            comments += 1
+        else:
+            significant.append((number, stripped))
+    return {
+        "lines": len(lines),
+        "sloc": len(significant),
+        "comments": comments,
+        "long_lines": long_lines,
+        "duplicates": _duplicate_blocks(significant),
+        "max_depth": 0,
+        "branches": 0,
+    }
+
+def _duplicate_blocks(significant: List[tuple]) -> List[tuple]:
+    """(first start, first end, repeat start, repeat end) lines of each repeated run of code"""
+    seen = {}
+    blocks = []
+    previous = None  # (window index, index of its first occurrence)
+    texts = [text for _, text in significant]
+    offsets = [0]
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+    for i in range(len(texts) - DUPLICATE_WINDOW + 1):
+        # Runs of braces, `else:` and `return` repeat everywhere; skip trivial windows
+        if offsets[i + DUPLICATE_WINDOW] - offsets[i] < 80:
+            continue
+        window = tuple(texts[i:i + DUPLICATE_WINDOW])
+        first = seen.setdefault(window, i)
+        if i - first < DUPLICATE_WINDOW:
+            continue
+        first_end = significant[first + DUPLICATE_WINDOW - 1][0]
+        repeat_end = significant[i + DUPLICATE_WINDOW - 1][0]
+        if previous == (i - 1, first - 1):
+            # The run continues; grow the current block
+            blocks[-1] = (blocks[-1][0], first_end, blocks[-1][2], repeat_end)
+        else:
+            blocks.append((significant[first][0], first_end, significant[i][0], repeat_end))
+        previous = (i, first)
+    return blocks
+
+def _brace_depth(lines: List[str]) -> int:
+    """Maximum brace nesting, or indentation levels for brace-less languages"""
+    depth = max_depth = 0
+    for line in lines:
+        for char in line:
+            if char == "{":
+                depth += 1
+                if depth > max_depth:
+                    max_depth = depth
+            elif char == "}":
+                depth -= 1
+    if max_depth:
+        return max(0, max_depth - 1)  # The outermost braces are the function or class body
+    indents = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+    return max(indents, default=0) // 4
+
+def _walk_python(tree: ast.Module, lines: List[str], metrics: Dict):
+    functions = metrics["functions"]
+    findings = metrics["findings"]
+    naming = metrics["naming"]
+    module = FunctionMetrics("<module>", 1, len(lines), False)
+
+    # (node, enclosing function, nesting depth); an explicit stack avoids
+    # recursion limits and is cheaper than a NodeVisitor on large files
+    stack = [(tree, module, 0)]
+    push = stack.append
+    while stack:
+        node, function, depth = stack.pop()
+        node_type = type(node)
+
+        if node_type in FUNCTION_TYPES or node_type is ast.ClassDef:
+            metrics["definitions"] += 1
+            if ast.get_docstring(node, clean=False) is not None:
+                metrics["documented"] += 1
+            if node_type is ast.ClassDef:
+                metrics["classes"] += 1
+                if not CAP_WORDS.match(node.name):
+                    naming.append((node.name, node.lineno, "CapWords"))
+            else:
+                if not SNAKE_CASE.match(node.name):
+                    naming.append((node.name, node.lineno, "snake_case"))
+                _check_defaults(node.args, findings)
+                function = FunctionMetrics(node.name, node.lineno, node.end_lineno - node.lineno + 1,
+                                           ast.get_docstring(node, clean=False) is not None)
+                functions.append(function)
+                depth = 0
+        elif node_type in BRANCH_TYPES:
+            function.complexity += 1
+            if node_type is ast.ExceptHandler:
+                if node.type is None:
+                    findings.append(Finding("bare_except", node.lineno))
+                if len(node.body) == 1 and type(node.body[0]) is ast.Pass:
+                    findings.append(Finding("swallowed_exception", node.lineno))
+            elif node_type is ast.Assert and type(node.test) is ast.Tuple and node.test.elts:
+                findings.append(Finding("assert_tuple", node.lineno))
+        elif node_type is ast.BoolOp:
+            function.complexity += len(node.values) - 1
+        elif node_type is ast.comprehension:
+            function.complexity += 1 + len(node.ifs)
+        elif node_type is ast.Compare:
+            _check_compare(node, findings)
+        elif node_type is ast.Call:
+            if type(node.func) is ast.Name and node.func.id in ("eval", "exec"):
+                findings.append(Finding("eval_call", node.lineno))
+        elif node_type is ast.ImportFrom:
+            if any(alias.name == "*" for alias in node.names):
+                findings.append(Finding("star_import", node.lineno))
+        elif node_type is ast.Global:
+            findings.append(Finding("global_statement", node.lineno))
+
+        if node_type in NESTING_TYPES:
+            depth += 1
+            if depth > function.max_depth:
+                function.max_depth = depth
+            if node_type is ast.If and len(node.orelse) == 1 and type(node.orelse[0]) is ast.If:
+                # An elif chain is one level of nesting, not one per branch
+                push((node.orelse[0], function, depth - 1))
+                push((node.test, function, depth))
+                stack.extend((child, function, depth) for child in node.body)
+                continue
+
+        fields = CHILD_FIELDS.get(node_type)
+        if fields is None:
+            fields = CHILD_FIELDS[node_type] = tuple(f for f in node_type._fields if f not in SKIP_FIELDS)
+        for field in fields:
+            value = getattr(node, field, None)
+            if type(value) is list:
+                for child in value:
+                    if child is not None and type(child) not in LEAF_TYPES:
+                        push((child, function, depth))
+            elif value is not None and type(value) not in LEAF_TYPES:
+                push((value, function, depth))
+
+    # The stack visits nodes out of source order
+    functions.sort(key=lambda f: f.line)
+    naming.sort(key=lambda item: item[1])
+    findings.sort(key=lambda finding: finding.line)
+    metrics["max_depth"] = max([f.max_depth for f in functions] + [module.max_depth])
+    metrics["branches"] = module.complexity - 1 + sum(f.complexity - 1 for f in functions)
+
+def _check_defaults(args: ast.arguments, findings: List[Finding]):
+    for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+        if isinstance(default, MUTABLE_LITERALS) or (
+            type(default) is ast.Call and type(default.func) is ast.Name and default.func.id in MUTABLE_CALLS
+        ):
+            findings.append(Finding("mutable_default", default.lineno))
+
+def _check_compare(node: ast.Compare, findings: List[Finding]):
+    for op, right in zip(node.ops, node.comparators):
+        if type(right) is not ast.Constant:
+            continue
+        if type(op) in (ast.Eq, ast.NotEq) and right.value is None:
+            findings.append(Finding("none_comparison", node.lineno))
+        elif type(op) in (ast.Is, ast.IsNot) and isinstance(right.value, (str, bytes, int, float)) \
+                and not isinstance(right.value, bool):
+            findings.append(Finding("literal_identity", node.lineno))
+
+def _clamp(score: float) -> float:
+    return round(min(10.0, max(1.0, score)), 1)
+
+def _scores(metrics: Dict) -> Dict:
+    sloc = max(metrics["sloc"], 1)
+    functions = metrics["functions"]
+    duplicated = sum(end - start + 1 for _, _, start, end in metrics["duplicates"])
+    pattern_weight = {"readability": 0.0, "modularity": 0.0, "bug_risk": 0.0}
+    for finding in metrics["findings"]:
+        category, weight, _ = PATTERNS[finding.kind]
+        pattern_weight[category] += weight
+
+    readability = 10.0
+    readability -= min(2.5, 25 * len(metrics["long_lines"]) / sloc)
+    if metrics["definitions"]:
+        readability -= 2.0 * (1 - metrics["documented"] / metrics["definitions"])
+        readability -= min(1.5, 3 * len(metrics["naming"]) / metrics["definitions"])
+    readability -= min(2.0, 0.5 * max(0, metrics["max_depth"] - MAX_NESTING))
+    if sloc > 50 and metrics["comments"] + metrics["documented"] == 0:
+        readability -= 0.5
+    readability -= min(1.0, pattern_weight["readability"])
+
+    modularity = 10.0
+    if functions:
+        long_share = sum(1 for f in functions if f.length > MAX_FUNCTION_LINES) / len(functions)
+        complex_share = sum(1 for f in functions if f.complexity > MAX_COMPLEXITY) / len(functions)
+        modularity -= min(3.0, 6 * long_share + max(f.length for f in functions) / (MAX_FUNCTION_LINES * 4))
+        modularity -= min(2.5, 5 * complex_share)
+    elif sloc > 200:
+        # A long file with no functions is one big script
+        modularity -= 2.0
+    else:
+        modularity -= min(2.5, metrics["branches"] / 20)
+    modularity -= min(2.5, 10 * duplicated / sloc)
+    modularity -= min(1.0, pattern_weight["modularity"])
+
+    bug_risk = 10.0 - min(7.0, 1.5 * math.sqrt(pattern_weight["bug_risk"]))
+    bug_risk -= min(2.0, 0.5 * sum(1 for f in functions if f.complexity > 2 * MAX_COMPLEXITY))
+
+    scores = {
+        "readability_score": _clamp(readability),
+        "modularity_score": _clamp(modularity),
+        "bug_risk_score": _clamp(bug_risk),
+    }
+    scores["overall_score"] = round(sum(scores.values()) / 3, 1)
+    return scores
+
+def _line_list(numbers: List[int], limit: int = 5) -> str:
+    shown = ", ".join(str(number) for number in numbers[:limit])
+    if len(numbers) > limit:
+        shown += f" and {len(numbers) - limit} more"
+    return shown
+
+# Category of the suggestions for each score a pattern lowers
+CATEGORY_BY_SCORE = {"bug_risk": "bug", "readability": "readability", "modularity": "modularity"}
+CATEGORY_BY_KIND = {"eval_call": "security"}
+
+def _severity(weight: float) -> str:
+    if weight <= 0:
+        return "info"
+    if weight >= 3:
+        return "critical"
+    if weight >= 1.5:
+        return "high"
+    if weight >= 0.7:
+        return "medium"
+    return "low"
+
+def _suggestion(weight: float, text: str, category: str, line_start: Optional[int] = None,
+                line_end: Optional[int] = None) -> tuple:
+    return weight, {"text": text, "severity": _severity(weight), "category": category,
+                    "line_start": line_start, "line_end": line_end if line_end is not None else line_start}
+
+def _suggestions(metrics: Dict) -> List[Dict]:
+    # (weight, suggestion); the heaviest issues come first
+    ranked = []
+
+    by_kind = {}
+    for finding in metrics["findings"]:
+        by_kind.setdefault(finding.kind, []).append(finding.line)
+    for kind, numbers in by_kind.items():
+        score, weight, template = PATTERNS[kind]
+        numbers = sorted(set(numbers))
+        text = template.format(lines=_line_list(numbers))
+        if len(numbers) > 1:
+            text = text.replace("(line ", "(lines ").replace("at line ", "at lines ")
+        category = CATEGORY_BY_KIND.get(kind, CATEGORY_BY_SCORE[score])
+        ranked.append(_suggestion(weight * (1 + math.log(len(numbers))), text, category, numbers[0], numbers[-1]))
+
+    functions = metrics["functions"]
+    for f in sorted(functions, key=lambda f: -f.complexity)[:3]:
+        if f.complexity > MAX_COMPLEXITY:
+            text = (f"Reduce the cyclomatic complexity of `{f.name}` (line {f.line}, complexity {f.complexity}) "
+                    f"by extracting branches into helper functions")
+            ranked.append(_suggestion(f.complexity / MAX_COMPLEXITY, text, "modularity", f.line))
+    for f in sorted(functions, key=lambda f: -f.length)[:3]:
+        if f.length > MAX_FUNCTION_LINES:
+            text = f"Split `{f.name}` (line {f.line}, {f.length} lines) into smaller functions"
+            ranked.append(_suggestion(f.length / MAX_FUNCTION_LINES, text, "modularity", f.line, f.line + f.length - 1))
+    for f in sorted(functions, key=lambda f: -f.max_depth)[:2]:
+        if f.max_depth > MAX_NESTING:
+            text = (f"Flatten the nesting in `{f.name}` (line {f.line}, depth {f.max_depth}) "
+                    f"with early returns or guard clauses")
+            ranked.append(_suggestion(f.max_depth / MAX_NESTING, text, "readability", f.line))
+    if not functions and metrics["max_depth"] > MAX_NESTING:
+        text = f"Reduce the nesting depth ({metrics['max_depth']} levels) with early returns or helper functions"
+        ranked.append(_suggestion(metrics["max_depth"] / MAX_NESTING, text, "readability"))
+
+    for first, first_end, start, end in sorted(metrics["duplicates"], key=lambda block: block[2] - block[3])[:2]:
+        text = f"Extract the code duplicated at lines {first}-{first_end} and {start}-{end} into a shared function"
+        ranked.append(_suggestion(1 + (end - start) / 20, text, "modularity", start, end))
+
+    undocumented = metrics["definitions"] - metrics["documented"]
+    if undocumented:
+        missing = [f for f in functions if not f.has_docstring]
+        example = f", e.g. `{missing[0].name}` (line {missing[0].line})" if missing else ""
+        text = f"Add docstrings to {undocumented} of {metrics['definitions']} functions and classes{example}"
+        ranked.append(_suggestion(0.8 * undocumented / metrics["definitions"], text, "documentation"))
+    for name, line, style in metrics["naming"][:2]:
+        ranked.append(_suggestion(0.4, f"Rename `{name}` (line {line}) to follow {style} naming", "style", line))
+    long_lines = metrics["long_lines"]
+    if long_lines:
+        text = (f"Wrap {len(long_lines)} line(s) longer than {MAX_LINE_LENGTH} characters "
+                f"(line {_line_list(long_lines, 3)})")
+        ranked.append(_suggestion(0.3 + min(1.0, len(long_lines) / 20), text, "style", long_lines[0], long_lines[-1]))
+
+    ranked.sort(key=lambda item: -item[0])
+    suggestions = [suggestion for _, suggestion in ranked[:MAX_SUGGESTIONS]]
+    return suggestions or [_suggestion(0, "No significant issues found by static analysis", "general")[1]]
+
+def _report(filename: str, metrics: Dict, note: Optional[str]) -> str:
+    functions = metrics["functions"]
+    parts = [f"Static analysis of {filename}"]
+    if note:
+        parts.append(note)
+
+    summary = [
+        f"- Size: {metrics['lines']} lines ({metrics['sloc']} code, {metrics['comments']} comment), "
+        f"{len(functions)} functions, {metrics['classes']} classes"
+    ]
+    if functions:
+        most_complex = max(functions, key=lambda f: f.complexity)
+        longest = max(functions, key=lambda f: f.length)
+        average = sum(f.complexity for f in functions) / len(functions)
+        summary.append(f"- Cyclomatic complexity: average {average:.1f}, highest {most_complex.complexity} in `{most_complex.name}`")
+        summary.append(f"- Longest function: `{longest.name}` ({longest.length} lines)")
+    else:
+        summary.append(f"- Branch points: {metrics['branches']}")
+    summary.append(f"- Maximum nesting depth: {metrics['max_depth']}")
+    if metrics["definitions"]:
+        summary.append(f"- Docstring coverage: {100 * metrics['documented'] // metrics['definitions']}%")
+    duplicated = sum(end - start + 1 for _, _, start, end in metrics["duplicates"])
+    summary.append(f"- Duplicated lines: {duplicated} in {len(metrics['duplicates'])} block(s)")
+    summary.append(f"- Lines over {MAX_LINE_LENGTH} characters: {len(metrics['long_lines'])}")
+    parts.append("\n".join(summary))
+
+    if metrics["findings"]:
+        counts = {}
+        for finding in metrics["findings"]:
+            counts[finding.kind] = counts.get(finding.kind, 0) + 1
+        parts.append("Potential issues:\n" + "\n".join(
+            f"- {kind.replace('_', ' ')}: {count}" for kind, count in sorted(counts.items(), key=lambda item: -item[1])
+        ))
+    else:
+        parts.append("No known bug patterns were detected.")
+    return "\n\n".join(parts)
@@ -0,0 +1,75 @@
+import json
+import re
+from typing import Dict
+
+REPORT_KEY = re.compile(r'"report"\s*:\s*"')
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class ReportStreamExtractor:
+    """
+    Incrementally decode the ``"report"`` string of a JSON review while the
+    model is still writing it, so report text can be shown as it arrives.
+
+    Each character is examined once. Only output that is not yet decoded is
+    kept between deltas: before the key, a tail that could still be the
+    start of it; inside the string, an escape sequence split across two
+    deltas, held back until it is complete.
+    """
+
+    def __init__(self):
+        self._buffer = ""    # undecoded output carried over from earlier deltas
+        self._started = False
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        """Add model output and return any newly decoded report text"""
+        if self.done:
+            return ""
+        buffer = self._buffer + delta
+
+        i = 0
+        if not self._started:
+            match = REPORT_KEY.search(buffer)
+            if match is None:
+                # Keep a "report" key still waiting for its colon and quote, or a partial key
+                key = buffer.rfind('"report"')
+                if key < 0 or buffer[key + 8:].strip(" \t\r\n:"):
+                    key = max(0, len(buffer) - 7)
+                self._buffer = buffer[key:]
+                return ""
+            self._started = True
+            i = match.end()
+
+        out = []
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != '\\':
+                out.append(char)
+                i += 1
+                continue
+            # Escape sequence; wait for the rest of it if it is incomplete
+            if i + 1 >= len(buffer):
+                break
+            code = buffer[i + 1]
+            if code == 'u':
+                if i + 6 > len(buffer):
+                    break
+                try:
+                    out.append(chr(int(buffer[i + 2:i + 6], 16)))
+                except ValueError:
+                    out.append(buffer[i:i + 6])
+                i += 6
+            else:
+                out.append(ESCAPES.get(code, code))
+                i += 2
+        self._buffer = "" if self.done else buffer[i:]
+        return "".join(out)
+
+def format_sse(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
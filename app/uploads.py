@@ -0,0 +1,220 @@
+import codecs
+import os
+import re
+import time
+from typing import BinaryIO, List, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from .metrics import record_stage
+
+# Largest single file accepted for review, in bytes
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# Largest request body accepted, in bytes (a batch of files or an archive)
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Encodings tried, in order, for uploads that are not valid UTF-8 and carry no BOM
+UPLOAD_FALLBACK_ENCODINGS = [
+    e.strip() for e in os.getenv("UPLOAD_FALLBACK_ENCODINGS", "cp1252,latin-1").split(",") if e.strip()
+]
+
+# Set to "false" to review generated and minified files instead of skipping them
+SKIP_GENERATED_FILES = os.getenv("SKIP_GENERATED_FILES", "true").lower() == "true"
+
+# Uploads are read and decoded in chunks of this many bytes
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Bytes inspected to tell binary files from text
+SNIFF_BYTES = 8192
+
+# Byte order marks, longest first so UTF-32 LE is not mistaken for UTF-16 LE
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Bytes found in text files; a sample with many others is binary
+TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+
+GENERATED_NAMES = re.compile(
+    r"(\.min\.(js|css)|_pb2(_grpc)?\.py|\.pb\.go|\.pb\.(cc|h)|\.g\.dart|\.designer\.cs|\.generated\.\w+)$",
+    re.IGNORECASE
+)
+GENERATED_HEADER = re.compile(
+    r"@generated|do not edit|code generated by|generated by the protocol buffer compiler|"
+    r"this file (is|was) (automatically|auto-?) ?generated|autogenerated file",
+    re.IGNORECASE
+)
+
+# Lines of the file header searched for generated-code markers
+GENERATED_HEADER_LINES = 10
+
+# Minified code: long files with lines this long on average
+MINIFIED_LINE_LENGTH = 500
+
+class UploadError(ValueError):
+    """An upload that cannot be reviewed; ``status_code`` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def detect_bom(head: bytes) -> Optional[str]:
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None
+
+def looks_binary(head: bytes) -> bool:
+    """Whether the first bytes of a file look like binary data rather than text"""
+    if not head or detect_bom(head) in ("utf-16", "utf-32"):
+        return False
+    if b"\0" in head:
+        return True
+    return len(head.translate(None, TEXT_BYTES)) / len(head) > 0.3
+
+def generated_reason(filename: str, text: str) -> Optional[str]:
+    """Why a file looks generated or minified, or None for hand-written code"""
+    if GENERATED_NAMES.search(filename):
+        return "generated file name"
+    header = "\n".join(text[:4096].split("\n", GENERATED_HEADER_LINES)[:GENERATED_HEADER_LINES])
+    if GENERATED_HEADER.search(header):
+        return "generated code marker"
+    if len(text) > 4 * MINIFIED_LINE_LENGTH and len(text) / (text.count("\n") + 1) > MINIFIED_LINE_LENGTH:
+        return "minified code"
+    return None
+
+def check_source(filename: str, text: str) -> str:
+    """Raise UploadError for generated files when they are skipped; return ``text``"""
+    if SKIP_GENERATED_FILES:
+        reason = generated_reason(filename, text)
+        if reason:
+            raise UploadError(f"Skipped {filename}: {reason}")
+    return text
+
+def decode_source(filename: str, data: bytes) -> str:
+    """
+    Decode file contents: a BOM names the encoding, otherwise UTF-8 with
+    fallback to UPLOAD_FALLBACK_ENCODINGS. Raises UploadError for binary
+    and (optionally) generated files.
+    """
+    if looks_binary(data[:SNIFF_BYTES]):
+        raise UploadError(f"Skipped {filename}: binary file")
+    for encoding in _encodings(data[:4]):
+        try:
+            return check_source(filename, data.decode(encoding))
+        except (UnicodeDecodeError, LookupError):
+            continue
+    raise UploadError(f"Could not decode {filename} as text")
+
+async def read_upload_text(upload: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> str:
+    """
+    Read and decode an upload chunk by chunk, so the raw bytes are never
+    held in memory alongside the text. The upload is already spooled to a
+    temporary file; it is rewound and decoded again if an encoding fails
+    part way. Raises UploadError (413) for files over ``max_bytes``.
+    """
+    filename = upload.filename or "upload"
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadError(f"{filename} is larger than {max_bytes} bytes", status_code=413)
+
+    read_seconds = decode_seconds = 0.0
+    start = time.perf_counter()
+    head = await upload.read(UPLOAD_CHUNK_SIZE)
+    read_seconds += time.perf_counter() - start
+    try:
+        if looks_binary(head[:SNIFF_BYTES]):
+            raise UploadError(f"Skipped {filename}: binary file")
+
+        for encoding in _encodings(head[:4]):
+            decoder = codecs.getincrementaldecoder(encoding)()
+            parts: List[str] = []
+            size = 0
+            chunk = head
+            try:
+                while chunk:
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadError(f"{filename} is larger than {max_bytes} bytes", status_code=413)
+                    start = time.perf_counter()
+                    parts.append(decoder.decode(chunk))
+                    decode_seconds += time.perf_counter() - start
+                    start = time.perf_counter()
+                    chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                    read_seconds += time.perf_counter() - start
+                parts.append(decoder.decode(b"", final=True))
+            except (UnicodeDecodeError, LookupError):
+                await upload.seek(0)
+                chunk = head = await upload.read(UPLOAD_CHUNK_SIZE)
+                continue
+            return check_source(filename, "".join(parts))
+        raise UploadError(f"Could not decode {filename} as text")
+    finally:
+        record_stage("read", read_seconds)
+        record_stage("decode", decode_seconds)
+
+def open_upload(upload: UploadFile, max_bytes: int = REQUEST_MAX_BYTES) -> BinaryIO:
+    """The spooled file behind an upload, rewound, for readers that take a file (archives)"""
+    file = upload.file
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    if size > max_bytes:
+        raise UploadError(f"{upload.filename} is larger than {max_bytes} bytes", status_code=413)
+    return file
+
+def upload_http_error(error: UploadError) -> HTTPException:
+    return HTTPException(status_code=error.status_code, detail=str(error))
+
+def _encodings(head: bytes) -> List[str]:
+    bom = detect_bom(head)
+    return [bom] if bom else ["utf-8"] + UPLOAD_FALLBACK_ENCODINGS
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware refusing request bodies over ``max_bytes`` with 413:
+    up front when Content-Length says so, otherwise as soon as the body
+    read so far passes the limit, before the rest is received.
+    """
+
+    def __init__(self, app, max_bytes: int = REQUEST_MAX_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    too_large = int(value) > self.max_bytes
+                except ValueError:
+                    too_large = False
+                if too_large:
+                    response = JSONResponse(status_code=413, content={"detail": self._detail()})
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"Request body is larger than {self.max_bytes} bytes"
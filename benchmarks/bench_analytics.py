@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: score analytics from rollup tables vs. aggregating every review
+
+Fills a throwaway SQLite database with synthetic reviews spread over a
+year, builds the rollups, and times the /api/analytics queries (weekly
+trends, one file's history, a score distribution, the worst files)
+against the same answers computed with GROUP BY over code_reviews. Also
+reports what maintaining the rollups adds to each review insert.
+
+Usage:
+    python -m benchmarks.bench_analytics --reviews 1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--inserts", type=int, default=500, help="Reviews inserted one by one to time upkeep")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_analytics_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/reviews.db"
+    # Measure the rollups alone, not full-text indexing
+    os.environ["SEARCH_FTS_ENABLED"] = "false"
+
+    from sqlalchemy import func
+    from app import analytics
+    from app.database import SessionLocal, CodeReview, create_tables, create_review_record, engine, store_blob
+
+    create_tables()
+    print(f"Inserting {args.reviews} synthetic reviews into {workdir} ...")
+    start = time.perf_counter()
+    rng = random.Random(0)
+    base = datetime(2024, 1, 1)
+    seconds = args.days * 86400
+    batch = []
+    with engine.begin() as conn:
+        for i in range(args.reviews):
+            overall = round(rng.uniform(2, 10), 1)
+            batch.append({
+                "filename": f"src/module_{rng.randrange(args.files)}.py",
+                "file_content": "",
+                "review_report": "",
+                "suggestions": "",
+                "readability_score": overall,
+                "modularity_score": overall,
+                "bug_risk_score": round(rng.uniform(0, 10), 1),
+                "overall_score": overall,
+                "created_at": base + timedelta(seconds=i * seconds // args.reviews)
+            })
+            if len(batch) == 50_000:
+                conn.execute(CodeReview.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(CodeReview.__table__.insert(), batch)
+    print(f"  done in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    analytics.rebuild_rollups(engine)
+    print(f"  rollups rebuilt in {time.perf_counter() - start:.1f}s\n")
+
+    db = SessionLocal()
+    day = func.date(CodeReview.created_at)
+    filename = "src/module_17.py"
+    queries = [
+        ("weekly trends",
+         lambda: analytics.score_trends(db, "week"),
+         lambda: db.query(day, func.count(), func.avg(CodeReview.overall_score)).group_by(day).all()),
+        ("one file, weekly",
+         lambda: analytics.score_trends(db, "week", filename),
+         lambda: db.query(day, func.count(), func.avg(CodeReview.overall_score))
+         .filter(CodeReview.filename == filename).group_by(day).all()),
+        ("bug risk percentiles",
+         lambda: analytics.score_distribution(db, "bug_risk_score"),
+         lambda: db.query(CodeReview.bug_risk_score).order_by(CodeReview.bug_risk_score).all()),
+        ("worst 10 files",
+         lambda: analytics.worst_files(db, 10),
+         lambda: db.query(CodeReview.filename, func.avg(CodeReview.overall_score))
+         .group_by(CodeReview.filename).order_by(func.avg(CodeReview.overall_score)).limit(10).all()),
+    ]
+    print(f"{'query':<22} {'rollups ms':>12} {'aggregate ms':>14}")
+    for label, rollup, aggregate in queries:
+        print(f"{label:<22} {median_ms(rollup, args.repeat):>12.1f} {median_ms(aggregate, 1):>14.1f}")
+    db.close()
+
+    analysis = {"report": "", "suggestions": [], "scores": {
+        "readability_score": 7.0, "modularity_score": 7.0, "bug_risk_score": 3.0, "overall_score": 7.0
+    }}
+
+    def insert(with_rollups: bool) -> float:
+        times = []
+        for i in range(args.inserts):
+            db = SessionLocal()
+            start = time.perf_counter()
+            if with_rollups:
+                db.add(create_review_record(db, f"src/module_{i % args.files}.py", "", analysis))
+            else:
+                db.add(CodeReview(filename=f"src/module_{i % args.files}.py", review_report="", suggestions="",
+                                  content_hash=store_blob(db, ""), created_at=datetime.utcnow(),
+                                  **analysis["scores"]))
+            db.commit()
+            times.append(time.perf_counter() - start)
+            db.close()
+        return statistics.median(times) * 1000
+
+    plain, rolled = insert(False), insert(True)
+    print(f"\nInsert, median of {args.inserts}: {plain:.2f}ms plain, {rolled:.2f}ms with rollups")
+
+if __name__ == "__main__":
+    main()
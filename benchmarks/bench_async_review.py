@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: blocking vs. non-blocking LLM calls from the event loop
+
+Runs N concurrent reviews against the stub LLM server twice:
+  * blocking - the old path, sync ``analyze_code`` called inside the loop
+  * async    - ``analyze_code_async`` with the configured concurrency limit
+
+Usage:
+    python -m benchmarks.bench_async_review --requests 32 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_llm_server import StubLLMServer
+
+SAMPLE_CODE = "def add(a, b):\n    return a + b\n"
+
+async def run_blocking(reviewer, n: int) -> float:
+    async def one(i):
+        return reviewer.analyze_code(f"file_{i}.py", SAMPLE_CODE)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - start
+
+async def run_async(reviewer, n: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(reviewer.analyze_code_async(f"file_{i}.py", SAMPLE_CODE) for i in range(n)))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    with StubLLMServer(latency=args.latency) as server:
+        os.environ["OPENAI_API_KEY"] = "stub-key"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        # Every request must reach the LLM for a fair comparison
+        os.environ["REVIEW_CACHE_ENABLED"] = "false"
+
+        from app.llm_service import LLMCodeReviewer
+        reviewer = LLMCodeReviewer(max_concurrency=args.concurrency)
+
+        blocking = asyncio.run(run_blocking(reviewer, args.requests))
+        reviewer = LLMCodeReviewer(max_concurrency=args.concurrency)
+        non_blocking = asyncio.run(run_async(reviewer, args.requests))
+
+    print(f"{args.requests} reviews, {args.latency:g}s stub latency, concurrency limit {args.concurrency}")
+    print(f"  blocking: {blocking:7.2f}s  {args.requests / blocking:7.2f} reviews/s")
+    print(f"  async:    {non_blocking:7.2f}s  {args.requests / non_blocking:7.2f} reviews/s")
+    print(f"  speedup:  {blocking / non_blocking:7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: inline file contents vs. deduplicated blob storage
+
+Builds a database in the old layout, with every review storing its file
+inline, where each distinct file has been reviewed many times. It then
+measures file size and full-table scan time before and after running the
+blob migration.
+
+Usage:
+    python -m benchmarks.bench_blob_storage --reviews 20000 --distinct 400
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def make_file(index: int, lines: int) -> str:
+    return "\n".join(f"def function_{index}_{i}(value):\n    return value * {i}  # step {i}" for i in range(lines))
+
+def measure(engine, db_path: str):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        start = time.perf_counter()
+        # An unindexed predicate forces a full scan of code_reviews
+        conn.execute(text("SELECT COUNT(*) FROM code_reviews WHERE suggestions LIKE '%needle%'")).scalar()
+        scan = time.perf_counter() - start
+    return os.path.getsize(db_path), scan
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reviews", type=int, default=20000)
+    parser.add_argument("--distinct", type=int, default=400)
+    parser.add_argument("--lines", type=int, default=150, help="Functions per synthetic file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_blobs_")
+    db_path = f"{workdir}/reviews.db"
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+
+    from app.database import CodeReview, create_tables, engine
+    from app.migrations import migrate_file_contents, vacuum
+
+    create_tables()
+    files = [make_file(i, args.lines) for i in range(args.distinct)]
+    random.seed(0)
+    with engine.begin() as conn:
+        conn.execute(CodeReview.__table__.insert(), [{
+            "filename": f"module_{i % args.distinct}.py",
+            "file_content": files[i % args.distinct],
+            "review_report": "Synthetic review",
+            "readability_score": 7.0,
+            "modularity_score": 7.0,
+            "bug_risk_score": 7.0,
+            "overall_score": 7.0,
+            "suggestions": "Add docstrings",
+            "created_at": datetime.utcnow()
+        } for i in range(args.reviews)])
+
+    size_before, scan_before = measure(engine, db_path)
+
+    start = time.perf_counter()
+    migrated = migrate_file_contents()
+    vacuum()
+    elapsed = time.perf_counter() - start
+
+    size_after, scan_after = measure(engine, db_path)
+
+    print(f"{args.reviews} reviews of {args.distinct} distinct files ({args.reviews // args.distinct}x duplication)")
+    print(f"  migrated {migrated} rows in {elapsed:.1f}s")
+    print(f"  database size: {size_before / 1e6:8.1f} MB -> {size_after / 1e6:8.1f} MB")
+    print(f"  full scan:     {scan_before * 1000:8.1f} ms -> {scan_after * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
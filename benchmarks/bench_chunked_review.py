@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chunked map-reduce review of a large file
+
+Reviews a synthetic Python file of N functions against the stub LLM server
+and compares wall time with the number of chunks times the stub latency
+(the cost of reviewing the chunks one after another).
+
+Usage:
+    python -m benchmarks.bench_chunked_review --functions 60 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_llm_server import StubLLMServer
+
+def make_source(functions: int) -> str:
+    return "\n\n".join(
+        f"def handler_{i}(value):\n" + "    value += 1\n" * 25 + "    return value"
+        for i in range(functions)
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, default=60)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    source = make_source(args.functions)
+
+    with StubLLMServer(latency=args.latency) as server:
+        os.environ["OPENAI_API_KEY"] = "stub-key"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["REVIEW_CACHE_ENABLED"] = "false"
+
+        from app.llm_service import LLMCodeReviewer
+        reviewer = LLMCodeReviewer()
+
+        start = time.perf_counter()
+        asyncio.run(reviewer.analyze_code_async("large_module.py", source))
+        elapsed = time.perf_counter() - start
+        chunks = server.calls
+
+    print(f"{len(source.splitlines())} lines reviewed in {chunks} chunks, {args.latency:g}s stub latency")
+    print(f"  wall time:        {elapsed:6.2f}s")
+    print(f"  sequential bound: {chunks * args.latency:6.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: incremental re-review of a small edit vs. a full re-review
+
+Reviews a file, edits a few lines and reviews it again, once from scratch
+and once incrementally against the first review, and compares the prompt
+size sent to the stub LLM server for files of increasing length.
+
+Usage:
+    python -m benchmarks.bench_incremental_review --sizes 200 1000 5000 --edits 2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_llm_server import StubLLMServer
+
+def make_source(lines: int) -> str:
+    return "\n".join(f"def step_{i}(value):\n    return value + {i}\n" for i in range(lines // 3 + 1))
+
+def edit(source: str, edits: int) -> str:
+    lines = source.split("\n")
+    for n in range(edits):
+        index = (n + 1) * len(lines) // (edits + 1)
+        lines[index] = lines[index] + "  # edited"
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--edits", type=int, default=2, help="Lines changed between versions")
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with StubLLMServer(latency=args.latency) as server:
+        os.environ["OPENAI_API_KEY"] = "stub-key"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["REVIEW_CACHE_ENABLED"] = "false"
+        # Compare single-prompt reviews; chunking would split the full review
+        os.environ["CHUNK_THRESHOLD_LINES"] = str(max(args.sizes) * 2)
+
+        from app.llm_service import LLMCodeReviewer
+        reviewer = LLMCodeReviewer()
+
+        print(f"{args.edits} edited line(s), {args.latency:g}s stub latency")
+        asyncio.run(compare(reviewer, server, args.sizes, args.edits))
+
+async def compare(reviewer, server, sizes, edits):
+    for size in sizes:
+        original = make_source(size)
+        edited = edit(original, edits)
+        base = {"id": 1, "content": original, "analysis": await reviewer.analyze_code_async("module.py", original)}
+
+        calls = len(server.prompt_chars)
+        start = time.perf_counter()
+        await reviewer.analyze_code_async("module.py", edited)
+        full_time = time.perf_counter() - start
+        full_chars = sum(server.prompt_chars[calls:])
+
+        calls = len(server.prompt_chars)
+        start = time.perf_counter()
+        result = await reviewer.analyze_incremental_async("module.py", edited, base)
+        incremental_time = time.perf_counter() - start
+        incremental_chars = sum(server.prompt_chars[calls:])
+
+        print(f"  {size:6d} lines: full {full_chars:8d} prompt chars {full_time:5.2f}s | "
+              f"incremental {incremental_chars:6d} prompt chars {incremental_time:5.2f}s "
+              f"({result['incremental']['changed_lines']} changed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark: reviews when the preferred model is not available
+
+The stub LLM server reports the first configured model as not found.
+Without routing memory every review probes it again before falling back;
+the model router remembers it and goes straight to the next model.
+
+Usage:
+    python -m benchmarks.bench_model_routing --reviews 20 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_llm_server import StubLLMServer
+
+MODELS = ["gpt-missing", "gpt-stub"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reviews", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with StubLLMServer(latency=args.latency) as server:
+        os.environ["OPENAI_API_KEY"] = "stub-key"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["REVIEW_CACHE_ENABLED"] = "false"
+        server.remove_models(MODELS[0])
+
+        from app.llm_service import LLMCodeReviewer
+        from app.model_router import ModelRouter
+
+        print(f"{args.reviews} sequential reviews, first model missing, {args.latency:g}s stub latency")
+        for label, ttl in (("probe every time", 0.0), ("model router", 3600.0)):
+            reviewer = LLMCodeReviewer(router=ModelRouter(models=MODELS, small_model="", unavailable_ttl=ttl))
+            calls = server.calls
+            elapsed = asyncio.run(run(reviewer, args.reviews))
+            print(f"  {label:17s} {elapsed:6.2f}s  {server.calls - calls:4d} upstream calls")
+
+async def run(reviewer, reviews):
+    start = time.perf_counter()
+    for i in range(reviews):
+        await reviewer.analyze_code_async(f"file_{i}.py", f"value = {i}\n")
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: OFFSET vs. keyset pagination over a large review table
+
+Fills a throwaway SQLite database with synthetic reviews and times fetching
+one page at increasing depths, using OFFSET and using the (created_at, id)
+keyset cursor the /api/reviews endpoint returns.
+
+Usage:
+    python -m benchmarks.bench_pagination --rows 1000000 --page-size 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_pagination_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/reviews.db"
+
+    from app.database import SessionLocal, CodeReview, create_tables, engine
+    from app.pagination import apply_keyset, apply_review_filters, encode_cursor
+    from app.main import SUMMARY_COLUMNS
+
+    create_tables()
+    print(f"Inserting {args.rows} synthetic reviews into {workdir} ...")
+    start = time.perf_counter()
+    random.seed(0)
+    base = datetime(2024, 1, 1)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(args.rows):
+            score = round(random.uniform(2, 10), 1)
+            batch.append({
+                "filename": f"src/module_{i % 5000}.py",
+                "file_content": "",
+                "review_report": "",
+                "readability_score": score,
+                "modularity_score": score,
+                "bug_risk_score": score,
+                "overall_score": score,
+                "suggestions": "",
+                "created_at": base + timedelta(seconds=i * 30)
+            })
+            if len(batch) == 50_000:
+                conn.execute(CodeReview.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(CodeReview.__table__.insert(), batch)
+    print(f"  done in {time.perf_counter() - start:.1f}s\n")
+
+    db = SessionLocal()
+    print(f"{'depth':>10} {'offset ms':>12} {'keyset ms':>12}")
+    depths = [0, 1_000, 10_000, 100_000, args.rows // 2, args.rows - args.page_size]
+    for depth in [d for d in depths if d < args.rows]:
+        # The cursor a client would hold after paging to this depth
+        anchor = apply_keyset(db.query(CodeReview.created_at, CodeReview.id)).offset(max(depth - 1, 0)).first()
+        cursor = encode_cursor(anchor.created_at, anchor.id) if depth else None
+
+        offset_times, keyset_times = [], []
+        for _ in range(args.repeat):
+            t = time.perf_counter()
+            apply_keyset(db.query(*SUMMARY_COLUMNS)).offset(depth).limit(args.page_size).all()
+            offset_times.append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            apply_keyset(db.query(*SUMMARY_COLUMNS), cursor).limit(args.page_size).all()
+            keyset_times.append(time.perf_counter() - t)
+
+        print(f"{depth:>10} {min(offset_times) * 1000:>12.2f} {min(keyset_times) * 1000:>12.2f}")
+
+    t = time.perf_counter()
+    query = apply_review_filters(db.query(*SUMMARY_COLUMNS), filename_prefix="src/module_42", min_score=8)
+    apply_keyset(query).limit(args.page_size).all()
+    print(f"\nfiltered page (filename prefix + min score): {(time.perf_counter() - t) * 1000:.2f} ms")
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prompt tokens per review with and without compaction
+
+Builds review prompts for generated source files with a license header,
+trailing whitespace, long blank runs, a generated section and a large
+lookup table, and reports estimated prompt tokens before and after
+compaction and the time compaction takes. No LLM calls are made.
+
+Usage:
+    python -m benchmarks.bench_prompt_compaction --functions 10 40 160 --table-rows 200
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+LICENSE = """# Copyright (c) 2024 Example Corp. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+
+def make_source(functions: int, table_rows: int) -> str:
+    parts = [LICENSE, "import math   \n\n\n\n"]
+    parts.append("LOOKUP = [\n" + "".join(
+        f"    ({i}, {i * i}, {i * 0.5}, \"entry-{i}\"),\n" for i in range(table_rows)
+    ) + "]\n\n\n")
+    parts.append("# BEGIN GENERATED\n" + "".join(
+        f"def accessor_{i}(row):\n    return row[{i % 4}]\n\n" for i in range(20)
+    ) + "# END GENERATED\n\n\n\n")
+    for i in range(functions):
+        parts.append(
+            f"def compute_{i}(values):   \n"
+            f"    total = 0    \n"
+            f"    for value in values:\n"
+            f"        if value > {i}:\n"
+            f"            total += math.sqrt(value)\n"
+            f"    return total\n\n\n\n"
+        )
+    return "".join(parts)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", type=int, nargs="+", default=[10, 40, 160])
+    parser.add_argument("--table-rows", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+    os.environ["REVIEW_CACHE_ENABLED"] = "false"
+    from app.compaction import compact_source
+    from app.llm_service import LLMCodeReviewer
+    reviewer = LLMCodeReviewer()
+
+    print(f"{args.table_rows}-row lookup table, license header and a generated section in every file")
+    for functions in args.functions:
+        source = make_source(functions, args.table_rows)
+        before = dict(reviewer.prompt_stats)
+        start = time.perf_counter()
+        compact_source("module.py", source)
+        elapsed = time.perf_counter() - start
+        reviewer._build_prompt("module.py", source)
+        tokens_before = reviewer.prompt_stats["tokens_before"] - before["tokens_before"]
+        tokens_after = reviewer.prompt_stats["tokens_after"] - before["tokens_after"]
+        print(f"  {source.count(chr(10)):5d} lines: {tokens_before:6d} -> {tokens_after:6d} tokens "
+              f"({1 - tokens_after / tokens_before:5.1%} saved), compaction {elapsed * 1000:6.2f}ms")
+
+if __name__ == "__main__":
+    main()
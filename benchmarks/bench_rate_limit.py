@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: a burst of reviews under a requests-per-minute limit
+
+Fires a burst of concurrent reviews at the stub LLM server, which answers
+the first few calls with 429 and a Retry-After, and reports how many real
+reviews came back, how long the burst took and how the rate limiter spent
+its time waiting and retrying.
+
+Usage:
+    python -m benchmarks.bench_rate_limit --requests 40 --rpm 600 --tpm 2000000 --rate-limited 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_llm_server import StubLLMServer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--rpm", type=float, default=600, help="Client-side requests-per-minute budget")
+    parser.add_argument("--tpm", type=float, default=2000000,
+                        help="Client-side tokens-per-minute budget (each review reserves its max_tokens)")
+    parser.add_argument("--rate-limited", type=int, default=5, help="Calls the stub answers with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with StubLLMServer(latency=args.latency) as server:
+        os.environ["OPENAI_API_KEY"] = "stub-key"
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        os.environ["REVIEW_CACHE_ENABLED"] = "false"
+
+        from app.llm_service import LLMCodeReviewer
+        from app.rate_limit import RateLimiter
+        reviewer = LLMCodeReviewer(rate_limiter=RateLimiter(requests_per_minute=args.rpm, tokens_per_minute=args.tpm))
+        server.rate_limit(args.rate_limited, args.retry_after_ms)
+
+        async def burst():
+            return await asyncio.gather(*(
+                reviewer.analyze_code_async(f"file_{i}.py", f"value = {i}\n") for i in range(args.requests)
+            ))
+
+        start = time.perf_counter()
+        results = asyncio.run(burst())
+        elapsed = time.perf_counter() - start
+
+    real = sum(1 for result in results if result["report"].startswith("Stub review"))
+    stats = reviewer.rate_limiter.stats()
+    print(f"{args.requests} reviews, {args.rpm:g} requests/min and {args.tpm:g} tokens/min budgets, "
+          f"{args.rate_limited} calls rate limited by the server")
+    print(f"  real reviews:   {real}/{args.requests}")
+    print(f"  elapsed:        {elapsed:.2f}s ({args.requests / elapsed:.1f} reviews/s)")
+    print(f"  upstream calls: {server.calls}")
+    print(f"  limiter waits:  {stats['waits']} ({stats['wait_seconds']:.2f}s total), "
+          f"{stats['throttled']} throttled, {stats['retries']} retries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: indexing a repository for repository-mode reviews
+
+Generates a synthetic repository of Python and TypeScript modules that
+import each other, and times building the symbol/import index in-process
+and with a process pool, then building every file's dependency context.
+
+Usage:
+    python -m benchmarks.bench_repository_index --files 5000 --workers 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.repository import build_index
+
+def python_module(index: int, modules: int, rng: random.Random) -> str:
+    imports = sorted({rng.randrange(modules) for _ in range(4)} - {index})
+    lines = [f'"""Module {index} of the synthetic repository"""', "import os", "from typing import Dict, List", ""]
+    lines += [f"from pkg.group_{i % 50}.mod_{i} import helper_{i}, Service{i}" for i in imports]
+    lines.append("")
+    for n in range(8):
+        lines += [
+            f"def helper_{index}_{n}(items: List[int], limit: int = {n}) -> Dict[str, int]:",
+            f'    """Summarize items above {n}"""',
+            "    result = {}",
+            "    for item in items:",
+            "        if item > limit:",
+            "            result[str(item)] = item * 2",
+            "    return result",
+            "",
+        ]
+    lines += [f"def helper_{index}(value):", "    return value", ""]
+    lines += [
+        f"class Service{index}:",
+        "    def __init__(self, store):",
+        "        self.store = store",
+        "",
+        "    def run(self, key: str) -> str:",
+        "        return self.store.get(key)",
+        "",
+    ]
+    lines += [f"    def step_{n}(self):\n        return {n}\n" for n in range(6)]
+    return "\n".join(lines)
+
+def typescript_module(index: int, modules: int, rng: random.Random) -> str:
+    imports = sorted({rng.randrange(modules) for _ in range(3)} - {index})
+    lines = [f"import {{ fetch{i} }} from './mod_{i}';" for i in imports]
+    for n in range(10):
+        lines += [
+            f"export async function fetch{index}_{n}(id: string): Promise<number> {{",
+            "  const response = await fetch(id);",
+            "  return response.status;",
+            "}",
+        ]
+    lines += [f"export function fetch{index}(id: string) {{ return id; }}",
+              f"export class Client{index} {{", "  run() { return 1; }", "}"]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--typescript-share", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    typescript = int(args.files * args.typescript_share)
+    python = args.files - typescript
+    files = [(f"repo/pkg/group_{i % 50}/mod_{i}.py", python_module(i, python, rng)) for i in range(python)]
+    files += [(f"repo/web/mod_{i}.ts", typescript_module(i, typescript, rng)) for i in range(typescript)]
+    total_lines = sum(content.count("\n") + 1 for _, content in files)
+    print(f"{len(files)} files, {total_lines} lines ({python} Python, {typescript} TypeScript)")
+
+    runs = [("in-process", 1)]
+    if args.workers > 1:
+        runs.append((f"{args.workers} processes", args.workers))
+    for label, workers in runs:
+        start = time.perf_counter()
+        index = build_index(files, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f"  index, {label:13s} {elapsed:6.2f}s  {len(files) / elapsed:8.0f} files/s")
+
+    start = time.perf_counter()
+    contexts = [index.context_for(path, content) for path, content in files]
+    elapsed = time.perf_counter() - start
+    stats = index.stats()
+    print(f"  contexts             {elapsed:6.2f}s  average {sum(map(len, contexts)) / len(contexts):.0f} chars")
+    print(f"  {stats['symbols']} symbols, {stats['internal_imports']} internal imports, "
+          f"{len(index.missing_imports())} missing names")
+
+if __name__ == "__main__":
+    main()
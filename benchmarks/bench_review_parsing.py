@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark: parsing reviews out of model output
+
+Compares the old greedy-regex parser with the JSON scanner on model output
+of increasing size in the shapes models actually produce: bare JSON, JSON
+in a code fence followed by prose with braces, and JSON cut off by the
+token limit. Reports parse time and how many outputs yield a valid review.
+
+Usage:
+    python -m benchmarks.bench_review_parsing --report-kb 1 16 128 --repeat 20
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.review_parsing import parse_review
+
+def regex_parse(text: str):
+    """The previous parser: everything between the first and last brace"""
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group())
+    except ValueError:
+        return None
+
+def make_outputs(report_kb: int):
+    snippet = "Consider `cache = {}` here:\n```python\nresult = {key: value for key, value in items}\n```\n"
+    report = (snippet * (report_kb * 1024 // len(snippet) + 1))[:report_kb * 1024]
+    review = json.dumps({
+        "report": report,
+        "scores": {"readability_score": 7.5, "modularity_score": 8, "bug_risk_score": 6.5, "overall_score": 7.3},
+        "suggestions": ["Split `load` into smaller functions", "Validate {user} input"]
+    })
+    return {
+        "bare": review,
+        "fenced": f"Here is my review:\n```json\n{review}\n```\nLet me know if {{anything}} is unclear.",
+        "truncated": review[:review.index('"suggestions"') + 30],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--report-kb", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for report_kb in args.report_kb:
+        print(f"{report_kb} KB report")
+        for shape, text in make_outputs(report_kb).items():
+            row = [f"  {shape:10s}"]
+            for name, parse in (("regex", regex_parse), ("scanner", parse_review)):
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    result = parse(text)
+                elapsed = (time.perf_counter() - start) / args.repeat
+                ok = isinstance(result, dict) and "scores" in result
+                row.append(f"{name} {elapsed * 1000:7.2f}ms {'ok    ' if ok else 'failed'}")
+            print(" | ".join(row))
+
+if __name__ == "__main__":
+    main()
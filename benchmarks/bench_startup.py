@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: application cold start
+
+Times, in fresh processes, how long ``import app.main`` takes and how long
+a server takes from launch to its first response: uvicorn is started on
+a free port and /health is polled until it answers, then the first
+database-backed request (/api/reviews) is timed. Each run uses a new
+SQLite database unless --existing-db is given, so table creation is
+included. No API key or LLM server is needed.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 5 --workers 4
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SCRIPT = (
+    "import sys, time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start, 'openai' in sys.modules)"
+)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def get(url: str, timeout: float = 1.0) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status == 200
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return False
+
+def time_import(env: dict) -> tuple:
+    """Seconds to import app.main in a new interpreter, and whether openai was loaded"""
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout.split()
+    return float(output[0]), output[1] == "True"
+
+def time_server(env: dict, workers: int, timeout: float) -> tuple:
+    """Seconds from launching uvicorn to the first /health response, and the first /api/reviews request"""
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    start = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while not get(f"http://127.0.0.1:{port}/health", timeout=0.5):
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited: {server.stderr.read().decode()[-2000:]}")
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"no response within {timeout}s")
+            time.sleep(0.005)
+        ready = time.perf_counter() - start
+        query_start = time.perf_counter()
+        if not get(f"http://127.0.0.1:{port}/api/reviews?limit=10", timeout=timeout):
+            raise RuntimeError("/api/reviews failed")
+        return ready, time.perf_counter() - query_start
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def summary(values: list) -> str:
+    values = [v * 1000 for v in values]
+    return f"median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms   max {max(values):8.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--existing-db", action="store_true", help="Reuse one database across runs")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ, OPENAI_API_KEY="bench-key", PYTHONDONTWRITEBYTECODE="1")
+    # Compile once so every run starts from the same bytecode cache
+    subprocess.run([sys.executable, "-m", "compileall", "-q", "app"], cwd=ROOT, check=True)
+
+    imports, loaded_openai = [], False
+    for run in range(args.runs):
+        env["DATABASE_URL"] = f"sqlite:///{workdir}/import_{run}.db"
+        seconds, loaded = time_import(env)
+        imports.append(seconds)
+        loaded_openai = loaded_openai or loaded
+    database_created = any(Path(workdir).glob("import_*.db"))
+
+    ready, first_query = [], []
+    for run in range(args.runs):
+        env["DATABASE_URL"] = f"sqlite:///{workdir}/{'reviews' if args.existing_db else f'server_{run}'}.db"
+        seconds, query = time_server(env, args.workers, args.timeout)
+        ready.append(seconds)
+        first_query.append(query)
+
+    print(f"{args.runs} runs, {args.workers} worker(s), {'existing' if args.existing_db else 'new'} database\n")
+    print(f"import app.main          {summary(imports)}")
+    print(f"launch to first response {summary(ready)}")
+    print(f"first /api/reviews       {summary(first_query)}")
+    print(f"\nImport loaded openai: {loaded_openai}; import created the database: {database_created}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark: local static analysis time on large files
+
+Generates a synthetic Python file (and the same text reviewed as a non-Python
+file) and reports the best and median time of a full static review.
+
+Usage:
+    python -m benchmarks.bench_static_analysis --lines 10000
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FUNCTION = '''def handle_{index}(items, low, high, seen=None):
+    """Sum the items between low and high."""
+    total = 0
+    for item in items or []:
+        if low < item < high and item not in (seen or ()):
+            total += item
+        elif item == low:
+            total -= 1
+        else:
+            while total > 100:
+                total //= 2
+    return total
+
+'''
+
+def make_source(lines: int) -> str:
+    per_function = FUNCTION.count("\n")
+    return "".join(FUNCTION.format(index=i) for i in range(lines // per_function + 1))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    from app.static_analysis import static_review
+
+    source = make_source(args.lines)
+    print(f"{source.count(chr(10))} lines")
+    for filename in ("synthetic.py", "synthetic.js"):
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            static_review(filename, source)
+            times.append((time.perf_counter() - start) * 1000)
+        print(f"  {filename:14s} best {min(times):7.1f} ms  median {statistics.median(times):7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Benchmark: mixed HTTP workload against the whole application
+
+Starts the app with uvicorn on a throwaway SQLite database, pointed at the
+stub LLM server, and drives a mix of single, batch and streamed reviews and
+list and detail reads at a fixed concurrency. The operation sequence, stub
+latency jitter and injected LLM errors are all seeded, so runs differ only
+by the code under test. Latency percentiles and throughput per operation
+are printed as JSON; save a run with --output and pass it to --compare on
+a later commit to see the change.
+
+Usage:
+    python -m benchmarks.bench_workload --requests 200 --concurrency 16 --output before.json
+    python -m benchmarks.bench_workload --requests 200 --concurrency 16 --compare before.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.stub_llm_server import BackgroundServer, StubLLMServer
+
+OPERATIONS = ("single", "batch", "stream", "list", "detail")
+DEFAULT_MIX = "single=4,batch=1,stream=1,list=3,detail=3"
+PERCENTILES = (50, 95, 99)
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """Operation weights from ``name=weight`` pairs"""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name!r}, expected one of {', '.join(OPERATIONS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+def plan(mix: Dict[str, int], requests: int, seed: int) -> List[str]:
+    """The operations to run, in order, drawn from ``mix`` with a fixed seed"""
+    rng = random.Random(seed)
+    names = [name for name in mix if mix[name] > 0]
+    return rng.choices(names, weights=[mix[name] for name in names], k=requests)
+
+def sample_code(index: int) -> str:
+    """A small source file that differs per request, so reviews are not deduplicated"""
+    return (
+        f"def handler_{index}(items):\n"
+        f"    total = 0\n"
+        f"    for item in items:\n"
+        f"        if item > {index % 97}:\n"
+        f"            total += item\n"
+        f"    return total\n"
+    )
+
+def percentile(values: List[float], q: float) -> float:
+    """The q-th percentile of sorted ``values``, interpolating between ranks"""
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+def summarize(samples: Dict[str, List[Tuple[float, bool]]], elapsed: float) -> Dict:
+    """Per-operation and overall latency percentiles (ms), error counts and throughput"""
+    def stats(entries: List[Tuple[float, bool]]) -> Dict:
+        latencies = sorted(seconds * 1000 for seconds, _ in entries)
+        errors = sum(1 for _, ok in entries if not ok)
+        result = {"count": len(entries), "errors": errors}
+        for q in PERCENTILES:
+            result[f"p{q}_ms"] = round(percentile(latencies, q), 2)
+        result["mean_ms"] = round(sum(latencies) / len(latencies), 2) if latencies else 0.0
+        result["max_ms"] = round(latencies[-1], 2) if latencies else 0.0
+        result["throughput_rps"] = round(len(entries) / elapsed, 2) if elapsed else 0.0
+        return result
+
+    everything = [entry for entries in samples.values() for entry in entries]
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": stats(everything),
+        "operations": {name: stats(entries) for name, entries in sorted(samples.items())}
+    }
+
+def compare(report: Dict, baseline: Dict) -> Dict:
+    """Relative change of each latency and throughput figure against ``baseline``"""
+    def change(now: float, before: float) -> Optional[float]:
+        return round((now - before) / before * 100, 1) if before else None
+
+    keys = [f"p{q}_ms" for q in PERCENTILES] + ["throughput_rps"]
+    changes = {}
+    sections = [("overall", report["overall"], baseline.get("overall", {}))]
+    sections += [(name, stats, baseline.get("operations", {}).get(name, {}))
+                 for name, stats in report["operations"].items()]
+    for name, stats, before in sections:
+        if before:
+            changes[name] = {f"{key}_change_pct": change(stats[key], before.get(key, 0)) for key in keys}
+    return {"baseline_commit": baseline.get("commit"), "changes": changes}
+
+async def run_operation(client, operation: str, index: int, review_ids: List[int], batch_size: int) -> bool:
+    """Run one operation; True if it succeeded"""
+    if operation == "single":
+        response = await client.post("/api/review-text", json={
+            "filename": f"handler_{index}.py", "content": sample_code(index)
+        })
+        if response.status_code == 200:
+            review_ids.append(response.json()["id"])
+    elif operation == "batch":
+        files = [("files", (f"batch_{index}_{n}.py", sample_code(index * 1000 + n).encode(), "text/x-python"))
+                 for n in range(batch_size)]
+        response = await client.post("/api/reviews/batch", files=files)
+        if response.status_code == 200 and response.json()["failed"]:
+            return False
+    elif operation == "stream":
+        request = {"filename": f"stream_{index}.py", "content": sample_code(index)}
+        async with client.stream("POST", "/api/review-text/stream", json=request) as response:
+            done = False
+            async for line in response.aiter_lines():
+                done = done or line == "event: done"
+        return response.status_code == 200 and done
+    elif operation == "list":
+        response = await client.get("/api/reviews", params={"limit": 50})
+    else:
+        if not review_ids:
+            return await run_operation(client, "list", index, review_ids, batch_size)
+        response = await client.get(f"/api/reviews/{review_ids[index % len(review_ids)]}")
+    return response.status_code == 200
+
+async def drive(base_url: str, operations: List[str], concurrency: int, batch_size: int,
+                warmup: int) -> Tuple[Dict[str, List[Tuple[float, bool]]], float]:
+    """Run ``operations`` with ``concurrency`` workers; (samples by operation, elapsed seconds)"""
+    import httpx
+
+    review_ids: List[int] = []
+    samples: Dict[str, List[Tuple[float, bool]]] = {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        # Unmeasured reviews, so detail reads have something to fetch
+        for index in range(warmup):
+            await run_operation(client, "single", -1 - index, review_ids, batch_size)
+
+        queue = list(enumerate(operations))
+        queue.reverse()
+
+        async def worker():
+            while queue:
+                index, operation = queue.pop()
+                start = time.perf_counter()
+                try:
+                    ok = await run_operation(client, operation, index, review_ids, batch_size)
+                except httpx.HTTPError:
+                    ok = False
+                samples.setdefault(operation, []).append((time.perf_counter() - start, ok))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples, time.perf_counter() - start
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent.parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--batch-size", type=int, default=5, help="Files per batch review")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured reviews stored before the run")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Stub latency varies by up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of LLM calls failing with a 500")
+    parser.add_argument("--rpm", type=float, default=100000, help="Client-side requests-per-minute budget")
+    parser.add_argument("--tpm", type=float, default=100000000, help="Client-side tokens-per-minute budget")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare with")
+    args = parser.parse_args()
+
+    operations = plan(parse_mix(args.mix), args.requests, args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_workload_")
+
+    with StubLLMServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       seed=args.seed) as stub:
+        os.environ["OPENAI_API_KEY"] = "stub-key"
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+        os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/reviews.db"
+        # Every review must reach the LLM, as distinct code would in production
+        os.environ["REVIEW_CACHE_ENABLED"] = "false"
+        # Budgets high enough that the stub, not the client-side limiter, sets the pace
+        os.environ["LLM_REQUESTS_PER_MINUTE"] = str(args.rpm)
+        os.environ["LLM_TOKENS_PER_MINUTE"] = str(args.tpm)
+
+        from app.main import app
+
+        with BackgroundServer(app) as server:
+            samples, elapsed = asyncio.run(
+                drive(server.url, operations, args.concurrency, args.batch_size, args.warmup)
+            )
+
+        report = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            **summarize(samples, elapsed),
+            "llm": {"calls": stub.calls, "injected_errors": stub.errors}
+        }
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(report, json.load(f))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
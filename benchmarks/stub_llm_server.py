@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Stub OpenAI-compatible LLM server for offline benchmarks
+
+Serves ``POST /v1/chat/completions`` with a canned code review after a
+configurable delay, so the application can be benchmarked without network
+access or an API key. Latency jitter and injected server errors are drawn
+from a seeded random generator, so a given seed gives the same sequence.
+"""
+
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CANNED_REVIEW = {
+    "report": "Stub review: the code is readable and reasonably structured.",
+    "scores": {
+        "readability_score": 8.0,
+        "modularity_score": 7.5,
+        "bug_risk_score": 7.0,
+        "overall_score": 7.5
+    },
+    "suggestions": [
+        {"text": "Add docstrings to public functions", "severity": "low", "category": "documentation"},
+        {"text": "Handle the empty input case explicitly", "severity": "medium", "category": "bug",
+         "line_start": 1, "line_end": 3}
+    ]
+}
+
+def create_stub_app(latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    """
+    Create the stub server app. Completions take ``latency`` seconds, give or
+    take up to ``jitter`` seconds, and a share ``error_rate`` of them fail
+    with a 500 server error.
+    """
+    app = FastAPI(title="Stub LLM")
+    app.state.latency = latency
+    app.state.jitter = jitter
+    app.state.error_rate = error_rate
+    app.state.random = random.Random(seed)
+    app.state.errors = 0
+    app.state.calls = 0
+    app.state.prompt_chars = []
+    app.state.rate_limited = 0       # Upcoming calls to answer with 429
+    app.state.retry_after_ms = 100
+    app.state.out_of_quota = 0       # Upcoming calls to answer with 429 insufficient_quota
+    app.state.missing_models = set()  # Answered with 404 model_not_found
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: dict):
+        app.state.calls += 1
+        app.state.prompt_chars.append(sum(len(m.get("content") or "") for m in body.get("messages", [])))
+        if body.get("model") in app.state.missing_models:
+            return JSONResponse(
+                status_code=404,
+                content={"error": {"message": f"The model `{body.get('model')}` does not exist",
+                                   "type": "invalid_request_error", "code": "model_not_found"}}
+            )
+        if app.state.out_of_quota > 0:
+            app.state.out_of_quota -= 1
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "You exceeded your current quota", "type": "insufficient_quota",
+                                   "code": "insufficient_quota"}}
+            )
+        if app.state.rate_limited > 0:
+            app.state.rate_limited -= 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after-ms": str(app.state.retry_after_ms)},
+                content={"error": {"message": "Rate limit reached for requests", "type": "requests",
+                                   "code": "rate_limit_exceeded"}}
+            )
+        latency = max(0.0, app.state.latency + app.state.random.uniform(-app.state.jitter, app.state.jitter))
+        if app.state.error_rate and app.state.random.random() < app.state.error_rate:
+            app.state.errors += 1
+            await asyncio.sleep(latency / 2)
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "The server had an error while processing your request",
+                                   "type": "server_error", "code": None}}
+            )
+        if body.get("stream"):
+            return StreamingResponse(_stream_completion(app, body, latency), media_type="text/event-stream")
+        await asyncio.sleep(latency)
+        return {
+            "id": f"chatcmpl-stub-{app.state.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps(CANNED_REVIEW)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+        }
+
+    return app
+
+async def _stream_completion(app: FastAPI, body: dict, latency: float):
+    """Stream the canned review in small pieces spread over the latency"""
+    content = json.dumps(CANNED_REVIEW)
+    pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+    delay = latency / len(pieces)
+    for index, piece in enumerate(pieces):
+        await asyncio.sleep(delay)
+        chunk = {
+            "id": f"chatcmpl-stub-{app.state.calls}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "delta": {"role": "assistant", "content": piece} if index == 0 else {"content": piece},
+                "finish_reason": None
+            }]
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    if (body.get("stream_options") or {}).get("include_usage"):
+        usage = {"id": f"chatcmpl-stub-{app.state.calls}", "object": "chat.completion.chunk",
+                 "created": int(time.time()), "model": body.get("model", "stub"), "choices": [],
+                 "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}}
+        yield f"data: {json.dumps(usage)}\n\n"
+    yield "data: [DONE]\n\n"
+
+class BackgroundServer:
+    """Run an ASGI app with uvicorn in a background thread on a free local port"""
+
+    def __init__(self, app):
+        self.app = app
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class StubLLMServer(BackgroundServer):
+    """Run the stub server in a background thread on a free local port"""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        super().__init__(create_stub_app(latency, jitter, error_rate, seed))
+        self.base_url = f"{self.url}/v1"
+
+    @property
+    def calls(self) -> int:
+        return self.app.state.calls
+
+    @property
+    def prompt_chars(self) -> list:
+        """Characters of prompt sent with each call, in order"""
+        return self.app.state.prompt_chars
+
+    def rate_limit(self, calls: int, retry_after_ms: int = 100):
+        """Answer the next ``calls`` requests with 429 and a Retry-After"""
+        self.app.state.rate_limited = calls
+        self.app.state.retry_after_ms = retry_after_ms
+
+    def exhaust_quota(self, calls: int):
+        """Answer the next ``calls`` requests with 429 insufficient_quota"""
+        self.app.state.out_of_quota = calls
+
+    def remove_models(self, *models: str):
+        """Answer requests for ``models`` with 404 model_not_found"""
+        self.app.state.missing_models.update(models)
+
+    @property
+    def errors(self) -> int:
+        """Calls answered with an injected 500 error"""
+        return self.app.state.errors
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a stub OpenAI-compatible server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = create_stub_app(args.latency, args.jitter, args.error_rate, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
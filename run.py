@@ -4,13 +4,21 @@ Code Review Assistant - Main Entry Point
 
 This script provides an easy way to run the Code Review Assistant application.
 It handles environment setup and starts the FastAPI server.
+
+Development (default): one process that reloads when code changes.
+Production: several worker processes and no reloader:
+    python run.py --production --workers 4
 """
 
+import argparse
 import os
 import sys
 import uvicorn
 from pathlib import Path
 
+# Worker processes in production mode
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+
 def check_environment():
     """Check if required environment variables are set."""
     env_file = Path(".env")
@@ -29,8 +37,19 @@ def check_environment():
     
     return True
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Code Review Assistant")
+    parser.add_argument("--production", action="store_true",
+                        help="Run several worker processes, without the code reloader")
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS,
+                        help="Worker processes in production mode (default: WEB_WORKERS or the CPU count)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    return parser.parse_args()
+
 def main():
     """Main entry point for the application."""
+    args = parse_args()
     print("Starting Code Review Assistant...")
     print("=" * 50)
     
@@ -42,21 +61,39 @@ def main():
     os.makedirs("static", exist_ok=True)
     os.makedirs("templates", exist_ok=True)
     
+    if args.production:
+        # Create and migrate the tables once, so the workers starting together
+        # find them in place instead of racing to create them
+        from app.database import create_tables
+        create_tables()
+    
     print("Environment check passed")
-    print("Starting web server...")
-    print("Open your browser and go to: http://localhost:8000")
-    print("API documentation: http://localhost:8000/docs")
+    if args.production:
+        print(f"Starting web server with {args.workers} workers...")
+    else:
+        print("Starting web server in development mode (reloads on code changes)...")
+    print(f"Open your browser and go to: http://localhost:{args.port}")
+    print(f"API documentation: http://localhost:{args.port}/docs")
     print("=" * 50)
     
     # Start the server
     try:
-        uvicorn.run(
-            "app.main:app",
-            host="0.0.0.0",
-            port=8000,
-            reload=True,
-            log_level="info"
-        )
+        if args.production:
+            uvicorn.run(
+                "app.main:app",
+                host=args.host,
+                port=args.port,
+                workers=args.workers,
+                log_level="info"
+            )
+        else:
+            uvicorn.run(
+                "app.main:app",
+                host=args.host,
+                port=args.port,
+                reload=True,
+                log_level="info"
+            )
     except KeyboardInterrupt:
         print("\nShutting down Code Review Assistant...")
     except Exception as e:
@@ -32,7 +32,7 @@ async function submitCode() {
         return;
     }
     
-    // Show loading modal
+    // Show loading modal until the first part of the review arrives
     const loadingModal = new bootstrap.Modal(document.getElementById('loadingModal'));
     loadingModal.show();
     
@@ -44,13 +44,13 @@ async function submitCode() {
             const formData = new FormData();
             formData.append('file', fileInput.files[0]);
             
-            response = await fetch('/api/review', {
+            response = await fetch('/api/review/stream', {
                 method: 'POST',
                 body: formData
             });
         } else {
             // Submit text
-            response = await fetch('/api/review-text', {
+            response = await fetch('/api/review-text/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -66,12 +66,42 @@ async function submitCode() {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        const result = await response.json();
-        displayReviewResults(result);
-        currentReviewId = result.id;
+        let started = false;
+        const startStreaming = () => {
+            if (!started) {
+                started = true;
+                loadingModal.hide();
+                resetReviewResults();
+            }
+        };
         
-        // Reload recent reviews
-        loadRecentReviews();
+        await readEventStream(response, {
+            report(data) {
+                startStreaming();
+                document.getElementById('analysisReport').textContent += data.text;
+            },
+            result(analysis) {
+                startStreaming();
+                displayReviewResults({
+                    review_report: analysis.report,
+                    readability_score: analysis.scores.readability_score,
+                    modularity_score: analysis.scores.modularity_score,
+                    bug_risk_score: analysis.scores.bug_risk_score,
+                    overall_score: analysis.scores.overall_score,
+                    suggestion_items: analysis.suggestions.map(
+                        s => (typeof s === 'string' ? { text: s } : s)
+                    )
+                });
+            },
+            done(review) {
+                currentReviewId = review.id;
+                // Reload recent reviews
+                loadRecentReviews();
+            },
+            error(data) {
+                throw new Error(data.detail);
+            }
+        });
         
     } catch (error) {
         console.error('Error:', error);
@@ -81,6 +111,54 @@ async function submitCode() {
     }
 }
 
+// Read a Server-Sent Events response body, calling handlers[event](data) per event
+async function readEventStream(response, handlers) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            });
+            
+            if (handlers[event]) {
+                handlers[event](JSON.parse(data));
+            }
+        }
+    }
+}
+
+// Show an empty results section ready for a streamed review
+function resetReviewResults() {
+    document.getElementById('reviewResults').style.display = 'block';
+    ['readabilityScore', 'modularityScore', 'bugRiskScore', 'overallScore'].forEach(id => {
+        const element = document.getElementById(id);
+        element.textContent = '-';
+        element.className = 'score';
+    });
+    document.getElementById('analysisReport').textContent = '';
+    document.getElementById('suggestionsList').innerHTML = '';
+    document.getElementById('reviewResults').scrollIntoView({ behavior: 'smooth' });
+}
+
 function displayReviewResults(review) {
     // Show results section
     document.getElementById('reviewResults').style.display = 'block';
@@ -98,10 +176,19 @@ function displayReviewResults(review) {
     const suggestionsList = document.getElementById('suggestionsList');
     suggestionsList.innerHTML = '';
     
-    const suggestions = review.suggestions.split('\n').filter(s => s.trim());
+    // Structured suggestions; reviews stored before them only have the joined text
+    const suggestions = review.suggestion_items && review.suggestion_items.length
+        ? review.suggestion_items
+        : (review.suggestions || '').split('\n').filter(s => s.trim()).map(text => ({ text }));
     suggestions.forEach(suggestion => {
         const li = document.createElement('li');
-        li.textContent = suggestion.trim();
+        const labels = [suggestion.severity, suggestion.category].filter(Boolean);
+        if (suggestion.line_start) {
+            labels.push(suggestion.line_end && suggestion.line_end !== suggestion.line_start
+                ? `lines ${suggestion.line_start}-${suggestion.line_end}`
+                : `line ${suggestion.line_start}`);
+        }
+        li.textContent = (labels.length ? `[${labels.join(', ')}] ` : '') + suggestion.text.trim();
         suggestionsList.appendChild(li);
     });
     
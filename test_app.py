@@ -6,14 +6,36 @@ This script tests the basic functionality of the application
 without requiring an OpenAI API key.
 """
 
+import atexit
 import os
+import shutil
 import sys
 import tempfile
+import time
 from pathlib import Path
 
 # Add the app directory to the Python path
 sys.path.insert(0, str(Path(__file__).parent / "app"))
 
+# The app's database lives in a temporary directory, never in ./code_reviews.db;
+# worker processes that import this module again reuse their parent's
+if "TEST_DB_DIR" not in os.environ:
+    os.environ["TEST_DB_DIR"] = tempfile.mkdtemp(prefix="code_review_tests_")
+    atexit.register(shutil.rmtree, os.environ["TEST_DB_DIR"], ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.environ['TEST_DB_DIR']}/code_reviews.db"
+
+def run_reviewer(reviewer, coroutine):
+    """asyncio.run ``coroutine``, closing ``reviewer``'s OpenAI clients before its event loop closes"""
+    import asyncio
+    
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await reviewer.close()
+    
+    return asyncio.run(run())
+
 def test_imports():
     """Test that all modules can be imported."""
     print("🧪 Testing imports...")
@@ -86,7 +108,7 @@ def test_llm_service_structure():
         assert ext == "text"
         
         # Test fallback response creation
-        fallback = reviewer._create_fallback_response("Test report")
+        fallback = reviewer._create_fallback_response("test.py", "print('hello')", "Test report")
         assert "report" in fallback
         assert "scores" in fallback
         assert "suggestions" in fallback
@@ -97,6 +119,1326 @@ def test_llm_service_structure():
         print(f"❌ LLM service error: {e}")
         return False
 
+def test_async_llm_service():
+    """Test the non-blocking review path (demo mode, no API call)."""
+    print("🧪 Testing async LLM service...")
+    
+    try:
+        import asyncio
+        from app.llm_service import LLMCodeReviewer
+        
+        reviewer = LLMCodeReviewer(max_concurrency=2, timeout=5)
+        reviewer.api_available = False
+        
+        result = asyncio.run(reviewer.analyze_code_async("test.py", "print('hi')"))
+        assert "report" in result
+        assert "scores" in result
+        assert reviewer.max_concurrency == 2
+        
+        print("✅ Async LLM service works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Async LLM service error: {e}")
+        return False
+
+def test_review_cache():
+    """Test the in-process review cache tier."""
+    print("🧪 Testing review cache...")
+    
+    try:
+        import subprocess
+        from app.cache import ReviewCache, make_cache_key
+        
+        # Cosmetic whitespace changes map to the same key
+        key = make_cache_key("x = 1\r\n", "py", "1", "gpt-3.5-turbo")
+        assert key == make_cache_key("x = 1   \n\n", "py", "1", "gpt-3.5-turbo")
+        assert key != make_cache_key("x = 1\n", "py", "2", "gpt-3.5-turbo")
+        # Leading blank lines move every line number, so they change the key
+        assert key != make_cache_key("\n\nx = 1\n", "py", "1", "gpt-3.5-turbo")
+        
+        cache = ReviewCache(max_entries=2, ttl=0, persistent=False)
+        cache.set("a", {"report": "a"})
+        cache.set("b", {"report": "b"})
+        assert cache.get("a") == {"report": "a"}
+        cache.set("c", {"report": "c"})  # evicts "b", the least recently used
+        assert cache.get("b") is None
+        
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["evictions"] == 1
+        
+        # The database tier is read and written off the event loop: a write
+        # lock held elsewhere must not stall other coroutines
+        script = (
+            "import asyncio, os, sqlite3\n"
+            "from app.cache import ReviewCache\n"
+            "from app.database import create_tables\n"
+            "create_tables()\n"
+            "lock = sqlite3.connect(os.environ['DB_PATH'])\n"
+            "lock.execute('BEGIN IMMEDIATE')\n"
+            "async def main():\n"
+            "    ticks = 0\n"
+            "    async def tick():\n"
+            "        nonlocal ticks\n"
+            "        while True:\n"
+            "            await asyncio.sleep(0.01)\n"
+            "            ticks += 1\n"
+            "    ticker = asyncio.ensure_future(tick())\n"
+            "    await ReviewCache().set_async('k', {'report': 'r'})\n"
+            "    ticker.cancel()\n"
+            "    assert ticks >= 20, ticks\n"
+            "    lock.rollback()\n"
+            "    await ReviewCache().set_async('k', {'report': 'r'})\n"
+            "    cache = ReviewCache()\n"
+            "    assert await cache.get_async('k') == {'report': 'r'}\n"
+            "    assert cache.stats()['db_hits'] == 1\n"
+            "asyncio.run(main())\n"
+        )
+        with tempfile.TemporaryDirectory() as workdir:
+            db_path = os.path.join(workdir, "cache.db")
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", DB_PATH=db_path, SQLITE_BUSY_TIMEOUT="500")
+            result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+            assert result.returncode == 0, result.stderr[-1000:]
+        
+        print("✅ Review cache works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Review cache error: {e}")
+        return False
+
+def test_chunking():
+    """Test splitting large files and merging chunk reviews."""
+    print("🧪 Testing chunked review...")
+    
+    try:
+        from app.chunking import split_into_chunks, merge_reviews
+        
+        source = "\n\n".join(f"def f{i}():\n" + "    x = 1\n" * 20 + "    return x" for i in range(10))
+        chunks = split_into_chunks("big.py", source, max_lines=50)
+        assert len(chunks) > 1
+        assert chunks[0].start_line == 1
+        assert chunks[-1].end_line == len(source.split("\n"))
+        assert all(chunk.content.startswith("def ") for chunk in chunks)
+        
+        # Non-Python files fall back to line windows
+        windows = split_into_chunks("big.js", source, max_lines=50)
+        assert all(chunk.end_line - chunk.start_line < 50 for chunk in windows)
+        
+        review = {
+            "report": "ok",
+            "scores": {"readability_score": 8.0, "modularity_score": 6.0, "bug_risk_score": 7.0, "overall_score": 7.0},
+            "suggestions": ["Add docstrings"]
+        }
+        merged = merge_reviews(chunks, [review] * len(chunks))
+        assert merged["scores"]["readability_score"] == 8.0
+        assert len(merged["suggestions"]) == 1
+        
+        # A chunk that still fails after a retry is left out of the scores and listed in the report
+        import asyncio
+        from app.llm_service import LLMCodeReviewer
+        reviewer = LLMCodeReviewer(cache=None)
+        chunks = split_into_chunks("big.py", source)
+        calls = []
+        
+        async def analyze_single(filename, content, excerpt=None, context=None):
+            calls.append(excerpt)
+            if content == chunks[1].content:
+                return reviewer._create_error_response("timed out")
+            return review
+        reviewer._analyze_single_async = analyze_single
+        merged = asyncio.run(reviewer._analyze_chunked_async("big.py", source))
+        assert len(chunks) > 1 and len(calls) == len(chunks) + 1
+        assert merged["scores"]["overall_score"] == 7.0
+        assert f"Lines {chunks[1].start_line}-{chunks[1].end_line}" in merged["report"].split("\n\n")[0]
+        assert "Error analyzing code: timed out" in merged["report"]
+        
+        print("✅ Chunked review works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Chunked review error: {e}")
+        return False
+
+def test_archive_extraction():
+    """Test expanding archives for batch review."""
+    print("🧪 Testing archive extraction...")
+    
+    try:
+        import io
+        import zipfile
+        from app.archive import is_archive, extract_archive
+        
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("src/main.py", "print('hi')")
+            archive.writestr("README.md", "# not source")
+            archive.writestr(".git/hooks/pre-commit.py", "hidden")
+        
+        assert is_archive("pr.zip") and is_archive("pr.tar.gz")
+        assert not is_archive("main.py")
+        members = extract_archive("pr.zip", buffer.getvalue())
+        assert members == [("src/main.py", b"print('hi')")]
+        
+        try:
+            extract_archive("broken.zip", b"not a zip")
+            return False
+        except ValueError:
+            pass
+        
+        print("✅ Archive extraction works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Archive extraction error: {e}")
+        return False
+
+def test_job_queue():
+    """Test submitting, claiming and recovering review jobs."""
+    print("🧪 Testing job queue...")
+    
+    try:
+        import asyncio
+        from app.database import create_tables, run_db
+        from app.jobs import ReviewJobQueue, QUEUED, RUNNING, CANCELLED
+        
+        create_tables()
+        queue = ReviewJobQueue(reviewer=None)
+        
+        job = asyncio.run(queue.submit("test.py", "print('hi')"))
+        assert job.status == QUEUED
+        
+        # Claim until we get our own job (the table may hold older jobs)
+        claimed = asyncio.run(run_db(queue._claim))
+        while claimed is not None and claimed.id != job.id:
+            claimed = asyncio.run(run_db(queue._claim))
+        assert claimed is not None and claimed.status == RUNNING
+        
+        # A restart puts interrupted jobs back on the queue
+        asyncio.run(queue.recover(own_only=True))
+        assert asyncio.run(queue.get(job.id)).status == QUEUED
+        
+        assert asyncio.run(queue.cancel(job.id)).status == CANCELLED
+        assert asyncio.run(queue.stats())["counts"][CANCELLED] >= 1
+        
+        print("✅ Job queue works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Job queue error: {e}")
+        return False
+
+def test_report_stream_extractor():
+    """Test decoding the report field from a partial JSON stream."""
+    print("🧪 Testing report stream extractor...")
+    
+    try:
+        import json
+        from app.streaming import ReportStreamExtractor
+        
+        report = 'Line one\nUses "quotes", a tab\t and caf\u00e9'
+        output = json.dumps({"report": report, "scores": {}, "suggestions": []})
+        
+        # Feed in 3-character deltas so escapes are split across deltas
+        extractor = ReportStreamExtractor()
+        text = "".join(extractor.feed(output[i:i + 3]) for i in range(0, len(output), 3))
+        assert text == report
+        assert extractor.done
+        
+        # One character at a time, only a pending key or an unfinished escape is carried over
+        long_report = "Escapes \\ and \u00e9 " * 2000
+        output = 'Here it is: {"report" \n: ' + json.dumps(long_report) + ', "scores": {}}'
+        extractor = ReportStreamExtractor()
+        parts = []
+        for char in output:
+            parts.append(extractor.feed(char))
+            assert len(extractor._buffer) < 16
+        assert "".join(parts) == long_report
+        
+        print("✅ Report stream extractor works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Report stream extractor error: {e}")
+        return False
+
+def test_pagination_cursor():
+    """Test keyset pagination cursors."""
+    print("🧪 Testing pagination cursors...")
+    
+    try:
+        from datetime import datetime
+        from app.pagination import encode_cursor, decode_cursor
+        
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+        cursor = encode_cursor(created_at, 42)
+        assert decode_cursor(cursor) == (created_at, 42)
+        
+        try:
+            decode_cursor("not-a-cursor")
+            return False
+        except ValueError:
+            pass
+        
+        print("✅ Pagination cursors work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Pagination cursor error: {e}")
+        return False
+
+def test_blob_storage():
+    """Test deduplicated, compressed storage of file contents."""
+    print("🧪 Testing blob storage...")
+    
+    try:
+        from app.database import (
+            SessionLocal, FileBlob, create_tables, compress_content, decompress_content, store_blob, load_blobs
+        )
+        
+        content = "def add(a, b):\n    return a + b\n" * 50
+        codec, payload = compress_content(content.encode("utf-8"))
+        assert len(payload) < len(content)
+        assert decompress_content(codec, payload).decode("utf-8") == content
+        
+        create_tables()
+        db = SessionLocal()
+        try:
+            first = store_blob(db, content)
+            second = store_blob(db, content)
+            assert first == second
+            assert db.query(FileBlob).filter(FileBlob.content_hash == first).count() == 1
+            assert load_blobs(db, [first]) == {first: content}
+        finally:
+            db.rollback()
+            db.close()
+        
+        print("✅ Blob storage works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Blob storage error: {e}")
+        return False
+
+def test_db_config():
+    """Test SQLite tuning and the async database URL mapping."""
+    print("🧪 Testing database configuration...")
+    
+    try:
+        import tempfile
+        from sqlalchemy import text
+        from app.db_config import create_db_engine, async_database_url
+        
+        assert async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+        assert async_database_url("postgresql://u:p@h/db") == "postgresql+asyncpg://u:p@h/db"
+        
+        with tempfile.TemporaryDirectory() as workdir:
+            engine = create_db_engine(f"sqlite:///{workdir}/tuned.db")
+            with engine.connect() as conn:
+                assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+                assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+                assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+            engine.dispose()
+        
+        print("✅ Database configuration works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Database configuration error: {e}")
+        return False
+
+def test_static_analysis():
+    """Test the local static analyzer used when the API is unavailable."""
+    print("🧪 Testing static analysis...")
+    
+    try:
+        from app.static_analysis import analyze_source, static_review
+        
+        code = (
+            "def load(path, cache={}):\n"
+            "    try:\n"
+            "        return open(path).read()\n"
+            "    except:\n"
+            "        pass\n"
+            "    if cache == None:\n"
+            "        return None\n"
+        )
+        metrics = analyze_source("loader.py", code)
+        kinds = {finding.kind for finding in metrics["findings"]}
+        assert {"mutable_default", "bare_except", "swallowed_exception", "none_comparison"} <= kinds
+        assert metrics["functions"][0].name == "load"
+        assert metrics["functions"][0].complexity == 3  # try/except and the if
+        
+        clean = static_review("clean.py", 'def add(a, b):\n    """Add two numbers."""\n    return a + b\n')
+        risky = static_review("loader.py", code)
+        assert risky["scores"]["bug_risk_score"] < clean["scores"]["bug_risk_score"]
+        assert any("except" in suggestion["text"] for suggestion in risky["suggestions"])
+        
+        # Unparseable Python is reported instead of raising
+        broken = analyze_source("broken.py", "def broken(:\n")
+        assert broken["findings"][0].kind == "syntax_error"
+        
+        print("✅ Static analysis works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Static analysis error: {e}")
+        return False
+
+def test_incremental_review():
+    """Test diff hunks and merging an incremental review into its base."""
+    print("🧪 Testing incremental review...")
+    
+    try:
+        from app.incremental import compute_hunks, merge_incremental
+        
+        old = "\n".join(f"line {i}" for i in range(1, 201))
+        new = old.replace("line 100", "line one hundred")
+        hunks = compute_hunks(old, new, context=3)
+        assert len(hunks) == 1
+        assert (hunks[0].start_line, hunks[0].end_line, hunks[0].changed) == (97, 103, 1)
+        assert "-line 100\n+line one hundred" in hunks[0].text
+        assert compute_hunks(old, old) == []
+        
+        base = {"report": "Base report", "suggestions": ["Add tests"],
+                "scores": {"readability_score": 8.0, "modularity_score": 8.0, "bug_risk_score": 8.0, "overall_score": 8.0}}
+        delta = {"report": "Delta report", "suggestions": ["Name the constant", "Add tests"],
+                 "scores": {"readability_score": 4.0, "modularity_score": 4.0, "bug_risk_score": 4.0, "overall_score": 4.0}}
+        merged = merge_incremental(base, delta, hunks, 200, base_review_id=7)
+        # The 7 reviewed lines weigh 7/200 of the merged scores
+        assert merged["scores"]["overall_score"] == 7.9
+        assert merged["suggestions"] == ["Name the constant", "Add tests"]
+        assert "review #7" in merged["report"] and "Delta report" in merged["report"]
+        
+        # Re-merging a merged review does not nest the earlier sections
+        again = merge_incremental(merged, delta, hunks, 200, base_review_id=8)
+        assert again["report"].count("## Unchanged code") == 1
+        
+        # Previous suggestions follow their lines; those on changed lines are dropped
+        edited = new.replace("line 50", "line 50\ninserted\ninserted")
+        hunks = compute_hunks(old, edited, context=3)
+        def at(text, start, end):
+            return {"text": text, "severity": "low", "category": "style", "line_start": start, "line_end": end}
+        base["suggestions"] = [at("Early", 10, 12), at("Changed", 99, 101), at("Late", 150, 151), "Whole file"]
+        merged = merge_incremental(base, {**delta, "suggestions": []}, hunks, 202)
+        assert merged["suggestions"] == [at("Early", 10, 12), at("Late", 152, 153), "Whole file"]
+        
+        print("✅ Incremental review works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Incremental review error: {e}")
+        return False
+
+def test_request_coalescing():
+    """Test that identical concurrent reviews make a single upstream LLM call."""
+    print("🧪 Testing request coalescing...")
+    
+    saved_env = {key: os.environ.get(key) for key in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    try:
+        import asyncio
+        from benchmarks.stub_llm_server import StubLLMServer
+        from app.cache import ReviewCache
+        from app.llm_service import LLMCodeReviewer
+        
+        with StubLLMServer(latency=0.3) as server:
+            os.environ["OPENAI_API_KEY"] = "stub-key"
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            reviewer = LLMCodeReviewer(cache=ReviewCache(persistent=False))
+            
+            async def review_many(n):
+                return await asyncio.gather(*(reviewer.analyze_code_async("same.py", "x = 1\n") for _ in range(n)))
+            
+            results = run_reviewer(reviewer, review_many(10))
+            assert server.calls == 1
+            assert all(result == results[0] for result in results)
+            # Callers get their own copies of the shared review
+            assert results[0] is not results[1]
+            assert reviewer.flights.stats()["coalesced"] == 9
+        
+        print("✅ Request coalescing works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Request coalescing error: {e}")
+        return False
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def test_rate_limiting():
+    """Test the token buckets, Retry-After handling and retries of 429 responses."""
+    print("🧪 Testing rate limiting...")
+    
+    saved_env = {key: os.environ.get(key) for key in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    try:
+        import httpx
+        import openai
+        from benchmarks.stub_llm_server import StubLLMServer
+        from app.cache import ReviewCache
+        from app.llm_service import LLMCodeReviewer
+        from app.rate_limit import TokenBucket, RateLimiter, retry_kind, retry_after, backoff_delay
+        
+        # 60 per minute with a 10 second burst: 10 requests go at once, then one per second
+        bucket = TokenBucket(60)
+        now = time.monotonic()
+        assert all(bucket.reserve(1, now) == 0 for _ in range(10))
+        assert abs(bucket.reserve(1, now) - 1.0) < 0.01
+        assert abs(bucket.reserve(1, now) - 2.0) < 0.01
+        # Settling gives back what a reservation did not use, up to the burst capacity
+        bucket = TokenBucket(600)
+        now = time.monotonic()
+        assert bucket.reserve(80, now) == 0
+        bucket.settle(80, 30, now)
+        assert bucket.reserve(70, now) == 0 and bucket.reserve(1, now) > 0
+        
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        limited = openai.RateLimitError(
+            "Rate limit reached", response=httpx.Response(429, headers={"retry-after-ms": "250"}, request=request),
+            body=None
+        )
+        assert retry_kind(limited) == "rate_limit"
+        assert retry_after(limited) == 0.25
+        assert 0.25 <= backoff_delay(0, 0.25) <= 0.5
+        quota = openai.RateLimitError(
+            "You exceeded your current quota", response=httpx.Response(429, request=request),
+            body={"code": "insufficient_quota"}
+        )
+        assert retry_kind(quota) is None
+        server_error = openai.InternalServerError(
+            "Server error", response=httpx.Response(503, headers={"retry-after": "2"}, request=request), body=None
+        )
+        assert retry_kind(server_error) == "transient"
+        assert retry_after(server_error) == 2.0
+        assert retry_kind(ValueError("bad json")) is None
+        
+        with StubLLMServer(latency=0.05) as server:
+            os.environ["OPENAI_API_KEY"] = "stub-key"
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            reviewer = LLMCodeReviewer(cache=ReviewCache(persistent=False), rate_limiter=RateLimiter())
+            server.rate_limit(2, retry_after_ms=50)
+            
+            # A 429 is retried after the Retry-After, never answered with the offline review
+            result = run_reviewer(reviewer, reviewer.analyze_code_async("limited.py", "x = 1\n"))
+            assert result["report"].startswith("Stub review")
+            assert server.calls == 3
+            stats = reviewer.rate_limiter.stats()
+            assert stats["retries"] == 2 and stats["throttled"] == 2
+            
+            server.rate_limit(1, retry_after_ms=50)
+            result = reviewer.analyze_code("limited_sync.py", "y = 2\n")
+            assert result["report"].startswith("Stub review")
+            assert reviewer.rate_limiter.stats()["retries"] == 3
+            
+            # Retries share the first attempt's token reservation, settled to the reported 150 tokens
+            limiter = RateLimiter(tokens_per_minute=6000)
+            reviewer = LLMCodeReviewer(cache=ReviewCache(persistent=False), rate_limiter=limiter)
+            calls = server.calls
+            server.rate_limit(2, retry_after_ms=50)
+            run_reviewer(reviewer, reviewer.analyze_code_async("settled.py", "z = 3\n"))
+            assert server.calls == calls + 3
+            assert limiter.tokens.reserve(800, time.monotonic()) == 0
+        
+        print("✅ Rate limiting works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Rate limiting error: {e}")
+        return False
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def test_model_router():
+    """Test that unavailable and failing models are remembered and skipped."""
+    print("🧪 Testing model router...")
+    
+    saved_env = {key: os.environ.get(key) for key in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    try:
+        from benchmarks.stub_llm_server import StubLLMServer
+        from app.cache import ReviewCache
+        from app.llm_service import LLMCodeReviewer
+        from app.model_router import ModelRouter
+        
+        router = ModelRouter(models=["big", "backup"], small_model="small", small_file_lines=50,
+                             failure_threshold=2, reset_seconds=0.2)
+        assert router.candidates(10) == ["small", "big", "backup"]
+        assert router.candidates(500) == ["big", "backup"]
+        
+        # Two failures in a row open the circuit; after the reset one trial call is let through
+        router.record_failure("big")
+        router.record_failure("big")
+        assert router.candidates(500) == ["backup"]
+        time.sleep(0.25)
+        assert router.candidates(500) == ["big", "backup"]
+        assert router.begin("big")
+        assert not router.begin("big")
+        router.record_success("big", 0.5)
+        assert router.stats()["models"]["big"]["state"] == "closed"
+        assert router.stats()["models"]["big"]["error_rate"] == round(2 / 3, 3)
+        
+        with StubLLMServer(latency=0.05) as server:
+            os.environ["OPENAI_API_KEY"] = "stub-key"
+            os.environ["OPENAI_BASE_URL"] = server.base_url
+            server.remove_models("gpt-missing")
+            reviewer = LLMCodeReviewer(cache=ReviewCache(persistent=False),
+                                       router=ModelRouter(models=["gpt-missing", "gpt-stub"], small_model=""))
+            
+            async def review_twice():
+                await reviewer.analyze_code_async("first.py", "a = 1\n")
+                return await reviewer.analyze_code_async("second.py", "b = 2\n")
+            
+            result = run_reviewer(reviewer, review_twice())
+            assert result["report"].startswith("Stub review")
+            # The missing model is probed once, not on every review
+            assert server.calls == 3
+            stats = reviewer.router.stats()["models"]
+            assert stats["gpt-missing"]["state"] == "unavailable"
+            assert stats["gpt-stub"]["successes"] == 2
+            # Answers from the fallback model are not cached as the preferred model's
+            assert reviewer._cache_get(reviewer._cache_key("first.py", "a = 1\n")) is None
+            
+            # A half-open trial call that runs out of quota does not keep the model claimed
+            router = ModelRouter(models=["gpt-stub"], small_model="", failure_threshold=1, reset_seconds=0.05)
+            reviewer = LLMCodeReviewer(cache=ReviewCache(persistent=False), router=router)
+            router.record_failure("gpt-stub")
+            time.sleep(0.1)
+            server.exhaust_quota(1)
+            
+            async def review_after_quota():
+                first = await reviewer.analyze_code_async("quota.py", "c = 3\n")
+                return first, await reviewer.analyze_code_async("quota.py", "c = 3\n")
+            
+            first, second = run_reviewer(reviewer, review_after_quota())
+            assert "static analyzer" in first["report"]
+            assert second["report"].startswith("Stub review")
+            assert reviewer._cache_get(reviewer._cache_key("quota.py", "c = 3\n")) is not None
+            assert router.stats()["models"]["gpt-stub"]["state"] == "closed"
+        
+        print("✅ Model router works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Model router error: {e}")
+        return False
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def test_prompt_compaction():
+    """Test that boilerplate is stripped from prompts and token savings are counted."""
+    print("🧪 Testing prompt compaction...")
+    
+    try:
+        import json
+        from app.compaction import compact_source
+        from app.llm_service import LLMCodeReviewer, SYSTEM_PROMPT
+        
+        source = "\n".join([
+            "#!/usr/bin/env python",
+            "# Copyright (c) 2024 Example Corp.",
+            "# Licensed under the MIT License.",
+            "# See LICENSE for details.",
+            "",
+            "import os   ",
+            "", "", "", "",
+            "TABLE = [",
+            *[f"    ({i}, 'row{i}')," for i in range(30)],
+            "]",
+            "# BEGIN GENERATED",
+            "def generated(): pass",
+            "# END GENERATED",
+            "def main():",
+            "    return TABLE",
+        ])
+        compacted = compact_source("module.py", source)
+        lines = compacted.text.split("\n")
+        assert lines[0] == "#!/usr/bin/env python"
+        assert lines[1] == "# [license header omitted: lines 2-4]"
+        assert "import os" in lines and "" in lines and "\n\n\n" not in compacted.text
+        assert "    (0, 'row0')," in lines and "    (29, 'row29')," in lines
+        assert "    (15, 'row15')," not in lines
+        assert "# [literal table omitted: lines 15-38]" in [line.strip() for line in lines]
+        assert "def generated(): pass" not in compacted.text and "# END GENERATED" in lines
+        assert [what for what, _, _ in compacted.omitted] == ["license header", "literal table", "generated code"]
+        # Ordinary code is left alone
+        code = "def f(x):\n    if x:\n        return 1\n    return 2"
+        assert compact_source("f.py", code).text == code
+        
+        reviewer = LLMCodeReviewer()
+        prompt = reviewer._build_prompt("module.py", source)
+        assert "(15, 'row15')" not in prompt and "JSON" not in prompt and "JSON" in SYSTEM_PROMPT
+        stats = reviewer.prompt_stats_summary()
+        assert stats["prompts"] == 1 and stats["tokens_after"] < stats["tokens_before"]
+        
+        # Lines the model gives against the compacted file are mapped back to the original
+        assert compacted.original_lines(2, 2) == (2, 4)
+        assert compacted.original_lines(4, 6) == (6, 11)
+        licensed = "\n".join([
+            "# Copyright (c) 2024 Example Corp.", "# Licensed under the MIT License.", "# See LICENSE for details.",
+            "", "import os", "", "def f():", "    return os.sep"
+        ])
+        assert compact_source("mod.py", licensed).text.split("\n")[4] == "def f():"
+        output = json.dumps({
+            "report": "ok", "scores": {"readability_score": 8, "modularity_score": 8, "bug_risk_score": 8},
+            "suggestions": [{"text": "Document f", "line_start": 5, "line_end": 6},
+                            {"text": "Add tests"}]
+        })
+        suggestions = reviewer._parse_response(output, "mod.py", licensed)["suggestions"]
+        assert [(s["line_start"], s["line_end"]) for s in suggestions] == [(7, 8), (None, None)]
+        
+        print("✅ Prompt compaction works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Prompt compaction error: {e}")
+        return False
+
+def test_review_parsing():
+    """Test extraction and validation of the JSON review in model output."""
+    print("🧪 Testing review parsing...")
+    
+    try:
+        import json
+        from app.review_parsing import JsonObjectScanner, parse_review
+        from app.llm_service import LLMCodeReviewer
+        
+        review = {
+            "report": "Prefer `dict.get`:\n```python\nvalue = {'a': 1}.get('a')\n```",
+            "scores": {"readability_score": 8, "modularity_score": "7.5", "bug_risk_score": 6, "overall_score": 7},
+            "suggestions": ["Add tests"]
+        }
+        text = json.dumps(review)
+        expected = parse_review(text)
+        assert expected["scores"]["modularity_score"] == 7.5
+        
+        # Fences, prose and braces around the object do not matter
+        assert parse_review(f"Sure! {{x}} Here it is:\n```json\n{text}\n```\nLet me know {{if}} }}") == expected
+        # Streamed in small pieces
+        scanner = JsonObjectScanner()
+        for i in range(0, len(text), 5):
+            scanner.feed(text[i:i + 5])
+        assert scanner.finish() == json.loads(text)
+        # Output cut off by max_tokens is repaired back to the last complete value
+        truncated = parse_review(text[:text.index('"suggestions"') + 20])
+        assert truncated["report"] == review["report"] and truncated["scores"] == expected["scores"]
+        # Not a review at all
+        assert parse_review("I cannot review this file.") is None
+        assert parse_review('{"report": "missing scores"}') is None
+        # Out of range scores are clamped
+        assert parse_review(json.dumps({**review, "scores": {**review["scores"], "bug_risk_score": 14}}))["scores"]["bug_risk_score"] == 10.0
+        
+        # Unusable output keeps the model's text but no made-up scores
+        reviewer = LLMCodeReviewer()
+        fallback = reviewer._parse_response("The code looks fine to me.", "ok.py", "x = 1\n")
+        assert fallback["report"].startswith("The code looks fine to me.")
+        assert "static analyzer" in fallback["report"]
+        
+        print("✅ Review parsing works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Review parsing error: {e}")
+        return False
+
+def test_metrics():
+    """Test the metrics registry, stage timing and the Server-Timing header."""
+    print("🧪 Testing metrics...")
+    
+    try:
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+        from app.metrics import (
+            REGISTRY, STAGE_SECONDS, Histogram, ServerTimingMiddleware, TimedRoute, record_llm_usage, stage, LLM_COST
+        )
+        
+        histogram = Histogram("test_seconds", "Test histogram", ["kind"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, kind="a")
+        histogram.observe(0.5, kind="a")
+        histogram.observe(5, kind="a")
+        lines = histogram.render()
+        assert 'test_seconds_bucket{kind="a",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{kind="a",le="1"} 2' in lines
+        assert 'test_seconds_bucket{kind="a",le="+Inf"} 3' in lines
+        assert 'test_seconds_count{kind="a"} 3' in lines
+        
+        test_app = FastAPI()
+        test_app.router.route_class = TimedRoute
+        test_app.add_middleware(ServerTimingMiddleware)
+        
+        @test_app.get("/work")
+        async def work():
+            with stage("llm"):
+                pass
+            return {"ok": True}
+        
+        before = STAGE_SECONDS.count(stage="llm")
+        with TestClient(test_app) as client:
+            response = client.get("/work")
+        assert response.json() == {"ok": True}
+        timing = response.headers["server-timing"]
+        assert timing.startswith("llm;dur=") and "serialize;dur=" in timing and "total;dur=" in timing
+        assert STAGE_SECONDS.count(stage="llm") == before + 1
+        
+        class Usage:
+            prompt_tokens = 1000000
+            completion_tokens = 0
+        cost = LLM_COST.value(model="gpt-4o-mini-2024-07-18")
+        record_llm_usage("gpt-4o-mini-2024-07-18", Usage())
+        assert abs(LLM_COST.value(model="gpt-4o-mini-2024-07-18") - cost - 0.15) < 1e-9
+        assert "# TYPE review_stage_seconds histogram" in REGISTRY.render()
+        
+        print("✅ Metrics work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Metrics error: {e}")
+        return False
+
+def test_benchmark_harness():
+    """Test the workload benchmark helpers and the stub server's seeded error injection"""
+    print("🧪 Testing benchmark harness...")
+    
+    try:
+        from fastapi.testclient import TestClient
+        from benchmarks.bench_workload import compare, parse_mix, percentile, plan, summarize
+        from benchmarks.stub_llm_server import create_stub_app
+        
+        mix = parse_mix("single=3,list=1")
+        assert mix == {"single": 3, "list": 1}
+        assert plan(mix, 50, seed=1) == plan(mix, 50, seed=1)
+        assert set(plan(mix, 50, seed=1)) == {"single", "list"}
+        
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 50) == 50.5
+        assert abs(percentile(values, 99) - 99.01) < 1e-9
+        
+        report = summarize({"single": [(0.1, True), (0.3, False)], "list": [(0.01, True)]}, elapsed=1.0)
+        assert report["overall"]["count"] == 3 and report["overall"]["errors"] == 1
+        assert report["operations"]["single"]["p50_ms"] == 200.0
+        changes = compare(report, {"overall": dict(report["overall"], p50_ms=report["overall"]["p50_ms"] * 2)})
+        assert changes["changes"]["overall"]["p50_ms_change_pct"] == -50.0
+        
+        def statuses(seed):
+            app = create_stub_app(latency=0, error_rate=0.5, seed=seed)
+            with TestClient(app) as client:
+                return [client.post("/v1/chat/completions", json={"model": "stub", "messages": []}).status_code
+                        for _ in range(20)]
+        first = statuses(7)
+        assert first == statuses(7)
+        assert 500 in first and 200 in first
+        
+        print("✅ Benchmark harness works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Benchmark harness error: {e}")
+        return False
+
+def test_upload_handling():
+    """Test streamed upload reading, size limits, binary/generated detection and encoding fallback"""
+    print("🧪 Testing upload handling...")
+    
+    try:
+        import asyncio
+        import io
+        from fastapi import FastAPI, File, UploadFile
+        from fastapi.testclient import TestClient
+        from app.uploads import (
+            RequestSizeLimitMiddleware, UploadError, decode_source, generated_reason, looks_binary, read_upload_text
+        )
+        
+        assert looks_binary(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR")
+        assert not looks_binary("x = 'café'\n".encode("cp1252"))
+        assert not looks_binary("x = 1\n".encode("utf-16"))
+        
+        assert decode_source("a.py", "x = 'café'\n".encode("cp1252")) == "x = 'café'\n"
+        assert decode_source("a.py", "x = 'ü'\n".encode("utf-16")) == "x = 'ü'\n"
+        assert decode_source("a.py", b"\xef\xbb\xbfx = 1\n") == "x = 1\n"
+        
+        assert generated_reason("bundle.min.js", "var a=1;") == "generated file name"
+        assert generated_reason("api.go", "// Code generated by protoc. DO NOT EDIT.\npackage api\n")
+        assert generated_reason("app.js", "var a=1;" * 1000) == "minified code"
+        assert generated_reason("app.py", "def main():\n    return 1\n") is None
+        
+        def upload(name, data):
+            return UploadFile(io.BytesIO(data), filename=name, size=len(data))
+        
+        # UTF-8 fails in the last chunk, so the fallback has to re-read from the start
+        text = "x = 1\n" * 30000 + "# café\n"
+        assert asyncio.run(read_upload_text(upload("big.py", text.encode("cp1252")))) == text
+        for name, data, status in (("big.py", b"x" * 2000, 413), ("image.py", b"\x00\x01\x02" * 100, 400)):
+            try:
+                asyncio.run(read_upload_text(upload(name, data), max_bytes=1000))
+                return False
+            except UploadError as e:
+                assert e.status_code == status
+        
+        test_app = FastAPI()
+        test_app.add_middleware(RequestSizeLimitMiddleware, max_bytes=1000)
+        
+        @test_app.post("/upload")
+        async def receive(file: UploadFile = File(...)):
+            return {"size": len(await file.read())}
+        
+        with TestClient(test_app) as client:
+            assert client.post("/upload", files={"file": ("a.py", b"x = 1")}).status_code == 200
+            assert client.post("/upload", files={"file": ("a.py", b"x" * 5000)}).status_code == 413
+            # No Content-Length: the body is cut off once it passes the limit
+            chunks = iter([b"x" * 600, b"x" * 600])
+            headers = {"content-type": "multipart/form-data; boundary=x"}
+            assert client.post("/upload", content=chunks, headers=headers).status_code == 413
+        
+        print("✅ Upload handling works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Upload handling error: {e}")
+        return False
+
+def test_repository_mode():
+    """Test the repository index, dependency context and repository report"""
+    print("🧪 Testing repository mode...")
+    
+    try:
+        from app import repository
+        from app.llm_service import LLMCodeReviewer
+        
+        files = [
+            ("proj/pkg/__init__.py", "from .util import parse\n"),
+            ("proj/pkg/util.py", (
+                "def parse(text: str,\n          strict: bool = False) -> dict:\n"
+                '    """Parse text into a dict."""\n    return {}\n\n'
+                "class Store:\n    def get(self, key):\n        return None\n\n"
+                "def unused():\n    pass\n"
+            )),
+            ("proj/pkg/app.py", "from pkg.util import parse, missing\nfrom . import util\n\n"
+                                "def main():\n    return parse(util.Store().get(1))\n"),
+            ("web/api.ts", "export async function fetchUser(id: string): Promise<User> {\n}\n"),
+            ("web/main.ts", "import { fetchUser } from './api';\nfetchUser('1');\n"),
+        ]
+        
+        saved = repository.REPO_INDEX_POOL_MIN_FILES
+        repository.REPO_INDEX_POOL_MIN_FILES = 1
+        try:
+            index = repository.build_index(files, workers=2)
+            assert index.workers == 2
+            # The shared pool outlives each index build
+            repository.start_index_pool(2)
+            pool = repository._index_pool
+            shared = repository.build_index(files)
+            assert shared.workers == 2 and shared.missing_imports() == index.missing_imports()
+            assert repository.build_index(files).workers == 2
+            assert repository._index_pool is pool
+        finally:
+            repository.shutdown_index_pool()
+            repository.REPO_INDEX_POOL_MIN_FILES = saved
+        assert index.stats()["files"] == 5
+        
+        context = index.context_for("proj/pkg/app.py", files[2][1])
+        assert "def parse(text: str, strict: bool = False) -> dict  # Parse text into a dict." in context
+        assert "class Store" in context and "    def get(self, key)" in context
+        assert "unused" not in context
+        assert "fetchUser(id: string)" in index.context_for("web/main.ts", files[4][1])
+        assert index.context_for("proj/pkg/util.py", files[1][1]) == ""
+        assert index.missing_imports() == [("proj/pkg/app.py", 1, "missing", "proj/pkg/util.py")]
+        assert index.dependents()["proj/pkg/util.py"] == 2
+        
+        analysis = {"scores": {"readability_score": 8, "modularity_score": 6, "bug_risk_score": 4, "overall_score": 6},
+                    "suggestions": ["Add tests"]}
+        other = {"scores": {"readability_score": 4, "modularity_score": 4, "bug_risk_score": 4, "overall_score": 4},
+                 "suggestions": []}
+        summary = repository.repository_report(index, [("proj/pkg/util.py", 30, analysis), ("web/api.ts", 10, other)])
+        assert summary["scores"]["readability_score"] == 7.0
+        assert "Cross-file issues" in summary["report"] and "`missing`" in summary["report"]
+        assert summary["report"].index("web/api.ts") < summary["report"].index("proj/pkg/util.py: 6.0")
+        texts = [suggestion["text"] for suggestion in summary["suggestions"]]
+        assert "proj/pkg/util.py: Add tests" in texts
+        missing = summary["suggestions"][texts.index("proj/pkg/app.py:1 imports `missing` from proj/pkg/util.py, "
+                                                     "which does not define it")]
+        assert (missing["severity"], missing["category"], missing["line_start"]) == ("high", "bug", 1)
+        # A file whose review failed is listed, not scored as zeros
+        failed = repository.repository_report(index, [("proj/pkg/util.py", 30, analysis)],
+                                              [("web/api.ts", "Error analyzing code: timed out")])
+        assert failed["scores"]["overall_score"] == 6.0
+        assert "## Not reviewed" in failed["report"] and "- web/api.ts: Error analyzing code: timed out" in failed["report"]
+        assert "web/api.ts: 0.0" not in failed["report"]
+        
+        reviewer = LLMCodeReviewer()
+        assert context in reviewer._build_prompt("proj/pkg/app.py", files[2][1], context=context)
+        assert reviewer._cache_key("a.py", "x = 1", context=context) != reviewer._cache_key("a.py", "x = 1")
+        
+        print("✅ Repository mode works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Repository mode error: {e}")
+        return False
+
+def test_full_text_search():
+    """Test the FTS5 review search index, its triggers and the LIKE fallback."""
+    print("🧪 Testing full-text search...")
+    
+    try:
+        import tempfile
+        from sqlalchemy.orm import sessionmaker
+        from app import search
+        from app.database import Base, CodeReview
+        from app.db_config import create_db_engine
+        
+        assert search.match_expression('bare except: "sql injection" param*') == \
+            '"bare" "except:" "sql injection" "param"*'
+        assert search.match_expression("login", "filename") == 'filename : ("login")'
+        try:
+            search.match_expression("?? :")
+            assert False, "a query without words must be rejected"
+        except ValueError:
+            pass
+        
+        saved = search.fts_enabled
+        with tempfile.TemporaryDirectory() as workdir:
+            engine = create_db_engine(f"sqlite:///{workdir}/search.db")
+            try:
+                Base.metadata.create_all(bind=engine)
+                db = sessionmaker(bind=engine)()
+                scores = dict(readability_score=5, modularity_score=5, bug_risk_score=5, overall_score=5)
+                db.add_all([
+                    CodeReview(filename="src/auth/login.py", review_report="Possible SQL injection in the query",
+                               suggestions="Use parameterized queries", **scores),
+                    CodeReview(filename="web/util.js", review_report="Bare except swallows errors",
+                               suggestions="Catch specific exceptions", **scores),
+                ])
+                db.commit()
+                
+                # Rows stored before the index exists are indexed when it is created
+                assert search.create_search_index(engine)
+                results = search.search_reviews(db, "injections")
+                assert [r["filename"] for r in results] == ["src/auth/login.py"]
+                assert "**injection**" in results[0]["report_snippet"]
+                assert results[0]["rank"] < 0
+                assert search.search_reviews(db, "login", field="report") == []
+                
+                # Triggers keep the index in sync with inserts, updates and deletes
+                db.add(CodeReview(filename="lib/cache.py", review_report="Unbounded cache",
+                                  suggestions="Evict old entries", **scores))
+                db.commit()
+                assert search.search_reviews(db, "evict*")[0]["filename"] == "lib/cache.py"
+                db.query(CodeReview).filter(CodeReview.filename == "web/util.js").update(
+                    {"review_report": "Looks fine"}, synchronize_session=False
+                )
+                db.query(CodeReview).filter(CodeReview.filename == "lib/cache.py").delete()
+                db.commit()
+                assert search.search_reviews(db, "bare except") == []
+                assert search.search_reviews(db, "cache") == []
+                
+                search.fts_enabled = False
+                fallback = search.search_reviews(db, "injection")
+                assert fallback[0]["filename"] == "src/auth/login.py" and fallback[0]["rank"] is None
+                assert "**injection**" in fallback[0]["report_snippet"]
+                db.close()
+            finally:
+                engine.dispose()
+        search.fts_enabled = saved
+        
+        print("✅ Full-text search works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Full-text search error: {e}")
+        return False
+
+def test_score_analytics():
+    """Test the score rollups: incremental upkeep, rebuild and the trend queries."""
+    print("🧪 Testing score analytics...")
+    
+    try:
+        import tempfile
+        from datetime import date, datetime
+        from sqlalchemy.orm import sessionmaker
+        from app import analytics
+        from app.database import Base, CodeReview, DailyScore, ScoreRollup
+        from app.db_config import create_db_engine
+        
+        assert analytics.bucket_start(date(2024, 5, 16), "week") == date(2024, 5, 13)
+        assert analytics.bucket_start(date(2024, 5, 16), "month") == date(2024, 5, 1)
+        assert analytics.histogram_percentile({20: 1, 40: 1, 70: 2}, 50) == 4.0
+        assert analytics.score_bin(7.25) == 73
+        
+        with tempfile.TemporaryDirectory() as workdir:
+            engine = create_db_engine(f"sqlite:///{workdir}/analytics.db")
+            try:
+                Base.metadata.create_all(bind=engine)
+                db = sessionmaker(bind=engine)()
+                reviews = [
+                    ("a.py", datetime(2024, 5, 13, 9), 8.0, 2.0),
+                    ("a.py", datetime(2024, 5, 16, 9), 6.0, 4.0),
+                    ("b.py", datetime(2024, 5, 21, 9), 3.0, 7.0),
+                    ("", datetime(2024, 5, 22, 9), 5.0, 5.0),
+                ]
+                for filename, created_at, overall, bug_risk in reviews:
+                    review = CodeReview(filename=filename, created_at=created_at, readability_score=overall,
+                                        modularity_score=overall, bug_risk_score=bug_risk, overall_score=overall)
+                    analytics.record_review_scores(db, review)
+                    db.add(review)
+                db.commit()
+                
+                weekly = analytics.score_trends(db, "week")
+                assert [(t["bucket_start"], t["review_count"], t["overall_score"]) for t in weekly] == [
+                    (date(2024, 5, 13), 2, 7.0), (date(2024, 5, 20), 2, 4.0)
+                ]
+                history = analytics.score_trends(db, "day", filename="a.py")
+                assert [t["overall_score"] for t in history] == [8.0, 6.0]
+                # A file named "" has its own history, apart from the totals over all files
+                assert [t["review_count"] for t in analytics.score_trends(db, "all", filename="")] == [1]
+                distribution = analytics.score_distribution(db, "bug_risk_score")
+                assert distribution[0]["review_count"] == 4
+                assert distribution[0]["percentiles"]["p50"] == 4.0
+                assert distribution[0]["histogram"] == {"2.0": 1, "4.0": 1, "5.0": 1, "7.0": 1}
+                worst = analytics.worst_files(db, 1)
+                assert worst[0]["filename"] == "b.py" and worst[0]["average_bug_risk_score"] == 7.0
+                assert analytics.worst_files(db, by="latest")[2]["latest_overall_score"] == 6.0
+                
+                # Deleting a review takes it out of the rollups
+                latest = db.query(CodeReview).filter(CodeReview.overall_score == 6.0).one()
+                analytics.remove_review_scores(db, latest)
+                db.delete(latest)
+                db.commit()
+                assert analytics.worst_files(db, by="latest")[2]["latest_overall_score"] == 8.0
+                # Rows the deleted review emptied are gone
+                assert db.query(DailyScore).filter(DailyScore.day == date(2024, 5, 16)).count() == 0
+                assert db.query(ScoreRollup).filter(ScoreRollup.day == date(2024, 5, 16)).count() == 0
+                incremental = (analytics.score_trends(db, "day"), analytics.score_distribution(db, "overall_score"))
+                
+                # A rebuild from the reviews gives the same answers
+                analytics.rebuild_rollups(engine)
+                assert (analytics.score_trends(db, "day"), analytics.score_distribution(db, "overall_score")) == incremental
+                try:
+                    analytics.score_trends(db, "year")
+                    assert False, "an unknown period must be rejected"
+                except ValueError:
+                    pass
+                db.close()
+            finally:
+                engine.dispose()
+        
+        print("✅ Score analytics work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Score analytics error: {e}")
+        return False
+
+def test_structured_suggestions():
+    """Test suggestion normalization and storage as one row per suggestion."""
+    print("🧪 Testing structured suggestions...")
+    
+    try:
+        import tempfile
+        from datetime import datetime
+        from sqlalchemy.orm import sessionmaker
+        from app import migrations
+        from app.chunking import CodeChunk, merge_reviews
+        from app.database import Base, CodeReview, ReviewSuggestion, create_review_record
+        from app.db_config import create_db_engine
+        from app.review_parsing import normalize_suggestion, normalize_suggestions
+        
+        assert normalize_suggestion("Fix the loop on lines 12-14") == {
+            "text": "Fix the loop on lines 12-14", "severity": "medium", "category": "general",
+            "line_start": 12, "line_end": 14
+        }
+        item = normalize_suggestion({"description": "Escape input", "severity": "Major",
+                                     "category": "bug_risk", "line": "7"})
+        assert (item["text"], item["severity"], item["category"], item["line_start"], item["line_end"]) == (
+            "Escape input", "high", "bug", 7, 7
+        )
+        assert normalize_suggestions(["", {"text": " "}, 3, "Add tests"]) == [normalize_suggestion("Add tests")]
+        
+        # Excerpt line numbers are shifted to file lines; suggestions without lines keep none
+        chunks = [CodeChunk(1, 40, "", "f"), CodeChunk(41, 80, "", "g")]
+        scores = {"readability_score": 7, "modularity_score": 7, "bug_risk_score": 3, "overall_score": 7}
+        merged = merge_reviews(chunks, [
+            {"report": "", "scores": scores, "suggestions": [normalize_suggestion("Add tests")]},
+            {"report": "", "scores": scores, "suggestions": ["Add tests", normalize_suggestion("Fix lines 1-3")]},
+        ])
+        assert len(merged["suggestions"]) == 2
+        assert merged["suggestions"][0]["line_start"] is None and merged["suggestions"][0]["line_end"] is None
+        assert (merged["suggestions"][1]["line_start"], merged["suggestions"][1]["line_end"]) == (41, 43)
+        
+        with tempfile.TemporaryDirectory() as workdir:
+            engine = create_db_engine(f"sqlite:///{workdir}/suggestions.db")
+            try:
+                Base.metadata.create_all(bind=engine)
+                db = sessionmaker(bind=engine)()
+                analysis = {"report": "ok", "scores": scores, "suggestions": [
+                    {"text": "Use a parameterized query", "severity": "critical", "category": "security",
+                     "line_start": 3},
+                    "Split the handler:\n- parse\n- validate"
+                ]}
+                review = create_review_record(db, "app.py", "print(1)\n", analysis)
+                db.add(review)
+                db.commit()
+                
+                rows = db.query(ReviewSuggestion).order_by(ReviewSuggestion.position).all()
+                assert [(row.position, row.severity, row.category, row.line_start) for row in rows] == [
+                    (0, "critical", "security", 3), (1, "medium", "general", None)
+                ]
+                # Newlines inside a suggestion survive the round trip
+                assert rows[1].text == "Split the handler:\n- parse\n- validate"
+                assert review.suggestions.startswith("Use a parameterized query\n")
+                
+                db.delete(db.get(CodeReview, review.id))
+                db.commit()
+                assert db.query(ReviewSuggestion).count() == 0
+                
+                # Migrating reviews stored as text ends even when a review's text holds no suggestions
+                for text in (" \n\t", "Cache the lookup on line 4\nAdd docstrings"):
+                    db.add(CodeReview(filename="old.py", review_report="", suggestions=text,
+                                      readability_score=5.0, modularity_score=5.0, bug_risk_score=5.0,
+                                      overall_score=5.0, created_at=datetime.utcnow()))
+                db.commit()
+                saved_session = migrations.SessionLocal
+                migrations.SessionLocal = sessionmaker(bind=engine)
+                try:
+                    assert migrations.migrate_suggestions(batch_size=1) == 2
+                finally:
+                    migrations.SessionLocal = saved_session
+                rows = db.query(ReviewSuggestion).order_by(ReviewSuggestion.position).all()
+                assert [(row.text, row.line_start) for row in rows] == [
+                    ("Cache the lookup on line 4", 4), ("Add docstrings", None)
+                ]
+                db.close()
+            finally:
+                engine.dispose()
+        
+        print("✅ Structured suggestions work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Structured suggestions error: {e}")
+        return False
+
+def test_lazy_startup():
+    """Test that importing the app does no I/O and that startup creates the tables."""
+    print("🧪 Testing lazy startup...")
+    
+    try:
+        import subprocess
+        import sys
+        import tempfile
+        
+        # A fresh interpreter, so the app is imported with this database and no openai loaded yet
+        script = (
+            "import os, sys\n"
+            "import app.main\n"
+            "assert 'openai' not in sys.modules\n"
+            "assert not os.path.exists(os.environ['DB_PATH'])\n"
+            "from fastapi.testclient import TestClient\n"
+            "with TestClient(app.main.app) as client:\n"
+            "    assert client.get('/health').status_code == 200\n"
+            "    assert client.get('/api/reviews').json() == []\n"
+            "assert os.path.exists(os.environ['DB_PATH'])\n"
+        )
+        with tempfile.TemporaryDirectory() as workdir:
+            db_path = os.path.join(workdir, "startup.db")
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", DB_PATH=db_path)
+            env.pop("OPENAI_API_KEY", None)
+            result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+            assert result.returncode == 0, result.stderr[-1000:]
+        
+        print("✅ Lazy startup works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Lazy startup error: {e}")
+        return False
+
+def test_review_list_projection():
+    """Test ?include= on the review list and the deferred column groups."""
+    print("🧪 Testing review list projection...")
+    
+    try:
+        import uuid
+        from fastapi.testclient import TestClient
+        from sqlalchemy.orm import undefer_group
+        from app import main
+        from app.database import SessionLocal, CodeReview, create_review_record
+        
+        prefix = f"projection-{uuid.uuid4().hex[:8]}/"
+        analysis = {"report": "Looks fine", "suggestions": ["Add tests"], "scores": {
+            "readability_score": 7.0, "modularity_score": 7.0, "bug_risk_score": 3.0, "overall_score": 7.0
+        }}
+        with TestClient(main.app) as client:
+            db = SessionLocal()
+            try:
+                review = create_review_record(db, prefix + "a.py", "x = 1\n", analysis)
+                db.add(review)
+                db.commit()
+                review_id = review.id
+                db.expunge_all()
+                
+                # Heavy columns are deferred until accessed or undeferred by group
+                loaded = db.query(CodeReview).filter(CodeReview.id == review_id).one()
+                assert "review_report" not in loaded.__dict__ and "file_content" not in loaded.__dict__
+                db.expunge_all()
+                loaded = db.query(CodeReview).options(undefer_group("report")).filter(CodeReview.id == review_id).one()
+                assert loaded.__dict__["review_report"] == "Looks fine"
+                assert "file_content" not in loaded.__dict__
+            finally:
+                db.close()
+            
+            try:
+                summary = client.get("/api/reviews", params={"filename_prefix": prefix}).json()[0]
+                assert summary["id"] == review_id and summary["overall_score"] == 7.0
+                assert all(summary.get(field) is None for field in ("review_report", "suggestions", "file_content"))
+                
+                full = client.get("/api/reviews", params={"filename_prefix": prefix, "include": "report,content"})
+                full = full.json()[0]
+                assert full["review_report"] == "Looks fine" and full["suggestions"] == "Add tests"
+                assert full["file_content"] == "x = 1\n"
+                
+                response = client.get("/api/reviews", params={"include": "report,secrets"})
+                assert response.status_code == 400 and "secrets" in response.json()["detail"]
+            finally:
+                client.delete(f"/api/reviews/{review_id}")
+        
+        print("✅ Review list projection works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Review list projection error: {e}")
+        return False
+
+def test_batch_archive_upload():
+    """Test posting a zip archive to the batch endpoint, with members that cannot be decoded."""
+    print("🧪 Testing batch archive upload...")
+    
+    try:
+        import io
+        import zipfile
+        from fastapi.testclient import TestClient
+        from app import main, uploads
+        
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("src/a.py", "def a():\n    return 1\n")
+            archive.writestr("src/b.py", "def b():\n    return 2\n")
+            archive.writestr("src/blob.py", b"\x00\x01\x02binary")
+            archive.writestr("src/bad.py", b"name = '\xff\xfe'\n")
+        
+        saved = (uploads.UPLOAD_FALLBACK_ENCODINGS, main.llm_reviewer.api_available)
+        # UTF-8 only, so bad.py cannot be decoded; reviews come from the offline reviewer
+        uploads.UPLOAD_FALLBACK_ENCODINGS = []
+        main.llm_reviewer.api_available = False
+        try:
+            with TestClient(main.app) as client:
+                response = client.post("/api/reviews/batch",
+                                       files=[("files", ("project.zip", buffer.getvalue(), "application/zip"))])
+                body = response.json()
+                for item in body.get("results", []):
+                    if item["review"]:
+                        client.delete(f"/api/reviews/{item['review']['id']}")
+        finally:
+            uploads.UPLOAD_FALLBACK_ENCODINGS, main.llm_reviewer.api_available = saved
+        
+        assert response.status_code == 200
+        assert (body["total"], body["succeeded"], body["failed"]) == (4, 2, 2)
+        results = {item["filename"]: item for item in body["results"]}
+        assert results["src/a.py"]["review"]["filename"] == "src/a.py" and results["src/a.py"]["error"] is None
+        assert results["src/blob.py"]["review"] is None and "binary" in results["src/blob.py"]["error"]
+        assert results["src/bad.py"]["error"] == "Could not decode src/bad.py as text"
+        
+        print("✅ Batch archive upload works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Batch archive upload error: {e}")
+        return False
+
 def test_file_structure():
     """Test that all required files exist."""
     print("🧪 Testing file structure...")
@@ -137,7 +1479,33 @@ def main():
         test_imports,
         test_models,
         test_database_creation,
-        test_llm_service_structure
+        test_llm_service_structure,
+        test_async_llm_service,
+        test_review_cache,
+        test_chunking,
+        test_archive_extraction,
+        test_job_queue,
+        test_report_stream_extractor,
+        test_pagination_cursor,
+        test_blob_storage,
+        test_db_config,
+        test_static_analysis,
+        test_incremental_review,
+        test_request_coalescing,
+        test_rate_limiting,
+        test_model_router,
+        test_prompt_compaction,
+        test_review_parsing,
+        test_metrics,
+        test_benchmark_harness,
+        test_upload_handling,
+        test_repository_mode,
+        test_full_text_search,
+        test_score_analytics,
+        test_structured_suggestions,
+        test_lazy_startup,
+        test_review_list_projection,
+        test_batch_archive_upload
     ]
     
     passed = 0